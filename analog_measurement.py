@@ -5,22 +5,200 @@ run on Saleae Logic2 Software. Supporting main function
 would be running I2C electrical test on capture data.
 
 """
+import copy
 import datetime
 import os
 import subprocess
 import platform
 import tempfile
 
+from capture_store import CaptureStore
+from edge_detection import iter_edges
+from event_log import EventLog
+from event_log import measured_params
 from generate_report import OutputReportFile
 import hummingbird
+from instrumentation import Instrumentation
 import numpy as np
 from saleae.data import GraphTime
 from saleae.range_measurements import AnalogMeasurer
+from timebase import common_timebase
+from timebase import resample
+from timebase import same_period
 
 
 LOCAL_PATH = os.path.join(tempfile.gettempdir(), "output_reports")
 if not os.path.exists(LOCAL_PATH):
   os.makedirs(LOCAL_PATH)
+PENDING_PATH = os.path.join(LOCAL_PATH, "pending")
+LIVE_SAMPLES = 1 << 16  # new samples measured at a time while data arrives
+
+
+def time_fields(start_time):
+  """Datetime and sub-second strings of a GraphTime.
+
+  Args:
+    start_time: GraphTime of the capture
+
+  Returns:
+    fields: "%Y-%m-%d %H:%M:%S" datetime string and sub-second digits
+  """
+  return [start_time.as_datetime().__str__().split(".")[0],
+          start_time.__str__().split(".")[1]]
+
+
+def to_graph_time(start_time):
+  """Convert a capture start time to GraphTime.
+
+  Solve datatime time zone by converting through the
+  "%Y-%m-%d %H:%M:%S" string and the sub-second digits.
+
+  Args:
+    start_time: GraphTime of the capture
+
+  Returns:
+    graph_time: GraphTime in local datetime
+  """
+  return parse_graph_time(*time_fields(start_time))
+
+
+def to_seconds(dt, subms):
+  """Seconds since the epoch of datetime and sub-second strings.
+
+  Only precise enough to match capture time ranges, captures are
+  aligned with GraphTime.
+
+  Args:
+    dt: datetime string, "%Y-%m-%d %H:%M:%S"
+    subms: sub-second digits, at least 12 digits down to picosecond
+
+  Returns:
+    seconds: seconds since the epoch
+  """
+  dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
+  return dt.timestamp() + int(subms[0:12]) * 1e-12
+
+
+def parse_graph_time(dt, subms):
+  """Parse GraphTime from its datetime and sub-second strings.
+
+  Args:
+    dt: datetime string, "%Y-%m-%d %H:%M:%S"
+    subms: sub-second digits, at least 12 digits down to picosecond
+
+  Returns:
+    graph_time: GraphTime
+  """
+  dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
+  ms, us = int(subms[0:3]), int(subms[3:6])
+  ns, ps = int(subms[6:9]), int(subms[9:12])
+  return GraphTime(dt, millisecond=ms, microsecond=us, nanosecond=ns,
+                   picosecond=ps)
+
+
+class LiveMeasurement():
+  """Bus state machine run while the 2nd capture arrives.
+
+  The 1st capture is already in the capture store with its working
+  voltage, so the overlap of the two captures could be measured chunk
+  by chunk with the state carried over, assuming the 2nd capture is the other
+  dataline at the same working voltage. Only used if both captures
+  have the same sampling rate, otherwise measure resamples them first.
+
+  Attributes:
+    hummingbird: copy of the HummingBird measuring the overlap
+    datatype: expected data type of the 2nd capture, SCL or SDA
+    skip: samples of the 2nd capture before the overlap
+    state: BusState after the last measured sample
+    measure_field: EventLog of the measurements so far
+    addr_list: device address included so far
+    end: overlap sample index after the last measured sample,
+         None if the live measurement failed
+  """
+
+  def __init__(self, measurer, vs):
+    hum = copy.copy(measurer)
+    hum.samples = None
+    hum.v_30p, hum.v_70p = hum.threshold_voltages(vs)
+    for name in hummingbird.MEASURE_COUNTERS:
+      setattr(hum, name, 0)
+    if measurer.scl_data is not None:
+      self.datatype = "SDA"
+      hum.sda_start_time = to_graph_time(measurer.start_time)
+      hum.sda_sampling_period = measurer.sampling_period
+    else:
+      self.datatype = "SCL"
+      hum.scl_start_time = to_graph_time(measurer.start_time)
+      hum.scl_sampling_period = measurer.sampling_period
+    scl_skip, sda_skip = hum.start_offsets()
+    if self.datatype == "SDA":
+      hum.scl_data = hum.scl_data[scl_skip:]
+      self.skip = sda_skip
+    else:
+      hum.sda_data = hum.sda_data[sda_skip:]
+      self.skip = scl_skip
+
+    self.hummingbird = hum
+    self.state = hummingbird.BusState()
+    self.measure_field = EventLog(hum.measure_params)
+    self.addr_list = []
+    self.end = 1
+
+  def update(self, samples, final=False):
+    """Measure the overlap up to the end of the samples so far.
+
+    Args:
+      samples: numpy array of the 2nd capture voltages so far
+      final: measure up to the end even if only a few new samples
+    """
+    hum = self.hummingbird
+    if self.datatype == "SDA":
+      hum.sda_data = samples[self.skip:]
+      end = min(len(hum.sda_data), len(hum.scl_data))
+    else:
+      hum.scl_data = samples[self.skip:]
+      end = min(len(hum.scl_data), len(hum.sda_data))
+    if self.end is not None and end - self.end >= (1 if final else
+                                                     LIVE_SAMPLES):
+      try:
+        hum.run_bus_state(self.state, self.measure_field, self.addr_list,
+                          self.end, end)
+        self.end = end
+      except Exception:  # pylint: disable=broad-except
+        self.end = None  # not the expected capture, measure again in measure
+
+  def finish(self, measurer, data, datatype, vs):
+    """Measure the rest of the overlap and pass the result to measurer.
+
+    Args:
+      measurer: HummingBird of the 2nd capture
+      data: numpy array of all the 2nd capture voltages
+      datatype: data type of the 2nd capture
+      vs: working voltage of the 2nd capture
+
+    Returns:
+      measure_field: EventLog of all measurements, None if the 2nd
+                     capture is not the expected one and has to be
+                     measured again
+      addr_list: device address included in the capture
+    """
+    hum = self.hummingbird
+    if (datatype != self.datatype or
+        (hum.v_30p, hum.v_70p) != measurer.threshold_voltages(vs)):
+      return None, None
+    self.update(data, final=True)
+    if self.end is None:
+      return None, None
+
+    for name in hummingbird.MEASURE_COUNTERS:
+      setattr(measurer, name, getattr(hum, name))
+    measurer.stop_flag = self.state.stop_flag
+    measurer.start_flag = self.state.start_flag
+    measurer.restart_flag = self.state.restart_flag
+    measurer.data_start_flag = self.state.data_start_flag
+    measurer.first_packet = self.state.first_packet
+    measurer.has_clk_stretch = measurer.detect_clk_stretch(self.measure_field)
+    return self.measure_field, self.addr_list
 
 
 class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
@@ -29,9 +207,14 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
   This is the main module called by Saleae measurement API.
 
   Attributes:
-    samples: analog data samples,
-             in the format of (time_index, voltage_value)
+    samples: analog data samples, grown as data arrives,
+             samples[:sample_count] are valid
+    sample_count: number of samples
+    v_max: maximum of the filtered samples, updated as data arrives
+    filtered_count: number of samples included in v_max
+    live: LiveMeasurement of the 2nd capture, None for the 1st one
     start_time: captured data start time
+    begin: captured data start time in seconds, to match captures
     sampling_period: time between two samples
     stop_flag: STOP pattern detected,
                raise to 1 until START pattern
@@ -43,17 +226,22 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
                      or RESTART pattern, remain 1 for one package
                      (9 SCL clock cycles)
 
-    scl_data_path: SCL data save path
+    store: CaptureStore of the 1st captures waiting for their pair
+    pending: header of the 1st capture paired with, None if not paired
     scl_data: SCL data
     scl_start_time: SCL data start time
     scl_sampling_period: SCL data sampling period
     f_clk: SCL clock frequency
-    sda_data_path: SDA data save path
     sda_data: SDA data
     sda_start_time: SDA data start time
     sda_sampling_period: SDA data sampling period
+    saved_vs: working voltage of the 1st capture paired with
 
     requested_measurements: measurement required by extension.json
+    fields: requested fields, None for all if SPEC is checked
+    measure_params: event log parameters measured for fields, None for all
+    svg: waveform plot policy, plot the "requested" fields only if
+         SPEC is not checked
   """
 
   def __init__(self, requested_measurements):
@@ -67,17 +255,14 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
       requested_measurements: measurement required by extension.json
     """
     super(HummingBird, self).__init__(requested_measurements)
-    supported_measurements = [
-        "v_low_scl", "v_low_sda", "v_high_scl", "v_high_sda", "v_nl_scl",
-        "v_nh_scl", "v_nl_sda", "v_nh_sda", "t_rise_sda", "t_rise_scl",
-        "t_fall_sda", "t_fall_scl", "t_low", "t_high", "f_clk",
-        "t_SU_DAT_host_rising", "t_SU_DAT_host_falling", "t_HD_DAT_host_rising",
-        "t_HD_DAT_host_falling", "t_SU_DAT_dev_rising", "t_SU_DAT_dev_falling",
-        "t_HD_DAT_dev_rising", "t_HD_DAT_dev_falling", "t_HD_STA_S",
-        "t_HD_STA_Sr", "t_SU_STA", "t_SU_STO", "t_BUF"
-    ]
-    self.samples = []
+    supported_measurements = hummingbird.SPEC_FIELDS
+    self.samples = None
+    self.sample_count = 0
+    self.v_max = 0
+    self.filtered_count = 0
+    self.live = None
     self.start_time = None
+    self.begin = None
     self.sampling_period = None
 
     self.scl_rising_edge = 0
@@ -87,6 +272,10 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     self.start_num = 0
     self.restart_num = 0
     self.stop_num = 0
+    self.edge_events = 0
+    self.param_stats = {}
+    self.instrument = Instrumentation(profile=False)
+    self.timing = self.instrument.timing
 
     self.stop_flag = 1
     self.start_flag = 0
@@ -94,48 +283,15 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     self.data_start_flag = 0
     self.first_packet = 0
 
-    self.scl_data_path = os.path.join(LOCAL_PATH, "SCL.txt")
-    self.scl_data = None
-    self.scl_start_time = None
-    self.scl_sampling_period = None
+    self.store = CaptureStore(PENDING_PATH)
     self.f_clk = None
-    if os.path.isfile(self.scl_data_path):
-      with open(self.scl_data_path, "r") as f:
-        head = [next(f) for x in range(3)]
-        scl_start_time = head[0].split("\n")[0]
-        [dt, subms] = scl_start_time.split("\t")
-        dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-        ms, us = int(subms[0:3]), int(subms[3:6])
-        ns, ps = int(subms[6:9]), int(subms[9:12])
-        self.scl_start_time = GraphTime(dt, millisecond=ms, microsecond=us,
-                                        nanosecond=ns, picosecond=ps)
-        self.scl_sampling_period = float(head[1].split("\n")[0])
-        self.f_clk = float(head[2].split("\n")[0])
-        self.scl_data = np.loadtxt(self.scl_data_path, delimiter=",",
-                                   skiprows=3)
-      os.remove(self.scl_data_path)
-
-    self.sda_data_path = os.path.join(LOCAL_PATH, "SDA.txt")
-    self.sda_data = None
-    self.sda_start_time = None
-    self.sda_sampling_period = None
-    if os.path.isfile(self.sda_data_path):
-      with open(self.sda_data_path, "r") as f:
-        head = [next(f) for x in range(2)]
-        sda_start_time = head[0].split("\n")[0]
-        [dt, subms] = sda_start_time.split("\t")
-        dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-        ms, us = int(subms[0:3]), int(subms[3:6])
-        ns, ps = int(subms[6:9]), int(subms[9:12])
-        self.sda_start_time = GraphTime(dt, millisecond=ms, microsecond=us,
-                                        nanosecond=ns, picosecond=ps)
-        self.sda_sampling_period = float(head[1].split("\n")[0])
-        self.sda_data = np.loadtxt(self.sda_data_path, delimiter=",",
-                                   skiprows=2)
-      os.remove(self.sda_data_path)
+    self.pair(None)
 
     self.v_30p = None
     self.v_70p = None
+    self.v_il = None
+    self.v_ih = None
+    self.transitions = []
 
     self.requested_measurements = {}
     for m in supported_measurements:
@@ -143,8 +299,17 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
         self.requested_measurements[m + "_worst"] = True
       else:
         self.requested_measurements[m + "_worst"] = False
-    if "spec" in requested_measurements:
-      self.requested_measurements["spec"] = True
+    self.requested_measurements["spec"] = "spec" in requested_measurements
+
+    # Only measure and plot the requested fields if SPEC is not checked
+
+    self.fields = None
+    self.svg = "all"
+    if not self.requested_measurements["spec"]:
+      self.fields = [m for m in supported_measurements
+                     if self.requested_measurements[m + "_worst"]]
+      self.svg = "requested"
+    self.measure_params = measured_params(self.fields)
 
   def process_data(self, data):
     """Process data.
@@ -152,18 +317,52 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     This method will be called one or more times per measurement
     Iterate over data to get Voltage values, one per sample
 
+    Each chunk is appended to the samples buffer and folded into the
+    filtered maximum. For the 2nd capture, the overlap with the saved
+    1st capture is also measured by the LiveMeasurement as data arrives,
+    so measure only has to finish the last chunk.
+
     Args:
       data:
         data.samples is a numpy array of float32 voltages
         data.sample_count is the number of samples
     """
-    self.samples.append(data.samples)
     if self.sampling_period is None:
       self.sampling_period = (
           ((data.end_time - data.start_time) / data.sample_count).__float__())
 
     if self.start_time is None:
       self.start_time = data.start_time
+      self.begin = to_seconds(*time_fields(self.start_time))
+      self.pair(self.store.match(self.begin))
+      if (self.pending is not None and
+          same_period(self.pending["sampling_period"], self.sampling_period)):
+        self.live = LiveMeasurement(self, self.saved_vs)
+
+    # Grow the buffer by doubling, instead of concatenating all chunks
+
+    count = self.sample_count + len(data.samples)
+    if self.samples is None or count > len(self.samples):
+      samples = np.empty(max(count, 2 * self.sample_count),
+                         dtype=data.samples.dtype)
+      if self.samples is not None:
+        samples[:self.sample_count] = self.samples[:self.sample_count]
+      self.samples = samples
+    self.samples[self.sample_count:count] = data.samples
+    self.sample_count = count
+
+    # Fold the completed 0.1us segments into the filtered maximum
+
+    length = max(round(1e-7 / self.sampling_period), 1)
+    end = count // length * length
+    self.v_max = max(
+        self.v_max,
+        self.max_of_filtered_arr(self.samples[self.filtered_count:end])
+    )
+    self.filtered_count = end
+
+    if self.live is not None:
+      self.live.update(self.samples[:count])
 
   def determine_datatype(self, data):
     """Determine Data Type.
@@ -185,31 +384,18 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     datatype = None
     dataline = hummingbird.Logic()
     clk_dataline = []
-    v = data[0]
-    for i in range(1, len(data)):
-      n = data[i]
-      if ((v >= self.v_30p and n < self.v_30p) or
-          (v <= self.v_30p and n > self.v_30p)):
-        dataline.i_30p = i
-        if dataline.i_70p is not None:  # falling edge
-          dataline.low_start = dataline.i_30p
-          dataline.i_30p = dataline.i_70p = None
-
-          if dataline.last_low_start is not None:
-            clk_dataline.append(dataline.low_start - dataline.last_low_start)
-          dataline.last_low_start = dataline.low_start
-
-      if ((v >= self.v_70p and n < self.v_70p) or
-          (v <= self.v_70p and n > self.v_70p)):
-        dataline.i_70p = i
-        if dataline.i_30p is not None:  # rising edge
-          dataline.high_start = dataline.i_70p
-          dataline.i_30p = dataline.i_70p = None
-
+    for idx, rising in iter_edges(data, self.v_30p, self.v_70p):
+      for i, r in zip(idx.tolist(), rising.tolist()):
+        if r:  # rising edge
           if dataline.last_high_start is not None:
-            clk_dataline.append(dataline.high_start - dataline.last_high_start)
-          dataline.last_high_start = dataline.high_start
-      v = n
+            clk_dataline.append(i - dataline.last_high_start)
+          dataline.last_high_start = i
+        else:  # falling edge
+          if dataline.last_low_start is not None:
+            clk_dataline.append(i - dataline.last_low_start)
+          dataline.last_low_start = i
+        if len(clk_dataline) >= 8:
+          break
       if len(clk_dataline) >= 8:
         break
 
@@ -228,81 +414,139 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
 
     return datatype
 
-  def process_1st_2nd_capture(self, datatype, data):
+  def pair(self, pending):
+    """Use a 1st capture in the capture store as the other dataline.
+
+    Args:
+      pending: header of the 1st capture, None not to pair
+    """
+    self.pending = None
+    self.saved_vs = None
+    self.scl_data = None
+    self.scl_start_time = None
+    self.scl_sampling_period = None
+    self.sda_data = None
+    self.sda_start_time = None
+    self.sda_sampling_period = None
+    data = None if pending is None else self.store.load(pending)
+    if data is None:
+      return
+
+    self.pending = pending
+    self.saved_vs = pending["vs"]
+    start_time = parse_graph_time(*pending["start_time"])
+    if pending["datatype"] == "SCL":
+      self.scl_data = data
+      self.scl_start_time = start_time
+      self.scl_sampling_period = pending["sampling_period"]
+      self.f_clk = pending["f_clk"]
+    else:
+      self.sda_data = data
+      self.sda_start_time = start_time
+      self.sda_sampling_period = pending["sampling_period"]
+
+  def pair_pending(self, datatype):
+    """Pair with the 1st capture of the other dataline overlapping most.
+
+    The 1st capture is taken out of the capture store, so no other
+    measurement pairs with it. If it is not the one paired with when
+    the data started to arrive, the live measurement is dropped.
+
+    Args:
+      datatype: SCL or SDA of this capture
+    """
+    other = "SDA" if datatype == "SCL" else "SCL"
+    end = self.begin + self.sample_count * self.sampling_period
+    while True:
+      pending = self.store.match(self.begin, end, other)
+      if pending is None:
+        break
+      if self.pending is None or pending["key"] != self.pending["key"]:
+        self.live = None
+        self.pair(pending)
+      if self.store.take(pending) and self.pending is not None:
+        return
+    self.live = None
+    self.pair(None)
+
+  def process_1st_2nd_capture(self, datatype, data, vs):
     """Process 1st or 2nd Capture.
 
-    If 1st, write data.
+    If 1st, save data in the capture store for the 2nd measurement.
     If 2nd, solve datatime time zone when convert datatime
     to graphtime
 
     Args:
       datatype: SCL or SDA
       data: numpy array of voltages values
+      vs: working voltage
     """
     if datatype == "SCL":
       self.scl_data = data
       self.scl_sampling_period = self.sampling_period
       if self.sda_data is None:
-        with open(self.scl_data_path, "w") as f:
-          f.write(self.start_time.as_datetime().__str__().split(".")[0] + "\t" +
-                  self.start_time.__str__().split(".")[1] + "\n")
-          f.write(self.sampling_period.__str__() + "\n")
-          f.write(self.f_clk.__str__() + "\n")
-          np.savetxt(f, data)
+        self.store.put("SCL", data, self.begin,
+                       self.begin + len(data) * self.sampling_period,
+                       start_time=time_fields(self.start_time),
+                       sampling_period=self.sampling_period, vs=vs,
+                       f_clk=self.f_clk)
         self.scl_start_time = self.start_time
       else:
-        dt = self.start_time.as_datetime().__str__().split(".")[0]
-        dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-        subms = self.start_time.__str__().split(".")[1]
-        ms, us = int(subms[0:3]), int(subms[3:6])
-        ns, ps = int(subms[6:9]), int(subms[9:12])
-        self.scl_start_time = GraphTime(dt, millisecond=ms, microsecond=us,
-                                        nanosecond=ns, picosecond=ps)
+        self.scl_start_time = to_graph_time(self.start_time)
 
     elif datatype == "SDA":
       self.sda_data = data
       self.sda_sampling_period = self.sampling_period
       if self.scl_data is None:
-        with open(self.sda_data_path, "w") as f:
-          f.write(self.start_time.as_datetime().__str__().split(".")[0] + "\t" +
-                  self.start_time.__str__().split(".")[1] + "\n")
-          f.write(self.sampling_period.__str__() + "\n")
-          np.savetxt(f, data)
+        self.store.put("SDA", data, self.begin,
+                       self.begin + len(data) * self.sampling_period,
+                       start_time=time_fields(self.start_time),
+                       sampling_period=self.sampling_period, vs=vs,
+                       f_clk=None)
         self.sda_start_time = self.start_time
       else:
-        dt = self.start_time.as_datetime().__str__().split(".")[0]
-        dt = datetime.datetime.strptime(dt, "%Y-%m-%d %H:%M:%S")
-        subms = self.start_time.__str__().split(".")[1]
-        ms, us = int(subms[0:3]), int(subms[3:6])
-        ns, ps = int(subms[6:9]), int(subms[9:12])
-        self.sda_start_time = GraphTime(dt, millisecond=ms, microsecond=us,
-                                        nanosecond=ns, picosecond=ps)
+        self.sda_start_time = to_graph_time(self.start_time)
+
+  def start_offsets(self):
+    """Samples of SCL and SDA before the later start time of the two.
+
+    Returns:
+      scl_skip: SCL samples before the overlap
+      sda_skip: SDA samples before the overlap
+    """
+    if self.scl_start_time > self.sda_start_time:
+      delta_s = (self.scl_start_time - self.sda_start_time).__float__()
+      return 0, round(delta_s / self.sda_sampling_period)
+    delta_s = (self.sda_start_time - self.scl_start_time).__float__()
+    return round(delta_s / self.scl_sampling_period), 0
 
   def match_start_end_time(self):
     """Match start time and end time of SDA and SCL.
 
-    Find overlap region of the two captures
+    Find overlap region of the two captures, and put both on the
+    sampling grid of the finer one. A capture at the grid sampling
+    rate is only trimmed, a coarser capture is resampled over the
+    overlap only. sampling_period becomes the grid period.
 
     Raises:
       Exception: SDA and SCL data time range is not overlapped
     """
     if self.scl_start_time > self.sda_start_time:
-      delta_s = (self.scl_start_time - self.sda_start_time).__float__()
-      delta_s = round(delta_s / self.sda_sampling_period)
-      self.sda_data = self.sda_data[delta_s:]
+      starts = [(self.scl_start_time - self.sda_start_time).__float__(), 0.0]
     else:
-      delta_s = (self.sda_start_time - self.scl_start_time).__float__()
-      delta_s = round(delta_s / self.scl_sampling_period)
-      self.scl_data = self.scl_data[delta_s:]
-
-    if len(self.scl_data) < len(self.sda_data):
-      delta_e = len(self.sda_data) - len(self.scl_data)
-      if delta_e != 0:
-        self.sda_data = self.sda_data[:-delta_e]
-    else:
-      delta_e = len(self.scl_data) - len(self.sda_data)
-      if delta_e != 0:
-        self.scl_data = self.scl_data[:-delta_e]
+      starts = [0.0, (self.sda_start_time - self.scl_start_time).__float__()]
+    periods = [self.scl_sampling_period, self.sda_sampling_period]
+    period = min(periods)
+    if same_period(period, self.sampling_period):
+      period = self.sampling_period  # same rate, keep this capture's period
+    _, period, alignment, count = common_timebase(
+        starts, periods, [len(self.scl_data), len(self.sda_data)], period
+    )
+    self.scl_data = resample(self.scl_data, *alignment[0], count)
+    self.sda_data = resample(self.sda_data, *alignment[1], count)
+    self.sampling_period = period
+    self.scl_sampling_period = period
+    self.sda_sampling_period = period
 
     if (not self.sda_data.any()) or (not self.scl_data.any()):
       raise Exception(
@@ -319,15 +563,16 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     Returns:
       values: dictionary of request_measurements values
     """
-    data = np.concatenate(self.samples)
+    data = self.samples[:self.sample_count]
 
-    vs = self.determine_working_voltage(data)
+    vs = self.determine_working_voltage(data, self.v_max)
     datatype = self.determine_datatype(data)
+    self.pair_pending(datatype)
     mode = None
     if self.f_clk is not None:  # Read from 1st SCL capture
       mode = self.determine_operation_mode()
 
-    self.process_1st_2nd_capture(datatype, data)
+    self.process_1st_2nd_capture(datatype, data, vs)
     if self.sda_data is not None and self.scl_data is not None:
       self.match_start_end_time()
     else:
@@ -345,7 +590,11 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     ]
     if any(k.split("_worst")[0] in supported_measurements
            for k in self.requested_measurements):
-      measure_field, addr_list = self.measure_both_scl_sda()
+      measure_field = None
+      if self.live is not None:
+        measure_field, addr_list = self.live.finish(self, data, datatype, vs)
+      if measure_field is None:
+        measure_field, addr_list = self.measure_both_scl_sda()
 
     ################### Check SPEC Limitation ##############################
 
@@ -353,6 +602,7 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     values, result, svgwidth = self.check_spec(spec_limit, measure_field, vs)
 
     fail = {}
+    num_pass = 0
     if self.requested_measurements["spec"]:
       fail = {param: result for (param, result) in result.items()
               if ((result == 1) and ("_margin" not in param) and
@@ -369,7 +619,8 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     uni_addr = [f"0x{int(addr, 2):02X}" for addr in uni_addr]
 
     sampling_rate = round(1 / self.sampling_period * 1e-6)
-    svg_fields = self.get_svg_fields(result, svgwidth, vs)
+    svg_fields = self.get_svg_fields(result, svgwidth, vs,
+                                     self.svg_field_filter(fail))
     waveform_info = [
         self.scl_rising_edge, self.scl_falling_edge, self.sda_rising_edge,
         self.sda_falling_edge, self.start_num, self.restart_num, self.stop_num
@@ -377,7 +628,7 @@ class HummingBird(AnalogMeasurer, hummingbird.HummingBird):
     report_path = OutputReportFile(
         mode, spec_limit.copy(), vs, self.has_clk_stretch, values.copy(), result.copy(),
         fail.copy(), num_pass, svg_fields, uni_addr, sampling_rate,
-        waveform_info, LOCAL_PATH
+        waveform_info, LOCAL_PATH, self.param_stats, self.profile_result
     )
     open_file(report_path)
 
@@ -0,0 +1,357 @@
+"""HummingBird batch execution file.
+
+This is a python excution file to run I2C eletrical test on
+many csv files in parallel, one worker process per capture,
+and write one summary for all of them.
+
+"""
+import argparse
+import concurrent.futures
+import contextlib
+import csv
+import datetime
+import glob
+import os
+import time
+import traceback
+
+from capture_cache import CaptureCache
+from data_loader import find_importer
+from hummingbird import HummingBird
+from hummingbird import SPEC_FIELDS
+from hummingbird import SVG_POLICIES
+from param_stats import ParamStats
+from spec_limits import mode_choices
+
+
+def find_captures(pattern):
+  """Find captures from a directory or a glob pattern.
+
+  Files of a directory are kept if an importer of data_loader reads
+  them, and a capture of several files, ex: the .bin file of each
+  Saleae Logic2 channel, is only kept once.
+
+  Args:
+    pattern: directory containing capture files, or glob pattern
+
+  Returns:
+    csv_paths: sorted list of capture file paths
+  """
+  if not os.path.isdir(pattern):
+    return sorted(p for p in glob.glob(pattern, recursive=True)
+                  if os.path.isfile(p))
+
+  csv_paths = []
+  sources = set()
+  for path in sorted(glob.glob(os.path.join(pattern, "*"))):
+    if not os.path.isfile(path) or os.path.abspath(path) in sources:
+      continue
+    try:
+      importer = find_importer(path)
+    except (OSError, ValueError):
+      continue  # not a capture
+    csv_paths.append(path)
+    sources.update(os.path.abspath(p) for p in importer.source_files())
+  return csv_paths
+
+
+def measure_capture(csv_data_path, save_folder, vs=None, mode=None,
+                    cache_folder=None, fields=None, svg="all", html=True,
+                    export=False, v_il=None, v_ih=None, transitions=None,
+                    profile=None, data_list=None, channels=(1, 2)):
+  """Measure one capture headlessly.
+
+  Runs in a worker process. Any failure is caught and returned,
+  so one broken capture never stops the rest of the batch.
+  The console output of the measurement is saved to log.txt
+  next to the report.
+
+  Args:
+    csv_data_path: csv file to measure
+    save_folder: folder for the report and log of this capture
+    vs: working voltage
+    mode: operation mode
+    cache_folder: binary capture cache folder, None to disable the cache
+    fields: only measure these SPEC fields (default: all)
+    svg: waveform plot policy in SVG_POLICIES
+    html: write the HTML report
+    export: write the machine-readable result next to the report
+    v_il: threshold of state LOW (default: 30% of the working voltage)
+    v_ih: threshold of state HIGH (default: 70% of the working voltage)
+    transitions: extra (low, high) threshold pairs to measure rise and
+                 fall time between
+    profile: save a cProfile profile next to the report
+    data_list: already loaded capture to measure instead of csv_data_path
+    channels: the two data_list columns of the bus to measure
+
+  Returns:
+    summary: dictionary of csv path, report path, test_item, timing,
+             exported results path, ParamStats of each parameter and
+             error message
+  """
+  summary = {
+      "csv": csv_data_path, "report_path": None, "test_item": None,
+      "load_time": None, "measure_time": None, "results": None,
+      "param_stats": None, "error": None
+  }
+  if not os.path.exists(save_folder):
+    os.makedirs(save_folder)
+  cache = CaptureCache(cache_folder) if cache_folder else None
+  with open(os.path.join(save_folder, "log.txt"), "w") as log:
+    with contextlib.redirect_stdout(log):
+      try:
+        stt = time.time()
+        hum = HummingBird(csv_data_path=csv_data_path, save_folder=save_folder,
+                          vs=vs, mode=mode, cache=cache, fields=fields,
+                          svg=svg, html=html, export=export, v_il=v_il,
+                          v_ih=v_ih, transitions=transitions,
+                          profile=profile, data_list=data_list,
+                          channels=channels)
+        summary["load_time"] = time.time() - stt
+
+        stt = time.time()
+        summary["report_path"], summary["test_item"] = hum.measure()
+        summary["measure_time"] = time.time() - stt
+        summary["param_stats"] = hum.param_stats
+        if export:
+          summary["results"] = os.path.join(save_folder, "results.jsonl")
+      except (Exception, SystemExit) as e:  # pylint: disable=broad-except
+        traceback.print_exc(file=log)
+        summary["error"] = f"{type(e).__name__}: {e}"
+
+  return summary
+
+
+def write_summary(summaries, save_folder):
+  """Write the aggregate summary csv of the batch.
+
+  Args:
+    summaries: list of the dictionaries returned by measure_capture
+    save_folder: folder to save the summary
+
+  Returns:
+    summary_path: save path for the summary csv
+  """
+  time_now = datetime.datetime.now()
+  summary_path = os.path.join(
+      save_folder, f"summary_{time_now.strftime('%Y%m%d%H%M%S')}.csv"
+  )
+  with open(summary_path, "w", newline="") as f:
+    writer = csv.writer(f, delimiter=",")
+    writer.writerow([
+        "csv", "status", "operation_mode", "working_voltage", "fail",
+        "num_pass", "address", "sampling_rate", "load_time", "measure_time",
+        "report", "error"
+    ])
+    for s in summaries:
+      if s["error"] is not None:
+        writer.writerow([s["csv"], "Error"] + [""] * 9 + [s["error"]])
+        continue
+      mode, vs, _, _, fail, num_pass, addr, sampling_rate, _ = s["test_item"]
+      writer.writerow([
+          s["csv"], "Fail" if fail else "Pass", mode, vs,
+          " ".join(fail.keys()), num_pass, " ".join(addr), sampling_rate,
+          f"{s['load_time']:.3f}", f"{s['measure_time']:.3f}",
+          s["report_path"], ""
+      ])
+
+  return summary_path
+
+
+def write_distribution(summaries, save_folder):
+  """Write the distribution of every parameter over all captures.
+
+  The ParamStats of the captures are merged, so the quantiles are
+  the ones of all measurements of the batch.
+
+  Args:
+    summaries: list of the dictionaries returned by measure_capture
+    save_folder: folder to save the distribution csv
+
+  Returns:
+    distribution_path: save path for the distribution csv
+  """
+  param_stats = {}
+  for s in summaries:
+    for f, stats in (s["param_stats"] or {}).items():
+      param_stats.setdefault(f, ParamStats()).merge(stats)
+
+  time_now = datetime.datetime.now()
+  distribution_path = os.path.join(
+      save_folder, f"distribution_{time_now.strftime('%Y%m%d%H%M%S')}.csv"
+  )
+  with open(distribution_path, "w", newline="") as f:
+    writer = csv.writer(f, delimiter=",")
+    writer.writerow(["field", "count", "mean", "std", "p1", "p50", "p99",
+                     "min", "max"])
+    for field, stats in param_stats.items():
+      summary = stats.summary()
+      writer.writerow([field] + [
+          summary[k] for k in ["count", "mean", "std", "p1", "p50", "p99"]
+      ] + [stats.min, stats.max])
+
+  return distribution_path
+
+
+def merge_results(summaries, save_folder):
+  """Merge the exported results of all captures in one JSON lines file.
+
+  Args:
+    summaries: list of the dictionaries returned by measure_capture
+    save_folder: folder to save the merged results
+
+  Returns:
+    results_path: save path for the merged JSON lines
+  """
+  time_now = datetime.datetime.now()
+  results_path = os.path.join(
+      save_folder, f"results_{time_now.strftime('%Y%m%d%H%M%S')}.jsonl"
+  )
+  with open(results_path, "w") as f:
+    for s in summaries:
+      if s["results"] is not None:
+        with open(s["results"], "r") as results:
+          f.write(results.read())
+
+  return results_path
+
+
+def run_batch(csv_paths, output_folder, vs=None, mode=None, cache_folder=None,
+              workers=None, fields=None, svg="all", html=True, export=False,
+              v_il=None, v_ih=None, transitions=None, profile=None):
+  """Measure captures in parallel.
+
+  Args:
+    csv_paths: list of csv files to measure
+    output_folder: folder to save reports, one sub folder per capture
+    vs: working voltage
+    mode: operation mode
+    cache_folder: binary capture cache folder, None to disable the cache
+    workers: number of worker processes (default: number of cores)
+    fields: only measure these SPEC fields (default: all)
+    svg: waveform plot policy in SVG_POLICIES
+    html: write the HTML report of each capture
+    export: write the machine-readable result of each capture
+    v_il: threshold of state LOW (default: 30% of the working voltage)
+    v_ih: threshold of state HIGH (default: 70% of the working voltage)
+    transitions: extra (low, high) threshold pairs to measure rise and
+                 fall time between
+    profile: save a cProfile profile of each capture
+
+  Returns:
+    summaries: list of measure_capture results, in the order of csv_paths
+  """
+  summaries = [None] * len(csv_paths)
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = {}
+    for i, csv_data_path in enumerate(csv_paths):
+      name = os.path.splitext(os.path.basename(csv_data_path))[0]
+      save_folder = os.path.join(output_folder, f"{i:04d}_{name}")
+      futures[executor.submit(measure_capture, csv_data_path, save_folder,
+                              vs, mode, cache_folder, fields, svg, html,
+                              export, v_il, v_ih, transitions, profile)] = i
+
+    for future in concurrent.futures.as_completed(futures):
+      i = futures[future]
+      try:
+        summaries[i] = future.result()
+      except Exception as e:  # pylint: disable=broad-except
+        # worker process died, e.g. out of memory
+        summaries[i] = {
+            "csv": csv_paths[i], "report_path": None, "test_item": None,
+            "load_time": None, "measure_time": None, "results": None,
+            "param_stats": None, "error": f"{type(e).__name__}: {e}"
+        }
+      s = summaries[i]
+      if s["error"] is not None:
+        status = "Error"
+      else:
+        status = "Fail" if s["test_item"][4] else "Pass"
+      print(f"[{status}]\t{s['csv']}")
+
+  return summaries
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("captures",
+                      help="folder of csv files or glob pattern, "
+                      "column format: [time, CH1, CH2]")
+  parser.add_argument("--output_folder", default=None,
+                      help="the folder path to save output reports, "
+                      "ex:\"./output_reports/\"")
+  parser.add_argument("--working_voltage", default=None, type=float,
+                      choices=[1.8, 3.3, 5],
+                      help="supplying voltage (unit: V)")
+  parser.add_argument("--operation_mode", default=None,
+                      choices=mode_choices(),
+                      help="SPEC operation mode, from the spec_profiles files")
+  parser.add_argument("--workers", default=None, type=int,
+                      help="number of worker processes, default to all cores")
+  parser.add_argument("--cache_folder", default=None,
+                      help="the folder path to cache binary captures, "
+                      "default under the tmp folder")
+  parser.add_argument("--no_cache", action="store_true",
+                      help="always parse the csv file, without binary cache")
+  parser.add_argument("--fields", default=None, nargs="+",
+                      choices=SPEC_FIELDS, metavar="FIELD",
+                      help="only measure these SPEC fields, "
+                      "ex: t_rise_scl t_fall_scl (default: all)")
+  parser.add_argument("--svg", default="all", choices=SVG_POLICIES,
+                      help="waveform plots of all fields, the failed "
+                      "fields or the requested --fields only")
+  parser.add_argument("--v_il", default=None, type=float,
+                      help="threshold of state LOW (unit: V), "
+                      "default to 30%% of the working voltage")
+  parser.add_argument("--v_ih", default=None, type=float,
+                      help="threshold of state HIGH (unit: V), "
+                      "default to 70%% of the working voltage")
+  parser.add_argument("--transition", default=None, type=float, nargs=2,
+                      action="append", metavar=("LOW", "HIGH"),
+                      help="also measure rise and fall time between two "
+                      "fractions of the working voltage, ex: 0.1 0.9, "
+                      "could be given more than once")
+  parser.add_argument("--no_html", action="store_true",
+                      help="skip the waveform plots and the HTML reports")
+  parser.add_argument("--export", action="store_true",
+                      help="save machine-readable results of each capture "
+                      "and merge them in one JSON lines file")
+  parser.add_argument("--profile", action="store_true", default=None,
+                      help="save a cProfile profile of each capture in its "
+                      "folder, also enabled by the HUMMINGBIRD_PROFILE=1 "
+                      "environment variable")
+  args = parser.parse_args()
+
+  if args.output_folder is None:
+    LOCAL_PATH = os.path.join(os.path.dirname(__file__), "output_reports")
+    args.output_folder = LOCAL_PATH
+
+  if not os.path.exists(args.output_folder):
+    os.makedirs(args.output_folder)
+
+  cache_folder = None
+  if not args.no_cache:
+    cache_folder = CaptureCache(args.cache_folder).cache_folder
+
+  csv_paths = find_captures(args.captures)
+  print(f"\nMeasure {len(csv_paths)} captures")
+  stt = time.time()
+  summaries = run_batch(csv_paths, args.output_folder, args.working_voltage,
+                        args.operation_mode, cache_folder, args.workers,
+                        args.fields, args.svg, not args.no_html, args.export,
+                        args.v_il, args.v_ih, args.transition, args.profile)
+  summary_path = write_summary(summaries, args.output_folder)
+  distribution_path = write_distribution(summaries, args.output_folder)
+
+  num_error = sum(s["error"] is not None for s in summaries)
+  num_fail = sum(s["error"] is None and bool(s["test_item"][4])
+                 for s in summaries)
+  print("------------------------------------")
+  print("Pass: ", len(summaries) - num_fail - num_error)
+  print("Fail: ", num_fail)
+  print("Error: ", num_error)
+  print("Generate summary at ", summary_path)
+  print("Generate distribution at ", distribution_path)
+  if args.export:
+    print("Generate results at ", merge_results(summaries, args.output_folder))
+  print("=== Batch Time: ", time.time() - stt, "s ===")
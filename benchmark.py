@@ -0,0 +1,199 @@
+"""HummingBird benchmark execution file.
+
+This is a python excution file to time each stage of the
+measurement pipeline on synthetic captures of different sizes,
+and save the timing as a json file for comparison across changes.
+
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+
+from capture_cache import CaptureCache
+from generate_report import OutputReportFile
+from hummingbird import HummingBird
+from i2c_generator import BusConfig
+from i2c_generator import MODES
+from i2c_generator import write_capture
+import numpy as np
+
+
+WORK_PATH = os.path.join(tempfile.gettempdir(), "hummingbird_benchmark")
+SIZES = [1e5, 1e6, 1e7, 1e8]
+STAGES = ["load", "datatype", "measure", "check_spec", "svg", "report"]
+
+
+@contextlib.contextmanager
+def timed(timing, stage):
+  """Add the elapsed time of the with block to timing[stage]."""
+  stt = time.perf_counter()
+  try:
+    yield
+  finally:
+    timing[stage] = timing.get(stage, 0) + time.perf_counter() - stt
+
+
+def capture_path(work_folder, config, num_samples):
+  """Synthetic capture path, generated if not exists.
+
+  Args:
+    work_folder: folder to save synthetic captures
+    config: BusConfig
+    num_samples: number of samples of the capture
+
+  Returns:
+    csv_data_path: csv file of the capture
+  """
+  name = (f"i2c_{num_samples}_{config.sample_rate:g}_{config.f_clk:g}"
+          f"_{config.vdd}V_{config.seed}.csv")
+  csv_data_path = os.path.join(work_folder, name)
+  if not os.path.isfile(csv_data_path):
+    tmp_path = csv_data_path + f".{os.getpid()}.tmp"
+    write_capture(tmp_path, config, num_samples)
+    os.replace(tmp_path, csv_data_path)
+  return csv_data_path
+
+
+def run_pipeline(csv_data_path, save_folder, cache=None, workers=None):
+  """Run the measurement pipeline of main.py stage by stage.
+
+  Args:
+    csv_data_path: csv file to measure
+    save_folder: folder to save the report
+    cache: optional CaptureCache
+    workers: number of worker processes for segment-parallel measurement
+
+  Returns:
+    timing: elapsed time of each stage in STAGES (unit: s)
+    fail: failed SPEC fields
+  """
+  timing = {}
+  with contextlib.redirect_stdout(io.StringIO()):
+    with timed(timing, "load"):
+      hum = HummingBird(csv_data_path, save_folder, cache=cache,
+                        workers=workers)
+
+    with timed(timing, "datatype"):
+      vs = hum.determine_working_voltage(hum.data_list[:, 1])
+      hum.determine_datatype(hum.data_list[:, 1], hum.data_list[:, 2])
+      mode = hum.determine_operation_mode()
+
+    with timed(timing, "measure"):
+      spec_limit = hum.get_spec_limitation(mode, vs)
+      if workers:
+        measure_field, addr_list, param_stats = hum.measure_segments(
+            workers, spec_limit.get("t_BUF_min", 5e-7), vs=vs)
+      else:
+        param_stats = {}
+        measure_field, addr_list = hum.measure_both_scl_sda(
+            param_stats=param_stats, vs=vs)
+
+    with timed(timing, "check_spec"):
+      values, result, svgwidth = hum.check_spec(spec_limit, measure_field, vs,
+                                                param_stats)
+      fail = {param: result for (param, result) in result.items()
+              if ((result == 1) and ("_margin" not in param) and
+                  ("_percent" not in param) and ("_idx" not in param))}
+      num_pass = sum(1 for (param, result) in result.items()
+                     if ((result == 0) and ("_margin" not in param) and
+                         ("_percent" not in param) and ("_idx" not in param)))
+
+    with timed(timing, "svg"):
+      svg_fields = hum.get_svg_fields(result, svgwidth, vs)
+
+    with timed(timing, "report"):
+      uni_addr = [f"0x{int(addr, 2):02X}" for addr in set(addr_list)]
+      waveform_info = [
+          hum.scl_rising_edge, hum.scl_falling_edge, hum.sda_rising_edge,
+          hum.sda_falling_edge, hum.start_num, hum.restart_num, hum.stop_num
+      ]
+      report_path = OutputReportFile(
+          mode, spec_limit.copy(), vs, hum.has_clk_stretch, values.copy(),
+          result.copy(), fail.copy(), num_pass, svg_fields, uni_addr,
+          round(1 / hum.sampling_period * 1e-6), waveform_info, save_folder,
+          hum.param_stats, hum.profile_result
+      )
+      os.remove(report_path)
+
+  return timing, fail
+
+
+def environment():
+  """Describe the machine and the code version of a benchmark run."""
+  try:
+    commit = subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=os.path.dirname(__file__) or ".",
+        capture_output=True, text=True, check=True
+    ).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    commit = None
+  return {
+      "time": datetime.datetime.now().isoformat(timespec="seconds"),
+      "commit": commit, "python": platform.python_version(),
+      "numpy": np.__version__, "platform": platform.platform(),
+      "cpu_count": os.cpu_count()
+  }
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("--sizes", default=SIZES, type=float, nargs="+",
+                      help="number of samples of each capture")
+  parser.add_argument("--repeat", default=3, type=int,
+                      help="number of runs of each capture")
+  parser.add_argument("--sample_rate", default=1e8, type=float,
+                      help="sampling rate (unit: S/s)")
+  parser.add_argument("--operation_mode", default="Fast_Mode",
+                      choices=list(MODES), help="SCL clock frequency")
+  parser.add_argument("--work_folder", default=WORK_PATH,
+                      help="the folder path to save synthetic captures")
+  parser.add_argument("--output", default=None,
+                      help="json file path to save the results, "
+                      "default under the work folder")
+  parser.add_argument("--workers", default=None, type=int,
+                      help="number of worker processes to measure segments")
+  parser.add_argument("--cache", action="store_true",
+                      help="load captures through the binary cache")
+  args = parser.parse_args()
+
+  if not os.path.exists(args.work_folder):
+    os.makedirs(args.work_folder)
+  if args.output is None:
+    time_now = datetime.datetime.now()
+    args.output = os.path.join(
+        args.work_folder, f"benchmark_{time_now.strftime('%Y%m%d%H%M%S')}.json"
+    )
+  cache = None
+  if args.cache:
+    cache = CaptureCache(os.path.join(args.work_folder, "cache"))
+
+  config = BusConfig(args.sample_rate, args.operation_mode, stretch=0.01,
+                     runt=0.001, addresses=[0x50, 0x2C, 0x3A])
+  results = {"environment": environment(), "config": vars(config),
+             "workers": args.workers, "cache": args.cache, "runs": []}
+  print("samples\t\t" + "\t".join(STAGES) + "\ttotal (unit: s)")
+  for size in args.sizes:
+    csv_data_path = capture_path(args.work_folder, config, int(size))
+    for run in range(args.repeat):
+      timing, fail = run_pipeline(csv_data_path, args.work_folder, cache,
+                                  args.workers)
+      results["runs"].append({
+          "samples": int(size), "run": run, "csv": csv_data_path,
+          "timing": timing, "total": sum(timing.values()),
+          "fail": sorted(fail)
+      })
+      print(f"{int(size):.0e}\t\t" +
+            "\t".join(f"{timing[s]:.3f}" for s in STAGES) +
+            f"\t{sum(timing.values()):.3f}")
+
+    with open(args.output, "w") as f:
+      json.dump(results, f, indent=2)
+
+  print("Save results at ", args.output)
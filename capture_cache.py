@@ -0,0 +1,165 @@
+"""HummingBird capture cache.
+
+Convert a capture once into a binary .npy file, and open it
+with np.memmap on later runs instead of parsing the text again.
+"""
+import hashlib
+import os
+import tempfile
+
+from data_loader import CHUNK_ROWS
+from data_loader import find_importer
+import numpy as np
+
+
+CACHE_PATH = os.path.join(tempfile.gettempdir(), "hummingbird_cache")
+SIZE_BUDGET = 4 << 30  # bytes kept in the cache folder
+HASH_BLOCK = 1 << 20  # bytes hashed at the head and tail of the file
+
+
+class CaptureCache():
+  """Binary capture cache.
+
+  Each entry is a Fortran-ordered .npy file, so every column
+  (time base, CH1, CH2) is contiguous on disk. The least
+  recently used entries are removed once the folder grows
+  over the size budget.
+
+  Attributes:
+    cache_folder: folder to save cache entries
+    size_budget: maximum total size of the cache entries in bytes
+  """
+
+  def __init__(self, cache_folder=None, size_budget=SIZE_BUDGET):
+    self.cache_folder = cache_folder if cache_folder else CACHE_PATH
+    self.size_budget = size_budget
+    if not os.path.exists(self.cache_folder):
+      os.makedirs(self.cache_folder)
+
+  def key(self, importer):
+    """Cache key of a capture.
+
+    Combine path, size, mtime and a hash of the head and tail of
+    the content of every file read by the importer, so a rewritten
+    file never hits a stale entry without reading the whole file
+    on every run.
+
+    Args:
+      importer: importer of the capture, see data_loader.IMPORTERS
+
+    Returns:
+      key: hex digest identifying the file content
+    """
+    digest = hashlib.sha1()
+    for path in importer.source_files():
+      stat = os.stat(path)
+      digest.update(os.path.abspath(path).encode())
+      digest.update(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+      with open(path, "rb") as f:
+        digest.update(f.read(HASH_BLOCK))
+        if stat.st_size > HASH_BLOCK:
+          f.seek(max(stat.st_size - HASH_BLOCK, HASH_BLOCK))
+          digest.update(f.read(HASH_BLOCK))
+
+    return digest.hexdigest()
+
+  def entry_path(self, importer, wide=False):
+    """Cache entry path of a capture, wide for every channel."""
+    suffix = "_wide.npy" if wide else ".npy"
+    return os.path.join(self.cache_folder, self.key(importer) + suffix)
+
+  def load(self, csv_data_path, wide=False):
+    """Load a capture through the cache.
+
+    Args:
+      csv_data_path: capture file path, in any format of
+                     data_loader.IMPORTERS
+      wide: read every channel, not only CH1 and CH2
+
+    Returns:
+      data: read-only memory-mapped array, one row per sample
+    """
+    importer = find_importer(csv_data_path, wide)
+    path = self.entry_path(importer, wide)
+    if not os.path.isfile(path):
+      self.convert(importer, path)
+      self.evict(keep=path)
+    else:
+      os.utime(path)  # mark as recently used
+
+    return np.load(path, mmap_mode="r")
+
+  def convert(self, importer, path):
+    """Convert a capture into a cache entry.
+
+    Rows are counted first, then the capture is parsed chunk by
+    chunk straight into the memory-mapped entry, so captures larger
+    than RAM can be converted. Temporary files are removed if the
+    conversion fails.
+
+    Args:
+      importer: importer of the capture, see data_loader.IMPORTERS
+      path: cache entry path
+    """
+    rows = importer.count_rows()
+    tmp_path = path + f".{os.getpid()}.tmp"
+    trim_path = path + f".{os.getpid()}.trim.tmp"
+    out = None
+    trimmed = None
+    try:
+      filled = 0
+      for chunk in importer.iter_chunks():
+        if out is None:
+          out = np.lib.format.open_memmap(
+              tmp_path, mode="w+", dtype=chunk.dtype,
+              shape=(rows, chunk.shape[1]), fortran_order=True
+          )
+        out[filled:filled + len(chunk)] = chunk
+        filled += len(chunk)
+      if out is None:
+        raise ValueError(f"No data in {importer.path}")
+
+      out.flush()
+      if filled != rows:  # blank lines counted as rows
+        trimmed = np.lib.format.open_memmap(
+            trim_path, mode="w+", dtype=out.dtype,
+            shape=(filled, out.shape[1]), fortran_order=True
+        )
+        for lo in range(0, filled, CHUNK_ROWS):
+          hi = min(lo + CHUNK_ROWS, filled)
+          trimmed[lo:hi] = out[lo:hi]
+        trimmed.flush()
+        out = trimmed = None
+        os.replace(trim_path, tmp_path)
+      out = None
+      os.replace(tmp_path, path)
+    finally:
+      out = trimmed = None
+      for leftover in (tmp_path, trim_path):
+        if os.path.exists(leftover):
+          os.remove(leftover)
+
+  def evict(self, keep=None):
+    """Remove the least recently used entries over the size budget.
+
+    Args:
+      keep: entry path never to be removed
+    """
+    entries = []
+    for name in os.listdir(self.cache_folder):
+      if name.endswith(".npy"):
+        path = os.path.join(self.cache_folder, name)
+        stat = os.stat(path)
+        entries.append((stat.st_mtime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+      if total <= self.size_budget:
+        break
+      if path == keep:
+        continue
+      try:
+        os.remove(path)
+      except OSError:
+        continue
+      total -= size
@@ -0,0 +1,218 @@
+"""HummingBird store of captures waiting for their pair.
+
+The Logic2 extension measures SCL and SDA from two captures. The 1st
+capture waits in the store until a capture of the other dataline
+overlapping it arrives. Several captures could wait at a time, ex:
+measurements started back to back or from two Logic2 windows, and
+each new capture is paired with the one it overlaps the most.
+
+Samples and headers are written to temporary files and renamed, the
+header last, so a header always points at complete samples. Headers
+are only added, taken and expired while holding the store lock file.
+"""
+import contextlib
+import glob
+import json
+import math
+import os
+import time
+
+import numpy as np
+
+
+MAX_AGE = 3600  # seconds a capture waits for its pair
+MAX_BYTES = 1 << 30  # bytes of samples kept, the oldest captures expire first
+LOCK_STALE = 30  # seconds before a lock left by a crashed process is broken
+
+
+class CaptureStore():
+  """Pending captures keyed by their time range.
+
+  Each capture is saved as a .npy samples file with a .json header
+  of the same key. The header has the key, datatype, begin and end
+  time (unit: s), created time, bytes of samples and the values
+  passed to put.
+
+  Attributes:
+    folder: store folder
+    max_age: seconds before a pending capture expires
+    max_bytes: total bytes of samples kept
+  """
+
+  def __init__(self, folder, max_age=MAX_AGE, max_bytes=MAX_BYTES):
+    self.folder = folder
+    self.max_age = max_age
+    self.max_bytes = max_bytes
+    os.makedirs(folder, exist_ok=True)
+
+  def path(self, key, ext):
+    """File path of a capture."""
+    return os.path.join(self.folder, key + ext)
+
+  @contextlib.contextmanager
+  def lock(self):
+    """Hold the store lock in the with block.
+
+    The lock is a file created exclusively, which works the same on
+    every platform Logic2 runs on.
+    """
+    lock_path = os.path.join(self.folder, "store.lock")
+    while True:
+      try:
+        fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        break
+      except FileExistsError:
+        try:
+          if time.time() - os.path.getmtime(lock_path) > LOCK_STALE:
+            os.remove(lock_path)
+            continue
+        except OSError:
+          continue  # released meanwhile
+        time.sleep(0.01)
+    try:
+      yield
+    finally:
+      os.close(fd)
+      os.remove(lock_path)
+
+  def headers(self):
+    """Headers of the pending captures, oldest first."""
+    headers = []
+    for header_path in glob.glob(os.path.join(self.folder, "*.json")):
+      try:
+        with open(header_path, "r") as f:
+          headers.append(json.load(f))
+      except (OSError, ValueError):
+        continue  # taken meanwhile
+    return sorted(headers, key=lambda header: header["created"])
+
+  def put(self, datatype, data, begin, end, **info):
+    """Add a pending capture.
+
+    Args:
+      datatype: SCL or SDA
+      data: numpy array of voltages values
+      begin: capture start time (unit: s)
+      end: capture end time (unit: s)
+      **info: other header values, ex: sampling_period
+
+    Returns:
+      key: key of the capture
+    """
+    key = f"{datatype}_{time.time_ns()}_{os.getpid()}"
+    data = np.asarray(data)
+    header = dict(info, key=key, datatype=datatype, begin=begin, end=end,
+                  created=time.time(), bytes=data.nbytes)
+
+    tmp_path = self.path(key, ".npy.tmp")
+    with open(tmp_path, "wb") as f:
+      np.save(f, data)
+    os.replace(tmp_path, self.path(key, ".npy"))
+    tmp_path = self.path(key, ".json.tmp")
+    with open(tmp_path, "w") as f:
+      json.dump(header, f)
+
+    with self.lock():
+      self.expire(data.nbytes)
+      os.replace(tmp_path, self.path(key, ".json"))
+    return key
+
+  def match(self, begin, end=math.inf, datatype=None):
+    """Pending capture overlapping a time range the most.
+
+    Captures are indexed by begin time, so only the ones starting
+    before end are compared.
+
+    Args:
+      begin: start time of the range (unit: s)
+      end: end time of the range, inf if not known yet
+      datatype: datatype of the capture, None for any
+
+    Returns:
+      header: header of the capture, None if no capture overlaps
+    """
+    headers = [header for header in self.headers()
+               if datatype is None or header["datatype"] == datatype]
+    if not headers:
+      return None
+    begins = np.array([header["begin"] for header in headers])
+    order = np.argsort(begins, kind="stable")
+    cut = np.searchsorted(begins[order], end, side="left")
+    if not cut:
+      return None
+    order = order[:cut]
+    ends = np.array([headers[k]["end"] for k in order])
+    overlap = np.minimum(ends, end) - np.maximum(begins[order], begin)
+    best = np.argmax(overlap)
+    return headers[order[best]] if overlap[best] > 0 else None
+
+  def load(self, header):
+    """Memory-map the samples of a pending capture.
+
+    Returns:
+      data: read-only memory-mapped array of voltages values, None if
+            the capture is not in the store any more
+    """
+    try:
+      return np.load(self.path(header["key"], ".npy"), mmap_mode="r")
+    except OSError:
+      return None
+
+  def take(self, header):
+    """Remove a capture from the store to pair it.
+
+    Samples already loaded stay valid.
+
+    Returns:
+      taken: False if taken or expired by another measurement
+    """
+    with self.lock():
+      try:
+        os.remove(self.path(header["key"], ".json"))
+      except FileNotFoundError:
+        return False
+    self.remove_samples(header["key"])
+    return True
+
+  def remove_samples(self, key):
+    """Remove the samples of a capture whose header is removed."""
+    try:
+      os.remove(self.path(key, ".npy"))  # the mapping stays valid on posix
+    except OSError:
+      pass  # still mapped on Windows, removed by a later expire
+
+  def expire(self, new_bytes=0):
+    """Remove expired captures, called with the lock held.
+
+    Captures older than max_age are removed, then the oldest ones
+    until the samples kept and new_bytes fit in max_bytes. Samples
+    and temporary files left without a header for max_age, ex: by a
+    crashed measurement, are removed too.
+
+    Args:
+      new_bytes: bytes of samples about to be added
+    """
+    now = time.time()
+    headers = self.headers()
+    total = new_bytes + sum(header["bytes"] for header in headers)
+    for header in headers:
+      if now - header["created"] <= self.max_age and total <= self.max_bytes:
+        break
+      total -= header["bytes"]
+      try:
+        os.remove(self.path(header["key"], ".json"))
+      except OSError:
+        continue
+      self.remove_samples(header["key"])
+
+    keys = {header["key"] for header in self.headers()}
+    for name in os.listdir(self.folder):
+      if name.endswith(".json") or name == "store.lock":
+        continue
+      path = os.path.join(self.folder, name)
+      try:
+        if (name.split(".")[0] not in keys and
+            now - os.path.getmtime(path) > self.max_age):
+          os.remove(path)
+      except OSError:
+        continue
@@ -3,6 +3,9 @@
 This is a python excution file to convert RIGOL csv file
 into HummingBird readable format.
 
+HummingBird reads RIGOL csv files directly (see RigolImporter in
+data_loader.py), this converter is only needed for other tools.
+
 """
 import argparse
 import csv
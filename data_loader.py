@@ -0,0 +1,378 @@
+"""HummingBird data loading methods.
+
+Stream capture files chunk by chunk into preallocated numpy
+buffers, so the peak memory stays close to the size of the
+final array.
+
+Capture formats are read by the importers in IMPORTERS, tried in
+order until one detects the file, so scope exports are read
+directly without converting them to the HummingBird csv format.
+"""
+import glob
+import itertools
+import os
+
+import numpy as np
+from timebase import common_timebase
+from timebase import resample
+
+
+CHUNK_ROWS = 1 << 16  # rows parsed at a time
+HEAD_BYTES = 4096  # bytes read to detect the file format
+DELIMITERS = [",", "\t", ";"]
+SALEAE_ID = b"<SALEAE>"
+SALEAE_ANALOG = 1  # Logic2 binary export type of analog channels
+
+
+def iter_csv_chunks(csv_data_path, chunk_rows=CHUNK_ROWS, dtype=np.float64,
+                    skip_header=1, delimiter=",", usecols=None):
+  """Iterate over a csv file in fixed-size chunks.
+
+  Args:
+    csv_data_path: csv file to read
+    chunk_rows: number of rows per chunk
+    dtype: numpy dtype of the returned chunks
+    skip_header: number of header lines to skip
+    delimiter: column delimiter
+    usecols: columns to read, in the returned order (default: all)
+
+  Yields:
+    chunk: 2-D numpy array of at most chunk_rows rows
+  """
+  with open(csv_data_path, "r") as f:
+    for _ in range(skip_header):
+      next(f)
+    while True:
+      lines = list(itertools.islice(f, chunk_rows))
+      if not lines:
+        break
+      yield np.loadtxt(lines, delimiter=delimiter, dtype=dtype, ndmin=2,
+                       usecols=usecols)
+
+
+def count_rows(csv_data_path, skip_header=1, block_size=1 << 24):
+  """Count the data rows of a csv file without parsing it.
+
+  Args:
+    csv_data_path: csv file to read
+    skip_header: number of header lines to skip
+    block_size: number of bytes read at a time
+
+  Returns:
+    rows: number of data rows
+  """
+  lines = 0
+  last = b"\n"
+  with open(csv_data_path, "rb") as f:
+    while True:
+      block = f.read(block_size)
+      if not block:
+        break
+      lines += block.count(b"\n")
+      last = block[-1:]
+  if last != b"\n":
+    lines += 1  # last line without line break
+  return max(lines - skip_header, 0)
+
+
+def is_number(field):
+  """Whether a csv field is a number."""
+  try:
+    float(field)
+  except ValueError:
+    return False
+  return True
+
+
+class CsvImporter():
+  """Generic two-channel csv / tsv capture.
+
+  The delimiter is detected from the first data line, and every line
+  before it is a header, ex: one line for HummingBird csv files and
+  two for Keysight exports. The time column is the one named "time"
+  in a header, or the first column, and the next two columns are CH1
+  and CH2, named by the first header line. Wide captures of more
+  channels are read with use_all_channels.
+
+  Attributes:
+    path: capture file path
+    delimiter: column delimiter
+    skip_header: number of header lines
+    usecols: time, CH1 and CH2 column index
+    channels: names of CH1 and CH2
+    channel_cols: column index of every channel
+    channel_names: names of every channel
+  """
+
+  def __init__(self, path, head):
+    lines = head.decode(errors="replace").splitlines()
+    self.path = path
+    self.skip_header = 0
+    for line in lines:
+      fields = [f for f in self.split(line) if f]
+      if fields and all(is_number(f) for f in fields):
+        break
+      self.skip_header += 1
+    if self.skip_header == len(lines):
+      raise ValueError(f"No data line in the head of {path}")
+    data_line = lines[self.skip_header]
+    self.delimiter = max(DELIMITERS, key=data_line.count)
+    headers = [[name.strip() for name in line.split(self.delimiter)]
+               for line in lines[:self.skip_header]]
+    names = headers[0] if headers else []
+    time_col = next((k for header in headers for k, name in enumerate(header)
+                     if "time" in name.lower()), 0)
+    width = max(len(names), len([f for f in self.split(data_line) if f]), 3)
+    self.channel_cols = [k for k in range(width) if k != time_col]
+    self.channel_names = [names[k] if k < len(names) and names[k]
+                          else f"CH{i + 1}"
+                          for i, k in enumerate(self.channel_cols)]
+    self.usecols = [time_col] + self.channel_cols[:2]
+    self.channels = self.channel_names[:2]
+
+  @staticmethod
+  def split(line):
+    """Split a line by any of the DELIMITERS."""
+    for delimiter in DELIMITERS[1:]:
+      line = line.replace(delimiter, DELIMITERS[0])
+    return [f.strip() for f in line.split(DELIMITERS[0])]
+
+  @staticmethod
+  def detect(path, head):
+    """Fallback importer, any text file."""
+    return True
+
+  def use_all_channels(self):
+    """Read every channel, not only CH1 and CH2."""
+    self.usecols = self.usecols[:1] + self.channel_cols
+    self.channels = self.channel_names
+
+  def source_files(self):
+    """Files read by the importer."""
+    return [self.path]
+
+  def count_rows(self):
+    """Number of data rows, blank lines included."""
+    return count_rows(self.path, self.skip_header)
+
+  def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+    """Iterate over [time, CH1, CH2, ...] chunks of chunk_rows rows."""
+    yield from iter_csv_chunks(self.path, chunk_rows,
+                               skip_header=self.skip_header,
+                               delimiter=self.delimiter, usecols=self.usecols)
+
+
+class RigolImporter(CsvImporter):
+  """RIGOL oscilloscope csv export.
+
+  The 1st header line names the channels, and the 2nd one holds the
+  start time and time increment. The 1st column is the sample
+  sequence number, converted to time as sequence * increment, and
+  the channels are the other columns of the data lines.
+
+  Attributes:
+    increment: time between two samples
+  """
+
+  def __init__(self, path, head):
+    lines = head.decode(errors="replace").splitlines()
+    names = lines[0].split(",")
+    info = [f for f in lines[1].split(",") if f.strip()]
+    self.path = path
+    self.delimiter = ","
+    self.skip_header = 2
+    width = len([f for f in lines[2].split(",") if f.strip()])
+    self.channel_names = [name.strip() for name in names[1:width]]
+    self.channel_cols = list(range(1, width))
+    self.usecols = [0, 1, 2]
+    self.channels = self.channel_names[:2]
+    self.increment = float(info[-1])
+
+  @staticmethod
+  def detect(path, head):
+    """RIGOL csv files start with "X," and "Sequence," lines."""
+    lines = head.split(b"\n", 2)
+    return (len(lines) > 2 and lines[0].startswith(b"X,") and
+            lines[1].startswith(b"Sequence,"))
+
+  def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+    """Iterate over [time, CH1, CH2, ...] chunks of chunk_rows rows."""
+    for chunk in super().iter_chunks(chunk_rows):
+      chunk[:, 0] *= self.increment
+      yield chunk
+
+
+class SaleaeImporter():
+  """Saleae Logic2 binary export of two analog channels.
+
+  Logic2 saves each analog channel in its own .bin file, so the
+  other channel is the other analog .bin file in the same folder.
+  Samples are memory-mapped, and both channels are put on a common
+  timebase over the time range they overlap. A channel at a coarser
+  sampling rate is resampled chunk by chunk as it is read.
+
+  Attributes:
+    path: capture file path of one channel
+    files: .bin files of CH1 and CH2, in file name order
+    channels: names of CH1 and CH2
+    begin_time: start time of the overlap
+    sampling_period: time between two samples of the common timebase
+    samples: memory-mapped float32 samples of CH1 and CH2
+    alignment: (offset, ratio) of CH1 and CH2 on the common timebase
+    rows: number of samples in the overlap
+  """
+
+  def __init__(self, path, head):
+    self.path = path
+    others = [p for p in sorted(glob.glob(os.path.join(
+        os.path.dirname(os.path.abspath(path)), "*.bin")))
+              if not os.path.samefile(p, path) and self.read_header(p)]
+    if len(others) != 1:
+      raise ValueError(f"Expect one other analog channel next to {path}, "
+                       f"found {len(others)}")
+    self.files = sorted([os.path.abspath(path), others[0]])
+    self.channels = [os.path.splitext(os.path.basename(p))[0]
+                     for p in self.files]
+
+    headers = [self.read_header(p) for p in self.files]
+    (self.begin_time, self.sampling_period, self.alignment,
+     self.rows) = common_timebase(
+         [begin for begin, _, _, _, _ in headers],
+         [downsample / rate for _, rate, downsample, _, _ in headers],
+         [num for _, _, _, num, _ in headers]
+     )
+    self.samples = [
+        np.memmap(p, dtype=np.float32, mode="r", offset=offset, shape=(num,))
+        for p, (_, _, _, num, offset) in zip(self.files, headers)
+    ]
+
+  @staticmethod
+  def read_header(path):
+    """Read the header of a Logic2 analog binary export.
+
+    Args:
+      path: .bin file path
+
+    Returns:
+      header: begin time, sample rate, downsample, number of samples
+              and byte offset of the samples, None if not an analog
+              channel export
+    """
+    with open(path, "rb") as f:
+      head = f.read(56)
+    if len(head) < 16 or head[:8] != SALEAE_ID:
+      return None
+    version, data_type = np.frombuffer(head, dtype="<i4", count=2, offset=8)
+    if data_type != SALEAE_ANALOG:
+      return None
+    if version == 0:
+      fields = np.frombuffer(head, dtype="<f8, <u8, <u8, <u8", count=1,
+                             offset=16)[0]
+      begin, rate, downsample, num = fields.tolist()
+      return begin, rate, downsample, num, 48
+    fields = np.frombuffer(head, dtype="<f8, <f8, <u8, <u8, <u8", count=1,
+                           offset=16)[0]
+    begin, _, rate, downsample, num = fields.tolist()  # skip trigger time
+    return begin, rate, downsample, num, 56
+
+  @staticmethod
+  def detect(path, head):
+    """Logic2 binary exports start with the "<SALEAE>" identifier."""
+    return head.startswith(SALEAE_ID)
+
+  def source_files(self):
+    """Files read by the importer."""
+    return self.files
+
+  def count_rows(self):
+    """Number of samples in the overlap of both channels."""
+    return self.rows
+
+  def iter_chunks(self, chunk_rows=CHUNK_ROWS):
+    """Iterate over [time, CH1, CH2] chunks of chunk_rows rows."""
+    for lo in range(0, self.count_rows(), chunk_rows):
+      hi = min(lo + chunk_rows, self.count_rows())
+      chunk = np.empty((hi - lo, 3))
+      chunk[:, 0] = self.begin_time + np.arange(lo, hi) * self.sampling_period
+      for col, (samples, (offset, ratio)) in enumerate(
+          zip(self.samples, self.alignment), 1):
+        chunk[:, col] = resample(samples, offset + lo * ratio, ratio, hi - lo)
+      yield chunk
+
+
+IMPORTERS = [RigolImporter, SaleaeImporter, CsvImporter]
+
+
+def register_importer(importer):
+  """Register an importer, tried before the built-in ones.
+
+  An importer class is built with (path, head) and implements
+  detect(path, head), source_files(), count_rows() and
+  iter_chunks(chunk_rows), see CsvImporter.
+
+  Args:
+    importer: importer class
+
+  Returns:
+    importer: the same class, so it could be used as a decorator
+  """
+  IMPORTERS.insert(0, importer)
+  return importer
+
+
+def find_importer(path, wide=False):
+  """Find the importer of a capture file.
+
+  Args:
+    path: capture file path
+    wide: read every channel, not only CH1 and CH2
+
+  Returns:
+    importer: importer of the first of IMPORTERS detecting the file
+
+  Raises:
+    ValueError: unknown format, or a format of two channels only if wide
+  """
+  with open(path, "rb") as f:
+    head = f.read(HEAD_BYTES)
+  for importer in IMPORTERS:
+    if importer.detect(path, head):
+      importer = importer(path, head)
+      if wide:
+        if not hasattr(importer, "use_all_channels"):
+          raise ValueError(f"{type(importer).__name__} only reads two "
+                           f"channels: {path}")
+        importer.use_all_channels()
+      return importer
+  raise ValueError(f"Unknown capture format: {path}")
+
+
+def load_file(path, chunk_rows=CHUNK_ROWS, wide=False):
+  """Load a capture file of any registered format into a numpy array.
+
+  The buffer is preallocated from the number of rows, counted
+  without parsing, and trimmed to the rows read.
+
+  Args:
+    path: capture file path
+    chunk_rows: number of rows parsed at a time
+    wide: read every channel, not only CH1 and CH2
+
+  Returns:
+    data: 2-D numpy array, one [time, CH1, CH2, ...] row per sample
+  """
+  importer = find_importer(path, wide)
+  data = None
+  rows = 0
+  for chunk in importer.iter_chunks(chunk_rows):
+    if data is None:
+      data = np.empty((max(importer.count_rows(), len(chunk)),
+                       chunk.shape[1]))
+    if rows + len(chunk) > len(data):
+      data.resize((rows + len(chunk), data.shape[1]), refcheck=False)
+    data[rows:rows + len(chunk)] = chunk
+    rows += len(chunk)
+  if data is None:
+    return np.empty((0, 3))
+  data.resize((rows, data.shape[1]), refcheck=False)
+  return data
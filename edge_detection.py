@@ -0,0 +1,391 @@
+"""HummingBird edge detection methods.
+
+Vectorized threshold crossing search on analog datalines.
+The per-sample scan is done in bulk with numpy so that the
+bus state machine only visits the sparse list of edge events.
+"""
+import numpy as np
+
+
+CHUNK_SIZE = 1 << 22  # samples converted to float64 at a time
+WINDOW_SIZE = 1 << 24  # samples searched for edge events at a time
+FIRST_WINDOW = 1 << 16  # samples searched first for full-swing edges
+
+EDGE_KEYS = [
+    "scl_30p_fall", "scl_30p_rise", "scl_70p_rise", "scl_70p_fall",
+    "sda_30p_fall", "sda_30p_rise", "sda_70p_rise", "sda_70p_fall"
+]
+INTERP_KEYS = ["scl_30p", "scl_70p", "sda_30p", "sda_70p"]
+LINE_KEYS = ["30p_fall", "30p_rise", "70p_rise", "70p_fall"]
+
+
+def find_crossings(data, threshold, chunk_size=CHUNK_SIZE):
+  """Find all crossings of a threshold.
+
+  A rising crossing at sample i means data[i-1] <= threshold < data[i],
+  a falling crossing means data[i-1] >= threshold > data[i].
+  Data is compared in float64 chunk by chunk, so float32 captures
+  behave the same as a per-sample comparison with a python float.
+
+  Args:
+    data: numpy array of voltages values
+    threshold: voltage threshold
+    chunk_size: number of samples processed at a time
+
+  Returns:
+    rising: sample indices of rising crossings
+    falling: sample indices of falling crossings
+  """
+  rising = [np.zeros(0, dtype=np.int64)]
+  falling = [np.zeros(0, dtype=np.int64)]
+  for lo in range(1, len(data), chunk_size):
+    hi = min(lo + chunk_size, len(data))
+    chunk = np.asarray(data[lo - 1:hi], dtype=np.float64)
+    prev = chunk[:-1]
+    curr = chunk[1:]
+    rising.append(np.flatnonzero((prev <= threshold) & (curr > threshold)) + lo)
+    falling.append(
+        np.flatnonzero((prev >= threshold) & (curr < threshold)) + lo
+    )
+
+  return np.concatenate(rising), np.concatenate(falling)
+
+
+def find_level_crossings(data, thresholds, chunk_size=CHUNK_SIZE):
+  """Find all crossings of a set of thresholds in one pass.
+
+  Each sample gets the level of the sorted thresholds below it, the
+  bin np.searchsorted would give, counted with one comparison per
+  threshold. Only the samples where the level changes are expanded
+  into crossings, so an extra threshold costs one comparison pass.
+  Crossings follow the same rules as find_crossings.
+
+  Args:
+    data: numpy array of voltages values
+    thresholds: list of voltage thresholds
+    chunk_size: number of samples processed at a time
+
+  Returns:
+    crossings: list of (rising, falling) sample indices of the
+               crossings of each threshold, in thresholds order
+  """
+  unique, inverse = np.unique(np.asarray(thresholds, dtype=np.float64),
+                              return_inverse=True)
+  found = [[np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]]
+  levels = [[np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]]
+  for lo in range(1, len(data), chunk_size):
+    hi = min(lo + chunk_size, len(data))
+    chunk = np.asarray(data[lo - 1:hi], dtype=np.float64)
+    below = np.zeros(len(chunk), dtype=np.min_scalar_type(len(unique)))
+    equal = np.zeros(len(chunk), dtype=bool)
+    compare = np.empty(len(chunk), dtype=bool)
+    for threshold in unique:
+      np.greater(chunk, threshold, out=compare)
+      below += compare  # thresholds < sample
+      np.equal(chunk, threshold, out=compare)
+      equal |= compare  # thresholds are unique, at most one is equal
+    below_eq = below + equal if equal.any() else below  # thresholds <= sample
+
+    # rising crosses thresholds [below[i-1], below[i]),
+    # falling crosses thresholds [below_eq[i], below_eq[i-1])
+
+    for k, (start, stop) in enumerate(((below[:-1], below[1:]),
+                                       (below_eq[1:], below_eq[:-1]))):
+      pos = np.flatnonzero(stop > start)
+      first = start[pos].astype(np.int64)
+      count = stop[pos].astype(np.int64) - first
+      offset = np.repeat(np.cumsum(count) - count, count)
+      found[k].append(np.repeat(pos + lo, count))
+      levels[k].append(np.repeat(first, count) + np.arange(len(offset)) -
+                       offset)
+
+  crossings = [[None, None] for _ in unique]
+  for k in range(2):
+    idx = np.concatenate(found[k])
+    level = np.concatenate(levels[k])
+    group = np.argsort(level, kind="stable")
+    bounds = np.cumsum(np.bincount(level, minlength=len(unique)))[:-1]
+    for j, part in enumerate(np.split(idx[group], bounds)):
+      crossings[j][k] = part
+  return [tuple(crossings[j]) for j in inverse.tolist()]
+
+
+def find_transitions(data, pairs, chunk_size=CHUNK_SIZE):
+  """Find the full-swing transitions between pairs of thresholds.
+
+  A rising transition goes from a rising crossing of the low threshold
+  to the next rising crossing of the high threshold, with no other
+  crossing of either threshold in between, and a falling transition
+  the other way round. Crossings of all thresholds are found in one
+  pass, and both ends are interpolated.
+
+  Args:
+    data: numpy array of voltages values
+    pairs: list of (low, high) voltage threshold pairs
+    chunk_size: number of samples processed at a time
+
+  Returns:
+    transitions: list of (rising, falling) for each pair, each a
+                 tuple of start and end sample positions
+  """
+  thresholds = sorted({v for pair in pairs for v in pair})
+  crossings = dict(zip(thresholds,
+                       find_level_crossings(data, thresholds, chunk_size)))
+
+  transitions = []
+  for low, high in pairs:
+    found = []
+    for begin, end, begin_threshold, end_threshold in (
+        (crossings[low][0], crossings[high][0], low, high),
+        (crossings[high][1], crossings[low][1], high, low)):
+      other = np.sort(np.concatenate(crossings[begin_threshold]))
+      same = np.sort(np.concatenate(crossings[end_threshold]))
+
+      # last crossing of the begin threshold at or before the end
+      # crossing must be the begin crossing, and no other crossing of
+      # the end threshold in between
+
+      pos = np.searchsorted(other, end, side="right") - 1
+      start = other[np.maximum(pos, 0)] if len(other) else np.zeros_like(end)
+      prev = np.searchsorted(same, end, side="left") - 1
+      prev_end = np.where(prev >= 0, same[np.maximum(prev, 0)]
+                          if len(same) else -1, -1)
+      valid = ((pos >= 0) & np.isin(start, begin) & (prev_end < start))
+      start = start[valid]
+      end = end[valid]
+      found.append((
+          start - interpolate_crossings(data, start, begin_threshold),
+          end - interpolate_crossings(data, end, end_threshold)
+      ))
+    transitions.append(tuple(found))
+  return transitions
+
+
+def interpolate_crossings(data, idx, threshold):
+  """Sub-sample position of crossings.
+
+  Args:
+    data: numpy array of voltages values
+    idx: sample indices of crossings, all larger than 0
+    threshold: voltage threshold
+
+  Returns:
+    interpolation: fraction of a sample period before idx
+                   where the threshold is met
+  """
+  curr = np.asarray(data[idx], dtype=np.float64)
+  prev = np.asarray(data[idx - 1], dtype=np.float64)
+  return (threshold - curr) / (prev - curr)
+
+
+def find_edge_events(scl_data, sda_data, v_30p, v_70p):
+  """Find the edge events of both SCL and SDA datalines.
+
+  Args:
+    scl_data: numpy array of SCL voltages
+    sda_data: numpy array of SDA voltages
+    v_30p: threshold reference point for state LOW
+    v_70p: threshold reference point for state HIGH
+
+  Returns:
+    idx: sorted sample indices where at least one crossing occurs
+    crossing: dictionary of boolean arrays aligned with idx, keyed by
+              "{line}_{30p|70p}_{rise|fall}"
+    interp: dictionary of interpolation arrays aligned with idx, keyed by
+            "{line}_{30p|70p}" (nan where the line does not cross)
+  """
+  found = {}
+  for line, data in (("scl", scl_data), ("sda", sda_data)):
+    for level, (rising, falling) in zip(
+        ("30p", "70p"), find_level_crossings(data, (v_30p, v_70p))):
+      found[f"{line}_{level}_rise"] = rising
+      found[f"{line}_{level}_fall"] = falling
+
+  idx = np.unique(np.concatenate(list(found.values())))
+  crossing = {}
+  for key, value in found.items():
+    mask = np.zeros(len(idx), dtype=bool)
+    mask[np.searchsorted(idx, value)] = True
+    crossing[key] = mask
+
+  interp = {}
+  for line, data in (("scl", scl_data), ("sda", sda_data)):
+    for level, threshold in (("30p", v_30p), ("70p", v_70p)):
+      mask = crossing[f"{line}_{level}_rise"] | crossing[f"{line}_{level}_fall"]
+      ratio = np.full(len(idx), np.nan)
+      ratio[mask] = interpolate_crossings(data, idx[mask], threshold)
+      interp[f"{line}_{level}"] = ratio
+
+  return idx, crossing, interp
+
+
+def iter_edge_events(scl_data, sda_data, v_30p, v_70p,
+                     window_size=WINDOW_SIZE, start=1, end=None, offset=0):
+  """Iterate over the edge events of SCL and SDA window by window.
+
+  Only one window of edge events is kept in memory, so memory-mapped
+  captures larger than RAM can be walked from start to end.
+
+  Args:
+    scl_data: numpy array of SCL voltages
+    sda_data: numpy array of SDA voltages
+    v_30p: threshold reference point for state LOW
+    v_70p: threshold reference point for state HIGH
+    window_size: number of samples searched at a time
+    start: first sample index to search, larger than offset
+    end: sample index after the last one to search (default: all)
+    offset: sample index of scl_data[0] and sda_data[0]
+
+  Yields:
+    event: tuple of the sample index, the crossing flags in EDGE_KEYS
+           order and the interpolation ratios in INTERP_KEYS order
+  """
+  if end is None:
+    end = len(sda_data) + offset
+  for lo in range(start, end, window_size):
+    hi = min(lo + window_size, end)
+    idx, crossing, interp = find_edge_events(
+        scl_data[lo - 1 - offset:hi - offset],
+        sda_data[lo - 1 - offset:hi - offset], v_30p, v_70p
+    )
+    yield from zip(
+        (idx + (lo - 1)).tolist(),
+        *[crossing[key].tolist() for key in EDGE_KEYS],
+        *[interp[key].tolist() for key in INTERP_KEYS]
+    )
+
+
+def iter_line_crossings(data, v_30p, v_70p, window_size=WINDOW_SIZE, start=1,
+                        end=None, offset=0):
+  """Iterate over the 30% / 70% crossings of one dataline.
+
+  The single-dataline counterpart of iter_edge_events, crossings at
+  the same sample come in LINE_KEYS order, the order the bus state
+  machine checks them.
+
+  Args:
+    data: numpy array of voltages
+    v_30p: threshold reference point for state LOW
+    v_70p: threshold reference point for state HIGH
+    window_size: number of samples searched at a time
+    start: first sample index to search, larger than offset
+    end: sample index after the last one to search (default: all)
+    offset: sample index of data[0]
+
+  Yields:
+    crossing: tuple of the sample index, the index of the crossing in
+              LINE_KEYS and its interpolation ratio
+  """
+  if end is None:
+    end = len(data) + offset
+  for lo in range(start, end, window_size):
+    hi = min(lo + window_size, end)
+    window = data[lo - 1 - offset:hi - offset]
+    (rise_30p, fall_30p), (rise_70p, fall_70p) = find_level_crossings(
+        window, (v_30p, v_70p))
+    found = [fall_30p, rise_30p, rise_70p, fall_70p]
+    idx = np.concatenate(found)
+    key = np.repeat(np.arange(len(found)), [len(f) for f in found])
+    order = np.lexsort((key, idx))
+    idx = idx[order]
+    key = key[order]
+    interp = np.empty(len(idx))
+    for k, threshold in enumerate((v_30p, v_30p, v_70p, v_70p)):
+      mask = key == k
+      interp[mask] = interpolate_crossings(window, idx[mask], threshold)
+    yield from zip((idx + (lo - 1)).tolist(), key.tolist(), interp.tolist())
+
+
+def iter_edges(data, v_30p, v_70p, reverse=False, first_window=FIRST_WINDOW,
+               max_window=CHUNK_SIZE):
+  """Iterate over the full-swing edges of a dataline window by window.
+
+  A 30% crossing following a 70% crossing is a falling edge, and a
+  70% crossing following a 30% crossing is a rising edge. Both
+  crossings are consumed by the edge. At the same sample, the 30%
+  crossing comes before the 70% crossing.
+
+  Windows start small and double up to max_window, so the search
+  can stop early after the first few edges of a long capture.
+
+  Args:
+    data: numpy array of voltages values
+    v_30p: threshold reference point for state LOW
+    v_70p: threshold reference point for state HIGH
+    reverse: search from the end of data, a crossing between data[i]
+             and data[i + 1] is then reported at sample i
+    first_window: number of samples of the first window
+    max_window: maximum number of samples of a window
+
+  Yields:
+    edges: tuple of sample indices and rising flags of the edges
+           found in the next window, in search order
+  """
+  if reverse:
+    data = data[::-1]
+  pending = None  # 0 for a 30% crossing, 1 for a 70% crossing
+  window = first_window
+  lo = 1
+  while lo < len(data):
+    hi = min(lo + window, len(data))
+    found = [np.concatenate(crossings) + (lo - 1) for crossings in
+             find_level_crossings(data[lo - 1:hi], (v_30p, v_70p))]
+    idx = np.concatenate(found)
+    level = np.repeat([0, 1], [len(found[0]), len(found[1])])
+    order = np.lexsort((level, idx))
+
+    edge_idx = []
+    edge_rising = []
+    for i, k in zip(idx[order].tolist(), level[order].tolist()):
+      if pending is not None and pending != k:
+        edge_idx.append(i)
+        edge_rising.append(k == 1)
+        pending = None
+      else:
+        pending = k
+
+    edge_idx = np.array(edge_idx, dtype=np.int64)
+    if reverse:
+      keep = edge_idx < len(data) - 1  # never report sample 0
+      yield (len(data) - 1 - edge_idx[keep],
+             np.array(edge_rising, dtype=bool)[keep])
+    else:
+      yield edge_idx, np.array(edge_rising, dtype=bool)
+    lo = hi
+    window = min(window * 2, max_window)
+
+
+def find_idle_splits(scl_data, sda_data, v_70p, min_samples):
+  """Find split points in the bus-idle regions after STOP.
+
+  A bus-idle region starts where SDA rises over 70% Vdd while SCL
+  stays above 70% Vdd, and lasts until the next 70% crossing of
+  either dataline.
+
+  Args:
+    scl_data: numpy array of SCL voltages
+    sda_data: numpy array of SDA voltages
+    v_70p: threshold reference point for state HIGH
+    min_samples: minimum length of the bus-idle region
+
+  Returns:
+    splits: sample index at the middle of each bus-idle region
+  """
+  scl_rise, scl_fall = find_crossings(scl_data, v_70p)
+  sda_rise, sda_fall = find_crossings(sda_data, v_70p)
+
+  # SCL is HIGH if its last crossing is rising (assume HIGH before any edge)
+  num_rise = np.searchsorted(scl_rise, sda_rise, side="right")
+  num_fall = np.searchsorted(scl_fall, sda_rise, side="right")
+  last_rise = np.where(num_rise > 0, scl_rise[np.maximum(num_rise - 1, 0)]
+                       if len(scl_rise) else -1, -1)
+  last_fall = np.where(num_fall > 0, scl_fall[np.maximum(num_fall - 1, 0)]
+                       if len(scl_fall) else -1, -1)
+  scl_high = last_rise >= last_fall
+
+  crossing = np.sort(np.concatenate([scl_rise, scl_fall, sda_rise, sda_fall]))
+  pos = np.searchsorted(crossing, sda_rise, side="right")
+  next_crossing = np.append(crossing, len(sda_data))[pos]
+  idle = scl_high & (next_crossing - sda_rise >= min_samples)
+
+  return (sda_rise[idle] + next_crossing[idle]) // 2
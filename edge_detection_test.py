@@ -0,0 +1,523 @@
+"""HummingBird edge detection parity test.
+
+The bus state machine over edge events found in bulk must measure
+the same as the per-sample loop it replaced, kept here as
+LegacyHummingBird, on synthetic captures of i2c_generator.
+"""
+import math
+import unittest
+
+from hummingbird import HummingBird
+from hummingbird import Logic
+from hummingbird import MEASURE_COUNTERS
+from i2c_generator import BusConfig
+from i2c_generator import iter_capture
+import numpy as np
+
+
+class LegacyHummingBird(HummingBird):
+  """HummingBird measuring with the per-sample loop.
+
+  The measurements are kept as the running max / min of each
+  parameter, the same as EventLog.extremes of the vectorized one.
+  """
+
+  def add_measurement(self, measure_field, field, new_result):
+    """Compare with exist measurement.
+
+    Args:
+      measure_field: measure value for each SPEC parameter
+      field: the name of the parameter field
+      new_result: new measurement to compare
+
+    Returns:
+      measure_field: measure value for each SPEC parameter
+    """
+    if "runt" in field:
+      measure_max = measure_field.get(field)
+      if measure_max:
+        measure_field[field].append(new_result)
+      else:
+        measure_field[field] = [new_result]
+    else:
+      measure_max = measure_field.get(field + "_max")
+      if measure_max:
+        measure_min = measure_field.get(field + "_min")
+        if measure_max[1] < new_result[1]:
+          measure_max[:] = new_result.copy()
+        elif measure_min[1] > new_result[1]:
+          measure_min[:] = new_result.copy()
+      else:
+        measure_field[field + "_max"] = new_result.copy()
+        measure_field[field + "_min"] = new_result.copy()
+
+    return measure_field
+
+  def measure_both_scl_sda(self):
+    """When both SCL and SDA data is provided.
+
+    Returns:
+      measure_field: measure value for each SPEC parameter
+      addr_list: device address included in the capture
+    """
+    measure_field = {}
+    addr_list = []
+    sda = Logic()
+    scl = Logic()
+    scl.state = 1  # assume SCL initial state is HIGH
+    read_flag = 0
+
+    v_sda = self.sda_data[0]
+    v_scl = self.scl_data[0]
+    v_low_scl = []
+    v_high_scl = []
+    v_low_sda = []
+    v_high_sda = []
+    t_su_dat_rising = t_su_dat_falling = None
+    addr = ""
+    scl_skip = 0
+    sda_skip = 0
+    t_sp = 2e-8  # ignore spikes with pulse width < 20ns
+    for i in range(1, len(self.sda_data)):
+      n_sda = self.sda_data[i]
+      n_scl = self.scl_data[i]
+      if v_scl >= self.v_30p and n_scl < self.v_30p:  # falling edge
+        interpolation = (self.v_30p - n_scl) / (v_scl - n_scl)
+        scl.i_30p = i - interpolation
+        scl.state = 0
+        if scl.i_70p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_fall_scl",
+              [i - interpolation, scl.i_30p - scl.i_70p]
+          )
+          self.scl_falling_edge += 1
+          scl.low_start = scl.i_30p
+          scl_skip = i + t_sp / self.sampling_period
+          scl.i_30p = scl.i_70p = None
+
+          ## Don't take t_buf into T_clk consideration
+
+          if scl.last_low_start is not None and self.data_start_flag:
+            measure_field = self.add_measurement(
+                measure_field, "T_clk",
+                [i - interpolation, scl.low_start - scl.last_low_start]
+            )
+          scl.last_low_start = scl.low_start
+
+          ## Finish one package in 9 SCL clk cycles, check finish at clk LOW
+
+          if self.data_start_flag == 9:
+            self.data_start_flag = 0
+            if self.first_packet:
+              addr_list.append(addr)
+              self.first_packet = 0
+        else:
+          if (scl.i_30p - scl.low_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_scl",
+                [i - interpolation, scl.i_30p - scl.low_end]
+            )
+        scl.i_30p = None
+
+      elif (i > scl_skip and
+            v_scl <= self.v_30p and n_scl > self.v_30p):  # rising edge
+        interpolation = (self.v_30p - n_scl) / (v_scl - n_scl)
+        scl.i_30p = i - interpolation
+        scl.state = None
+        if scl.i_70p is None:
+          scl.low_end = scl.i_30p
+          if scl.low_start is not None:
+            if v_low_scl:
+              measure_field = self.add_measurement(
+                  measure_field, "v_low_scl",
+                  [i - interpolation, np.median(v_low_scl),
+                   scl.low_end - scl.low_start]
+              )
+              v_low_scl = []
+            measure_field = self.add_measurement(
+                measure_field, "t_low",
+                [i - interpolation, scl.low_end - scl.low_start]
+            )
+
+      if v_scl <= self.v_70p and n_scl > self.v_70p:  # rising edge
+        interpolation = (self.v_70p - n_scl) / (v_scl - n_scl)
+        scl.i_70p = i - interpolation
+        scl.state = 1
+        if scl.i_30p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_rise_scl",
+              [i - interpolation, scl.i_70p - scl.i_30p]
+          )
+          self.scl_rising_edge += 1
+          scl.high_start = scl.i_70p
+          scl_skip = i + t_sp / self.sampling_period
+          scl.i_30p = scl.i_70p = None
+
+          ## Use data_start_flag avoid taking t_buf into T_clk
+
+          if scl.last_high_start is not None and self.data_start_flag:
+            measure_field = self.add_measurement(
+                measure_field, "T_clk",
+                [i - interpolation, scl.high_start - scl.last_high_start]
+            )
+          scl.last_high_start = scl.high_start
+          if ((self.restart_flag or self.start_flag) and
+              not self.data_start_flag):
+            self.data_start_flag = 1
+          elif self.data_start_flag:
+            self.data_start_flag += 1  # count SCL clk cycle at HIGH
+        else:
+          if (scl.i_70p - scl.high_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_scl",
+                [i - interpolation, scl.i_70p - scl.high_end]
+            )
+        scl.i_70p = None
+
+      elif (i > scl_skip and
+            v_scl >= self.v_70p and n_scl < self.v_70p):  # falling edge
+        interpolation = (self.v_70p - n_scl) / (v_scl - n_scl)
+        scl.i_70p = i - interpolation
+        scl.state = None
+        if scl.i_30p is None:
+          scl.high_end = scl.i_70p
+          if scl.high_start is not None:
+            if v_high_scl:
+              measure_field = self.add_measurement(
+                  measure_field, "v_high_scl",
+                  [i - interpolation, np.median(v_high_scl),
+                   scl.high_end - scl.high_start]
+              )
+              v_high_scl = []
+            measure_field = self.add_measurement(
+                measure_field, "t_high",
+                [i - interpolation, scl.high_end - scl.high_start]
+            )
+
+          ## check Read/Write at 8th SCL clk cycle
+
+          if (self.first_packet and
+              (self.data_start_flag == 8 and sda.state == 1)):
+            read_flag = 1
+
+          if self.first_packet and (0 < self.data_start_flag < 8):
+            if sda.state:
+              addr += "1"
+            else:
+              addr += "0"
+
+      if v_sda >= self.v_30p and n_sda < self.v_30p:  # falling edge
+        interpolation = (self.v_30p - n_sda) / (v_sda - n_sda)
+        sda.i_30p = i - interpolation
+        sda.state = 0
+        if sda.i_70p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_fall_sda",
+              [i - interpolation, sda.i_30p - sda.i_70p]
+          )
+          self.sda_falling_edge += 1
+          sda.low_start = sda.i_30p
+          sda_skip = i + t_sp / self.sampling_period
+          sda.i_30p = sda.i_70p = None
+        else:
+          if (sda.i_30p - sda.low_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_sda",
+                [i - interpolation, sda.i_30p - sda.low_end]
+            )
+
+      elif (i > sda_skip and
+            v_sda <= self.v_30p and n_sda > self.v_30p):  # rising edge
+        interpolation = (self.v_30p - n_sda) / (v_sda - n_sda)
+        sda.i_30p = i - interpolation
+        sda.state = None
+        if sda.i_70p is None:
+          sda.low_end = sda.i_30p
+          if v_low_sda:
+            if sda.low_start and sda.low_start < scl.low_start:
+              measure_field = self.add_measurement(
+                  measure_field, "v_low_sda",
+                  [i - interpolation, np.median(v_low_sda),
+                   sda.low_end - sda.low_start]
+              )
+            v_low_sda = []
+
+      if v_sda <= self.v_70p and n_sda > self.v_70p:  # rising edge
+        interpolation = (self.v_70p - n_sda) / (v_sda - n_sda)
+        sda.i_70p = i - interpolation
+        sda.state = 1
+        if sda.i_30p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_rise_sda",
+              [i - interpolation, sda.i_70p - sda.i_30p]
+          )
+          self.sda_rising_edge += 1
+          sda.high_start = sda.i_70p
+          sda_skip = i + t_sp / self.sampling_period
+          sda.i_30p = sda.i_70p = None
+        else:
+          if (sda.i_70p - sda.high_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_sda",
+                [i - interpolation, sda.i_70p - sda.high_end]
+            )
+
+      elif (i > sda_skip and
+            v_sda >= self.v_70p and n_sda < self.v_70p):  # falling edge
+        interpolation = (self.v_70p - n_sda) / (v_sda - n_sda)
+        sda.i_70p = i - interpolation
+        if sda.i_30p is None:
+          sda.high_end = sda.i_70p
+          sda.state = None
+          if v_high_sda:
+
+            # Ignore spike occur during SCL low
+
+            if sda.high_start and sda.high_start < scl.low_start:
+              measure_field = self.add_measurement(
+                  measure_field, "v_high_sda",
+                  [i - interpolation, np.median(v_high_sda),
+                   sda.high_end - sda.high_start]
+              )
+            v_high_sda = []
+
+      if ((scl.state == 0) and sda.high_end is not None and
+          (math.ceil(sda.high_end) == i) and self.data_start_flag and
+          (sda.high_start is None or sda.high_start < scl.low_start)):
+        if ((self.first_packet and self.data_start_flag == 9) or
+            (not self.first_packet and read_flag and
+             self.data_start_flag < 9) or
+            (not self.first_packet and not read_flag and
+             self.data_start_flag == 9)):
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_DAT_dev_falling",
+              [i - interpolation, sda.high_end - scl.low_start]
+          )
+        else:
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_DAT_host_falling",
+              [i - interpolation, sda.high_end - scl.low_start]
+          )
+
+      if ((scl.state == 0) and sda.low_end is not None and
+          (math.ceil(sda.low_end) == i) and self.data_start_flag and
+          (sda.low_start is None or sda.low_start < scl.low_start)):
+        if ((self.first_packet and self.data_start_flag == 9) or
+            (not self.first_packet and read_flag and
+             self.data_start_flag < 9) or
+            (not self.first_packet and not read_flag and
+             self.data_start_flag == 9)):
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_DAT_dev_rising",
+              [i - interpolation, sda.low_end - scl.low_start]
+          )
+        else:
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_DAT_host_rising",
+              [i - interpolation, sda.low_end - scl.low_start]
+          )
+
+      # Save setup time canditate, decide whether it is valid at scl.high_end
+
+      if ((sda.state == 0) and
+          scl.low_end is not None and (math.ceil(scl.low_end) == i) and
+          (scl.low_start is None or scl.low_start < sda.low_start)):
+        t_su_dat_falling = [i - interpolation, scl.low_end - sda.low_start]
+      if ((sda.state == 1) and
+          scl.low_end is not None and (math.ceil(scl.low_end) == i) and
+          (scl.low_start is None or scl.low_start < sda.high_start)):
+        t_su_dat_rising = [i - interpolation, scl.low_end - sda.high_start]
+
+      if ((scl.state == 1) and
+          sda.high_end is not None and (math.ceil(sda.high_end) == i)):
+        if (not self.stop_flag and
+            (sda.high_start is None or sda.high_start < scl.high_start)):  # Sr
+          self.restart_flag = 1
+          self.first_packet = 1
+          self.start_flag = 0
+          self.data_start_flag = 0
+          self.restart_num += 1
+          addr = ""
+          measure_field = self.add_measurement(
+              measure_field, "t_SU_STA",
+              [i - interpolation, sda.high_end - scl.high_start]
+          )
+        elif (self.stop_flag and
+              (sda.high_start is None or scl.high_start < sda.high_start)):  # S
+          self.start_flag = 1
+          self.first_packet = 1
+          self.stop_flag = 0
+          self.data_start_flag = 0
+          self.start_num += 1
+          addr = ""
+          if sda.high_start is not None:
+            measure_field = self.add_measurement(
+                measure_field, "t_BUF",
+                [i - interpolation, sda.high_end - sda.high_start]
+            )
+
+      if (scl.high_end is not None and math.ceil(scl.high_end) == i):
+        if self.data_start_flag:  # Only take when data_start_flag is active
+          if t_su_dat_rising:
+            if ((self.first_packet and self.data_start_flag == 9) or
+                (not self.first_packet and read_flag and
+                 self.data_start_flag < 9) or
+                (not self.first_packet and not read_flag and
+                 self.data_start_flag == 9)):
+              measure_field = self.add_measurement(
+                  measure_field, "t_SU_DAT_dev_rising", t_su_dat_rising
+              )
+            else:
+              measure_field = self.add_measurement(
+                  measure_field, "t_SU_DAT_host_rising", t_su_dat_rising
+              )
+          if t_su_dat_falling:
+            if ((self.first_packet and self.data_start_flag == 9) or
+                (not self.first_packet and read_flag and
+                 self.data_start_flag < 9) or
+                (not self.first_packet and not read_flag and
+                 self.data_start_flag == 9)):
+              measure_field = self.add_measurement(
+                  measure_field, "t_SU_DAT_dev_falling", t_su_dat_falling
+              )
+            else:
+              measure_field = self.add_measurement(
+                  measure_field, "t_SU_DAT_host_falling", t_su_dat_falling
+              )
+        t_su_dat_rising = t_su_dat_falling = None
+
+      if ((sda.state == 0) and scl.high_end is not None and
+          (math.ceil(scl.high_end) == i) and
+          (scl.high_start is None or scl.high_start < sda.low_start)):
+        if self.restart_flag:
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_STA_Sr",
+              [i - interpolation, scl.high_end - sda.low_start]
+          )
+        elif self.start_flag:
+          measure_field = self.add_measurement(
+              measure_field, "t_HD_STA_S",
+              [i - interpolation, scl.high_end - sda.low_start]
+          )
+
+      if ((scl.state == 1) and sda.low_end is not None and
+          (math.ceil(sda.low_end) == i) and
+          (sda.low_start is None or sda.low_start < scl.high_start)):
+        self.stop_flag = 1
+        read_flag = 0
+        self.restart_flag = self.start_flag = 0
+        self.stop_num += 1
+        self.data_start_flag = 0
+        measure_field = self.add_measurement(
+            measure_field, "t_SU_STO",
+            [i - interpolation, sda.low_end - scl.high_start]
+        )
+
+      # Constrain: captured data should include START or RESTART pattern
+
+      if (scl.state == 0) and not self.stop_flag:
+        v_low_scl.append(n_scl)
+      elif (scl.state == 1) and not self.stop_flag:
+        v_high_scl.append(n_scl)
+      if (sda.state == 0) and self.data_start_flag:
+        v_low_sda.append(n_sda)
+      elif (sda.state == 1) and self.data_start_flag:
+        v_high_sda.append(n_sda)
+
+      v_sda = n_sda
+      v_scl = n_scl
+
+    return measure_field, addr_list
+
+
+def generate(num_samples, **config):
+  """Synthetic capture as a [time, SCL, SDA] data_list."""
+  return np.vstack(list(iter_capture(BusConfig(**config), num_samples)))
+
+
+def prepare(cls, data_list, fields=None):
+  """HummingBird of cls with the datalines and thresholds determined."""
+  hum = cls("", data_list=data_list, fields=fields)
+  hum.determine_working_voltage(data_list[:, 1])
+  hum.determine_datatype(data_list[:, 1], data_list[:, 2])
+  return hum
+
+
+class EdgeDetectionTest(unittest.TestCase):
+  """Vectorized edge detection against the per-sample loop."""
+
+  def assert_same_measurement(self, data_list):
+    legacy = prepare(LegacyHummingBird, data_list)
+    expected, expected_addr = legacy.measure_both_scl_sda()
+    hum = prepare(HummingBird, data_list)
+    measure_field, addr_list = hum.measure_both_scl_sda()
+
+    self.assertTrue(expected)
+    self.assertEqual(measure_field.extremes(), expected)
+    self.assertEqual(addr_list, expected_addr)
+    for name in MEASURE_COUNTERS:
+      if name != "edge_events":
+        self.assertEqual(getattr(hum, name), getattr(legacy, name), name)
+
+  def assert_same_edges(self, data_list, fields):
+    full = prepare(HummingBird, data_list)
+    expected = full.measure_both_scl_sda()[0].extremes()
+    hum = prepare(HummingBird, data_list, fields)
+    measure_field, addr_list = hum.measure_both_scl_sda()
+
+    extremes = measure_field.extremes()
+    self.assertTrue(extremes)
+    self.assertEqual(extremes, {
+        key: value for key, value in expected.items()
+        if measure_field.keeps(key.replace("_max", "").replace("_min", ""))
+    })
+    for name in ["scl_rising_edge", "scl_falling_edge", "sda_rising_edge",
+                 "sda_falling_edge"]:
+      self.assertEqual(getattr(hum, name), getattr(full, name), name)
+    return hum, full, addr_list
+
+  def test_edge_fields_without_decode(self):
+    hum, _, addr_list = self.assert_same_edges(
+        generate(300000, noise=0.05, runt=0.3, stretch=0.3, seed=3),
+        ["t_rise_scl", "t_fall_sda", "t_low", "t_high"]
+    )
+    self.assertEqual(hum.start_num, 0)
+    self.assertEqual(addr_list, [])
+
+  def test_level_fields_with_decode(self):
+    hum, full, addr_list = self.assert_same_edges(
+        generate(300000, sample_rate=2e7, mode="Standard_Mode",
+                 t_rise=5e-7, t_fall=5e-8, addresses=(0x50, 0x1A)),
+        ["t_rise_scl", "v_nl_sda"]
+    )
+    self.assertEqual(hum.start_num, full.start_num)
+    self.assertTrue(addr_list)
+
+  def test_standard_mode(self):
+    self.assert_same_measurement(
+        generate(300000, sample_rate=2e7, mode="Standard_Mode",
+                 t_rise=5e-7, t_fall=5e-8, addresses=(0x50, 0x1A))
+    )
+
+  def test_fast_mode(self):
+    self.assert_same_measurement(generate(200000))
+
+  def test_fast_mode_plus(self):
+    self.assert_same_measurement(
+        generate(200000, sample_rate=2e8, mode="Fast_Mode_Plus",
+                 t_rise=5e-8, t_fall=1e-8, vdd=1.8)
+    )
+
+  def test_noise_runt_stretch(self):
+    self.assert_same_measurement(
+        generate(300000, noise=0.05, runt=0.3, stretch=0.3, seed=3)
+    )
+
+  def test_float32(self):
+    self.assert_same_measurement(
+        generate(200000, seed=5).astype(np.float32).astype(np.float64)
+    )
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,157 @@
+"""HummingBird measurement event log.
+
+Every measurement of the bus state machine is appended to one
+numpy structured array, and the max / min of each SPEC parameter
+are taken from it afterwards with reductions grouped by parameter.
+"""
+import numpy as np
+
+
+PARAMS = [
+    "v_high_scl", "v_low_scl", "v_high_sda", "v_low_sda", "T_clk",
+    "t_rise_sda", "t_rise_scl", "t_fall_sda", "t_fall_scl",
+    "t_HD_DAT_host_rising", "t_HD_DAT_host_falling", "t_HD_DAT_dev_rising",
+    "t_HD_DAT_dev_falling", "t_low", "t_high", "t_SU_STA", "t_SU_STO",
+    "t_BUF", "t_HD_STA_S", "t_HD_STA_Sr", "t_SU_DAT_host_rising",
+    "t_SU_DAT_host_falling", "t_SU_DAT_dev_rising", "t_SU_DAT_dev_falling",
+    "runt_scl", "runt_sda"
+]
+PARAM_ID = {param: k for k, param in enumerate(PARAMS)}
+RUNT_PARAMS = ["runt_scl", "runt_sda"]
+RUNT_IDS = [PARAM_ID[param] for param in RUNT_PARAMS]
+# measured from the crossings of each dataline alone, without bus decode
+EDGE_PARAMS = {"t_rise_scl", "t_fall_scl", "t_rise_sda", "t_fall_sda",
+               "t_low", "t_high"} | set(RUNT_PARAMS)
+EVENT_DTYPE = np.dtype([
+    ("param", np.int16), ("idx", np.float64), ("value", np.float64),
+    ("width", np.float64)
+])
+
+
+def measured_params(fields):
+  """Parameters to measure for fields of the report.
+
+  Runt pulses are always measured, they are shown on every report.
+
+  Args:
+    fields: report fields, ex: "t_rise_scl", "v_nl_sda", "f_clk",
+            None for all
+
+  Returns:
+    params: set of PARAMS to measure, None for all
+  """
+  if fields is None:
+    return None
+  params = set(RUNT_PARAMS)
+  for f in fields:
+    f = f.replace("v_nl", "v_low").replace("v_nh", "v_high")
+    params.add("T_clk" if f == "f_clk" else f)
+  return params
+
+
+def needs_bus_decode(params):
+  """Whether the START / STOP and address decode is needed for params.
+
+  HIGH / LOW voltages and f_clk are only taken between START and STOP,
+  so they need the decode as the protocol timing parameters do.
+
+  Args:
+    params: set of PARAMS to measure, None for all
+
+  Returns:
+    decode: False if all params are in EDGE_PARAMS
+  """
+  return params is None or not params <= EDGE_PARAMS
+
+
+class EventLog():
+  """Growable structured array of measurement events.
+
+  Events are kept in the order they are measured. The array doubles
+  its capacity when full, so appending stays amortized O(1).
+
+  Attributes:
+    events: preallocated EVENT_DTYPE array, events[:size] are valid
+    size: number of events
+    params: set of the parameters kept, None for all
+  """
+
+  def __init__(self, params=None, capacity=1024):
+    self.events = np.zeros(max(capacity, 1), dtype=EVENT_DTYPE)
+    self.size = 0
+    self.params = params
+
+  def __len__(self):
+    return self.size
+
+  def __getstate__(self):
+    # only pickle the valid events when sent back from a worker process
+    return {"events": self.events[:self.size].copy(), "size": self.size,
+            "params": self.params}
+
+  def keeps(self, field):
+    """Whether measurements of the parameter field are kept."""
+    return self.params is None or field in self.params
+
+  def reserve(self, size):
+    """Grow the capacity to at least size events."""
+    if size > len(self.events):
+      events = np.zeros(max(size, len(self.events) * 2), dtype=EVENT_DTYPE)
+      events[:self.size] = self.events[:self.size]
+      self.events = events
+
+  def append(self, field, new_result):
+    """Append a measurement event.
+
+    Args:
+      field: the name of the parameter field in PARAMS
+      new_result: [sample index, value] or [sample index, value, width]
+    """
+    if self.params is not None and field not in self.params:
+      return
+    if self.size == len(self.events):
+      self.reserve(self.size + 1)
+    width = new_result[2] if len(new_result) > 2 else np.nan
+    self.events[self.size] = (PARAM_ID[field], new_result[0], new_result[1],
+                              width)
+    self.size += 1
+
+  def extend(self, other):
+    """Append all events of another EventLog, after the existing ones."""
+    self.reserve(self.size + other.size)
+    self.events[self.size:self.size + other.size] = other.events[:other.size]
+    self.size += other.size
+
+  def extremes(self):
+    """Max and min measurement of each parameter.
+
+    Events are sorted by parameter then value with a stable sort, so
+    the first event of each group is the earliest max or min, the same
+    one a running comparison would keep.
+
+    Returns:
+      measure_field: "{field}_max" and "{field}_min" measurement of each
+                     measured parameter as [sample index, value(, width)],
+                     and the list of all [sample index, width] of
+                     "runt_scl" and "runt_sda"
+    """
+    events = self.events[:self.size]
+    runt = np.isin(events["param"], RUNT_IDS)
+    measure_field = {}
+    for param in RUNT_IDS:
+      found = events[events["param"] == param]
+      if len(found):
+        measure_field[PARAMS[param]] = np.column_stack(
+            [found["idx"], found["value"]]).tolist()
+
+    events = events[~runt]
+    for suffix, value in (("_max", -events["value"]),
+                          ("_min", events["value"])):
+      order = np.lexsort((value, events["param"]))
+      param = events["param"][order]
+      first = order[np.flatnonzero(np.diff(param, prepend=-1))]
+      for param, idx, value, width in events[first].tolist():
+        result = [idx, value] if np.isnan(width) else [idx, value, width]
+        measure_field[PARAMS[param] + suffix] = result
+
+    return measure_field
@@ -2,16 +2,168 @@
 
 methods related to the output report.
 """
+import base64
 import datetime
 import math
 import os
 import typing
 
 import numpy as np
+from spec_limits import profile_status
+
+
+POINT_BUDGET = 1000  # maximum number of points of a polyline
+ZOOM_LEVELS = 1 << 14  # quantization levels of zoom-in waveforms
+
+
+def EnvelopeIndex(data: np.ndarray, resolution: int,
+                  budget: int = POINT_BUDGET):
+  """Find min/max envelope samples of a polyline.
+
+  Samples are grouped in columns of a multiple of resolution samples,
+  so the column positions match the markers on the plot. Each column
+  keeps its minimum and maximum sample in time order, so spikes and
+  runts between columns are never dropped.
+
+  The points are capped at budget however long the data is, one
+  column of two points covers about two pixels of the report.
+
+  Args:
+    data: numpy array of voltages
+    resolution: number of samples per x unit of the plot
+    budget: maximum number of points
+
+  Returns:
+    idx: sample index of each point, two points per column,
+         or every sample if step is 1
+    step: number of samples per column
+  """
+  columns = -(-len(data) // resolution)
+  step = resolution * max(-(-columns * 2 // budget), 1)
+  if step == 1:
+    return np.arange(len(data)), step
+
+  full = len(data) // step * step
+  blocks = np.asarray(data[:full]).reshape(-1, step)
+  lo = np.arange(0, full, step)
+  first = lo + np.minimum(blocks.argmin(axis=1), blocks.argmax(axis=1))
+  last = lo + np.maximum(blocks.argmin(axis=1), blocks.argmax(axis=1))
+  if full < len(data):
+    tail = np.asarray(data[full:])
+    first = np.append(first, full + min(tail.argmin(), tail.argmax()))
+    last = np.append(last, full + max(tail.argmin(), tail.argmax()))
+
+  return np.stack([first, last], axis=1).ravel(), step
+
+
+def PolylinePoints(data: np.ndarray, data_max: np.float64, resolution: int,
+                   upscale_x: float, upscale_y: float, offset_y: int,
+                   budget: int = POINT_BUDGET):
+  """Generate min/max envelope points of a polyline.
+
+  Args:
+    data: numpy array of voltages
+    data_max: data maximum value
+    resolution: number of samples per x unit of upscale_x
+    upscale_x: x scale of resolution samples
+    upscale_y: y scale of voltage
+    offset_y: y offset of data_max
+    budget: maximum number of points
+
+  Returns:
+    points: polyline points attribute
+  """
+  idx, step = EnvelopeIndex(data, resolution, budget)
+  x = np.rint((idx // step * step) // resolution * upscale_x).astype(int)
+  y = ((data_max - np.asarray(data[idx])) * upscale_y + offset_y).astype(int)
+  # drop the points inside a horizontal run, they add nothing to the plot
+  keep = np.ones(len(idx), dtype=bool)
+  keep[1:-1] = (y[1:-1] != y[:-2]) | (y[1:-1] != y[2:])
+
+  return " ".join(
+      f"{xx},{yy}" for xx, yy in zip(x[keep].tolist(), y[keep].tolist())
+  )
+
+
+class ZoomBlob():
+  """Zoom-in waveform blob.
+
+  The envelope points of all zoom-in plots are packed into one blob
+  embedded in the report, and their polylines are drawn by the
+  browser when the row is clicked. Each window adds at most
+  POINT_BUDGET points, however many samples it spans.
+
+  Points are quantized to ZOOM_LEVELS levels between the minimum
+  and maximum of the dataline, and stored as little-endian int16
+  deltas of the quantized values in base64.
+
+  Attributes:
+    lines: dictionary of (data, data_min, data_max) of each dataline
+    windows: dictionary of the blob position of each
+             (dataline, start_idx, end_idx) window
+    codes: quantized points of the windows added so far
+    size: number of points added so far
+  """
+
+  def __init__(self, lines: typing.Dict[str, typing.Tuple[np.ndarray,
+                                                          np.float64,
+                                                          np.float64]]):
+    self.lines = lines
+    self.windows = {}
+    self.codes = []
+    self.size = 0
+
+  def lsb(self, name: str):
+    """Voltage of one quantization level of a dataline."""
+    _, data_min, data_max = self.lines[name]
+    return (data_max - data_min) / (ZOOM_LEVELS - 1) or 1
+
+  def add(self, name: str, start_idx: int, end_idx: int):
+    """Add a zoom-in window of a dataline.
+
+    Args:
+      name: dataline name
+      start_idx: first sample index of the window
+      end_idx: sample index after the last one of the window
+
+    Returns:
+      zoom: blob position, number of points, samples per column
+            and quantization of the window
+    """
+    key = (name, start_idx, end_idx)
+    if key not in self.windows:
+      data, data_min, _ = self.lines[name]
+      data = data[start_idx:end_idx]
+      resolution = min(max(len(data) // 2000, 1), 150)
+      idx, step = EnvelopeIndex(data, resolution)
+      code = np.rint((np.asarray(data[idx], dtype=np.float64) - data_min) /
+                     self.lsb(name))
+      self.codes.append(np.clip(code, 0, ZOOM_LEVELS - 1).astype(np.int32))
+      self.windows[key] = {
+          "pos": self.size, "len": len(idx), "step": step,
+          "per": 1 if step == 1 else 2, "base": data_min,
+          "lsb": self.lsb(name)
+      }
+      self.size += len(idx)
+
+    return self.windows[key]
+
+  def html(self):
+    """Blob element to write in the html report."""
+    codes = np.concatenate([np.zeros(0, dtype=np.int32)] + self.codes)
+    delta = np.diff(codes, prepend=0).astype("<i2")
+    blob = base64.b64encode(delta.tobytes()).decode("ascii")
+    return (
+        "\n\t<script id='zoom_blob' type='application/octet-stream'>"
+        f"{blob}</script>"
+    )
 
 
 def SVGFile(data: np.ndarray, data_max: np.float64, data_min: np.float64,
-            rect_idx: int, rect_width: int, field: str, vs: float):
+            rect_idx: int, rect_width: int, field: str, v_30p: float,
+            v_70p: float,
+            zoom: typing.Optional[typing.Dict[str, float]] = None,
+            labels: typing.Tuple[str, str] = ("30 %", "70 %")):
   """Generate SVG plot.
 
   Args:
@@ -21,7 +173,11 @@ def SVGFile(data: np.ndarray, data_max: np.float64, data_min: np.float64,
     rect_idx: index where the worst pattern occurs
     rect_width: the index width of the worst pattern
     field: the name of the parameter field
-    vs: working voltage, for 30p and 70p marker on plot
+    v_30p: threshold of state LOW, for the marker on plot
+    v_70p: threshold of state HIGH, for the marker on plot
+    zoom: window of data added to ZoomBlob, the polyline of a
+          zoom-in plot is then drawn by the browser instead of embedded
+    labels: text of the LOW and HIGH markers
 
   Returns:
     SVG plot to write in the html report.
@@ -82,8 +238,8 @@ def SVGFile(data: np.ndarray, data_max: np.float64, data_min: np.float64,
     yy2 = (data_max - yy2) * upscale_y + 60
     xx2 = xx2 // resolution * upscale_x
 
-    y30p = (data_max - vs * 0.3) * upscale_y + 60
-    y70p = (data_max - vs * 0.7) * upscale_y + 60
+    y30p = (data_max - v_30p) * upscale_y + 60
+    y70p = (data_max - v_70p) * upscale_y + 60
 
     rect_width = max(rect_width // resolution * upscale_x, 7)
     rect_x = rect_idx // resolution * upscale_x - rect_width
@@ -96,60 +252,69 @@ def SVGFile(data: np.ndarray, data_max: np.float64, data_min: np.float64,
           f"\n\t\t\t\t<line x1={xx1 - 15} y1={yy1} x2={xx1 + 15} y2={yy1} class='line'/>"
       )
       if abs(yy1 - y30p) < abs(yy1 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[1]}</text>"
     elif ((("SU_STA" in field or "SU_STO" in field) and "sda" in field) or
           ("HD_STA" in field and "scl" in field)):
       svgfile += (
           f"\n\t\t\t\t<line x1={xx2 - 15} y1={yy2} x2={xx2 + 15} y2={yy2} class='line'/>"
       )
       if abs(yy2 - y30p) < abs(yy2 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[1]}</text>"
     elif (("SU" in field and "sda" in field) or
           ("HD" in field and "scl" in field)):
       svgfile += (
           f"\n\t\t\t\t<line x1={xx1 - 15} y1={yy1} x2={xx1 + 15} y2={yy1} class='line'/>"
       )
       if abs(yy1 - y30p) < abs(yy1 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[1]}</text>"
     elif (("SU" in field and "scl" in field) or
           ("HD" in field and "sda" in field)):
       svgfile += (
           f"\n\t\t\t\t<line x1={xx2 - 15} y1={yy2} x2={xx2 + 15} y2={yy2} class='line'/>"
       )
       if abs(yy2 - y30p) < abs(yy2 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[1]}</text>"
     elif not ("BUF" in field and "scl" in field):
       svgfile += (
           f"\n\t\t\t\t<line x1={xx1 - 15} y1={yy1} x2={xx1 + 15} y2={yy1} class='line'/>"
           f"\n\t\t\t\t<line x1={xx2 - 15} y1={yy2} x2={xx2 + 15} y2={yy2} class='line'/>"
       )
       if abs(yy1 - y30p) < abs(yy1 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx1 - 110} y={yy1} class='text'>{labels[1]}</text>"
       if abs(yy2 - y30p) < abs(yy2 - y70p):
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>30 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[0]}</text>"
       else:
-        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>70 %</text>"
+        svgfile += f"\n\t\t\t\t<text x={xx2 + 30} y={yy2} class='text'>{labels[1]}</text>"
 
   # Data Polyline
 
-  points = ""
   if field == "scl_show" or field == "sda_show":
-    for i in range(0, len(data), resolution):
-      points += f"{i // resolution * upscale_x},{int((data_max - data[i]) * upscale_y + 120)} "
+    points = PolylinePoints(data, data_max, resolution, upscale_x, upscale_y,
+                            120)
     svgfile += f"\n\t\t\t\t<polyline points='{points}' class='plotline'/>"
+  elif zoom is not None:
+    svgfile += (
+        f"\n\t\t\t\t<polyline class='plotline zoom' data-pos='{zoom['pos']}'"
+        f" data-len='{zoom['len']}' data-step='{zoom['step']}'"
+        f" data-per='{zoom['per']}' data-base='{zoom['base']}'"
+        f" data-lsb='{zoom['lsb']}' data-max='{data_max}'"
+        f" data-res='{resolution}' data-upx='{upscale_x}'"
+        f" data-upy='{upscale_y}'/>"
+        "\n\t\t\t</svg>\n\t\t</div>\n\t</div>"
+    )
   else:
-    for i in range(0, len(data), resolution):
-      points += f"{i // resolution * upscale_x},{int((data_max - data[i]) * upscale_y + 60)} "
+    points = PolylinePoints(data, data_max, resolution, upscale_x, upscale_y,
+                            60)
     svgfile += (
         f"\n\t\t\t\t<polyline points='{points}' class='plotline'/>\n\t\t\t</svg>\n\t\t</div>\n\t</div>"
     )
@@ -157,6 +322,29 @@ def SVGFile(data: np.ndarray, data_max: np.float64, data_min: np.float64,
   return svgfile
 
 
+def HistogramSVG(counts: np.ndarray, width: int = 200, height: int = 40):
+  """Generate a small SVG bar chart of a histogram.
+
+  Args:
+    counts: number of values in each bin
+    width: width of the chart
+    height: height of the chart
+
+  Returns:
+    svg: inline SVG element
+  """
+  bar = width / len(counts)
+  top = max(int(np.max(counts)), 1)
+  rects = []
+  for k, count in enumerate(counts.tolist()):
+    if count:
+      h = max(count / top * height, 1)
+      rects.append(f"<rect x={k * bar:.1f} y={height - h:.1f} "
+                   f"width={bar:.1f} height={h:.1f} />")
+  return (f"<svg class='hist' viewBox='0 0 {width} {height}' "
+          f"preserveAspectRatio='none'>{''.join(rects)}</svg>")
+
+
 def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_stretch: bool,
                      values: typing.Dict[str, np.float64],
                      result: typing.Dict[str, np.float64],
@@ -164,7 +352,9 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
                      svg_fields: typing.Dict[str, str],
                      addr: typing.List[str], sampling_rate: int,
                      waveform_info: typing.List[int],
-                     save_folder: str):
+                     save_folder: str,
+                     param_stats: typing.Optional[typing.Dict] = None,
+                     profiles: typing.Optional[typing.Dict] = None):
   """Write HTML report.
 
   Args:
@@ -183,6 +373,10 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
     sampling_rate: sampling rate of the analog data
     waveform_info: edge count and pattern count info list
     save_folder: optional input when using CMD
+    param_stats: ParamStats of each field, shown as a distribution table
+    profiles: pass (0) / fail (1) / not measured (None) of each field for
+              each operation mode and working voltage, shown as a
+              pass / fail matrix
 
   Returns:
     report_path: save path for current report.
@@ -205,10 +399,11 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
       "t_HD_DAT_dev_falling", "t_rise_sda", "t_rise_scl", "t_fall_sda",
       "t_fall_scl", "t_SU_STO", "t_BUF"
   ]
-  spec_field = [
-      "v_low", "v_high", "v_nh", "v_nl", "t_rise_max", "t_rise_min",
-      "t_fall_max", "t_fall_min", "t_low", "t_high", "f_clk", "t_SU_DAT",
-      "t_HD_DAT", "t_HD_STA", "t_SU_STA", "t_SU_STO", "t_BUF"
+  spec_field = ["v_low", "v_high"] + [
+      f"{param}_{bound}" for param in [
+          "v_nl", "v_nh", "f_clk", "t_low", "t_high", "t_SU_STA", "t_HD_STA",
+          "t_SU_DAT", "t_HD_DAT", "t_rise", "t_fall", "t_SU_STO", "t_BUF"
+      ] for bound in ["min", "max"]
   ]
   time_now = datetime.datetime.now()
   report_path = os.path.join(
@@ -375,12 +570,53 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
     .text2 {
       fill: black;
       font-size: 20px;
+    }
+    .hist {
+      width: 200px;
+      height: 40px;
+      fill: #555;
     }"""
 
     script = """\n\t<script>
+    let zoom_codes = null;
+    function DecodeZoom() {
+      let bytes = atob(document.getElementById("zoom_blob").textContent);
+      let delta = new Int16Array(bytes.length / 2);
+      for (let i = 0; i < delta.length; i++) {
+        delta[i] = bytes.charCodeAt(2 * i) | (bytes.charCodeAt(2 * i + 1) << 8);
+      }
+      zoom_codes = new Int32Array(delta.length);
+      let code = 0;
+      for (let i = 0; i < delta.length; i++) {
+        code += delta[i];
+        zoom_codes[i] = code;
+      }
+    }
+    function RenderZoom(x) {
+      selector = `#${x}_hide .zoom, #${x}_scl_hide .zoom, #${x}_sda_hide .zoom`;
+      lines = document.querySelectorAll(selector);
+      if (lines.length != 0 && zoom_codes == null) {
+        DecodeZoom();
+      }
+      lines.forEach(function(itm, idx, arr) {
+        let d = itm.dataset;
+        let pos = Number(d.pos), per = Number(d.per), step = Number(d.step);
+        let res = Number(d.res), upx = Number(d.upx);
+        let max = Number(d.max), upy = Number(d.upy);
+        let points = [];
+        for (let k = 0; k < Number(d.len); k++) {
+          let x = Math.round(Math.floor(Math.floor(k / per) * step / res) * upx);
+          let v = Number(d.base) + zoom_codes[pos + k] * Number(d.lsb);
+          points.push(`${x},${Math.trunc((max - v) * upy + 60)}`);
+        }
+        itm.setAttribute("points", points.join(" "));
+        itm.classList.remove("zoom");
+      })
+    }
     function ShowSVG(x) {
       console.log(x);
       HideRunt();
+      RenderZoom(x);
       ele_self = document.getElementById(x);
       selector1 = `#${x}_hide, #${x}_scl_hide, #${x}_sda_hide, `;
       selector2 = `#${x}_rect, #${x}_scl_rect, #${x}_sda_rect, #${x}_line, #${x}_poly`;
@@ -605,17 +841,11 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
         "V", "V", "V<sub>DD</sub>", "V<sub>DD</sub>", "kHz", "us", "us", "us",
         "us", "us", "us", "us", "us", "ns", "ns", "us", "us"
     ]
-    column3 = [
-        "-", spec["v_high"], spec["v_nl"], spec["v_nh"], "0", spec["t_low"],
-        spec["t_high"], spec["t_SU_STA"], spec["t_HD_STA"], spec["t_SU_DAT"],
-        "0", spec["t_SU_DAT"], "0", spec["t_rise_min"], spec["t_fall_min"],
-        spec["t_SU_STO"], spec["t_BUF"]
-    ]
-    column4 = [
-        spec["v_low"], "-", "-", "-", spec["f_clk"], "-", "-", "-", "-", "-",
-        spec["t_HD_DAT"], "-", spec["t_HD_DAT"], spec["t_rise_max"],
-        spec["t_fall_max"], "-", "-"
-    ]
+    column3 = ["-", spec["v_high"]] + [spec[k] for k in spec_field[2::2]]
+    column4 = [spec["v_low"], "-"] + [spec[k] for k in spec_field[3::2]]
+    # t_SU_DAT and t_HD_DAT of both data WRITE and READ
+    column3[11:11] = column3[9:11]
+    column4[11:11] = column4[9:11]
     column5 = []
     column6, column7, column8, column9, column10 = [], [], [], [], []
 
@@ -702,6 +932,79 @@ def OutputReportFile(mode: str, spec: typing.Dict[str, float], vs: float, clk_st
         "\n\t<div><b>[3]</b> t<sub>VD;DAT</sub> and t<sub>VD;ACK</sub> are included in t<sub>HD;DAT</sub></div>"
     )
 
+    if profiles:
+      report.write(
+          "\n\t<h2>SPEC Test of Every Operation Mode and Voltage</h2>"
+          "\n\t<table>\n\t\t<tr>\n\t\t\t<th>Parameter</th>"
+      )
+      for name in profiles:
+        report.write(f"\n\t\t\t<th>{name}</th>")
+      report.write("\n\t\t</tr>")
+      for f in field:
+        if all(checks.get(f) is None for checks in profiles.values()):
+          continue
+        report.write(f"\n\t\t<tr>\n\t\t\t<td>{f}</td>")
+        for checks in profiles.values():
+          if f not in checks:
+            report.write("\n\t\t\t<td class='NA'>N/A</td>")
+          elif checks[f] is None:
+            report.write("\n\t\t\t<td class='NA'>Not measured</td>")
+          elif checks[f]:
+            report.write("\n\t\t\t<td class='critical'>Fail</td>")
+          else:
+            report.write("\n\t\t\t<td>Pass</td>")
+        report.write("\n\t\t</tr>")
+      report.write("\n\t\t<tr>\n\t\t\t<td><b>Fail</b></td>")
+      for checks in profiles.values():
+        fail = sum(1 for value in checks.values() if value)
+        report.write(f"\n\t\t\t<td><b>{fail}</b></td>")
+      report.write("\n\t\t</tr>\n\t\t<tr>\n\t\t\t<td><b>Result</b></td>")
+      style = {"Fail": " class='critical'", "Incomplete": " class='NA'"}
+      for checks in profiles.values():
+        status = profile_status(checks)
+        report.write(
+            f"\n\t\t\t<td{style.get(status, '')}><b>{status}</b></td>"
+        )
+      report.write("\n\t\t</tr>\n\t</table>")
+
+    if param_stats:
+      report.write(
+          "\n\t<h2>Distribution of All Measurements</h2>\n\t<table>\n\t\t<tr>"
+      )
+      for column in ["Parameter", "Unit", "Count", "Mean", "Std", "P1", "P50",
+                     "P99", "Histogram (Min - Max)"]:
+        report.write(f"\n\t\t\t<th>{column}</th>")
+      report.write("\n\t\t</tr>")
+      # transition fields such as t_rise_scl_10_90 follow the SPEC fields
+      for f in field + [k for k in param_stats if k not in field]:
+        stats = param_stats.get(f)
+        if stats is None or not stats.count:
+          continue
+        if "t_rise_" in f or "t_fall_" in f:
+          unit, scale = "ns", 1e9
+        elif "t_" in f:
+          unit, scale = "us", 1e6
+        elif "f_" in f:
+          unit, scale = "kHz", 1e-3
+        elif "v_n" in f:
+          unit, scale = "V<sub>DD</sub>", 1
+        else:
+          unit, scale = "V", 1
+        summary = stats.summary()
+        counts, edges = stats.histogram()
+        row = [f, unit, summary["count"]] + [
+            f"{summary[k] * scale:.3f}" for k in ["mean", "std", "p1", "p50",
+                                                  "p99"]
+        ] + [
+            HistogramSVG(counts) +
+            f"<br>{edges[0] * scale:.3f} - {edges[-1] * scale:.3f}"
+        ]
+        report.write("\n\t\t<tr>")
+        for column in row:
+          report.write(f"\n\t\t\t<td>{column}</td>")
+        report.write("\n\t\t</tr>")
+      report.write("\n\t</table>")
+
     for plot in svg_fields.values():
       report.write(plot)
 
@@ -5,14 +5,40 @@ run on Saleae Logic2 Software. Supporting main function
 would be running I2C electrical test on capture data.
 
 """
-import csv
+import concurrent.futures
+import copy
+import datetime
 import math
 import os
 import sys
 
+from data_loader import load_file
+from edge_detection import CHUNK_SIZE
+from edge_detection import find_idle_splits
+from edge_detection import find_transitions
+from edge_detection import iter_edges
+from edge_detection import iter_line_crossings
+from edge_detection import iter_edge_events
+from edge_detection import WINDOW_SIZE
+from event_log import EventLog
+from event_log import measured_params
+from event_log import needs_bus_decode
+from event_log import PARAMS
 from generate_report import OutputReportFile
 from generate_report import SVGFile
+from generate_report import ZoomBlob
+from instrumentation import Instrumentation
 import numpy as np
+from param_stats import ParamStats
+from result_export import append_jsonl
+from result_export import save_events
+from spec_limits import compile_profiles
+from spec_limits import evaluate
+from spec_limits import field_limits
+from spec_limits import FIELDS
+from spec_limits import profile_status
+from spec_limits import registry
+from spec_limits import spec_limitation
 
 
 class Logic():
@@ -45,6 +71,147 @@ class Logic():
     self.last_low_start = None
     self.last_high_start = None
 
+  def __eq__(self, other):
+    return vars(self) == vars(other)
+
+
+class BusState():
+  """Bus State.
+
+  Everything the bus state machine carries from one edge event
+  to the next, so the measurement could stop at any edge event and
+  continue later from another window, segment or process.
+
+  Attributes:
+    scl: logic state of SCL dataline
+    sda: logic state of SDA dataline
+    stop_flag: STOP pattern detected, see HummingBird
+    start_flag: START pattern detected, see HummingBird
+    restart_flag: RESTART pattern detected, see HummingBird
+    data_start_flag: SCL clock cycle count of the packet, see HummingBird
+    first_packet: the first packet after START or RESTART pattern
+    read_flag: READ bit detected in the first packet
+    addr: address bits collected in the first packet
+    scl_skip: SCL crossing before this index is ignored as a spike
+    sda_skip: SDA crossing before this index is ignored as a spike
+    interpolation: sub-sample offset of the latest crossing
+    t_su_dat_rising: data setup time candidate of SDA rising edge
+    t_su_dat_falling: data setup time candidate of SDA falling edge
+    v_low_scl: sample ranges of SCL at LOW level not measured yet
+    v_high_scl: sample ranges of SCL at HIGH level not measured yet
+    v_low_sda: sample ranges of SDA at LOW level not measured yet
+    v_high_sda: sample ranges of SDA at HIGH level not measured yet
+    last_i: index of the latest edge event
+  """
+
+  def __init__(self):
+    self.scl = Logic()
+    self.scl.state = 1  # assume SCL initial state is HIGH
+    self.sda = Logic()
+    self.stop_flag = 1
+    self.start_flag = 0
+    self.restart_flag = 0
+    self.data_start_flag = 0
+    self.first_packet = 0
+    self.read_flag = 0
+    self.addr = ""
+    self.scl_skip = 0
+    self.sda_skip = 0
+    self.interpolation = None
+    self.t_su_dat_rising = None
+    self.t_su_dat_falling = None
+    self.v_low_scl = []
+    self.v_high_scl = []
+    self.v_low_sda = []
+    self.v_high_sda = []
+    self.last_i = 1
+
+  def __eq__(self, other):
+    return vars(self) == vars(other)
+
+
+WAVEFORM_COUNTERS = [
+    "scl_rising_edge", "scl_falling_edge", "sda_rising_edge",
+    "sda_falling_edge", "start_num", "restart_num", "stop_num"
+]
+MEASURE_COUNTERS = WAVEFORM_COUNTERS + ["edge_events"]
+SPEC_FIELDS = [
+    "v_low_scl", "v_low_sda", "v_high_scl", "v_high_sda", "v_nl_scl",
+    "v_nh_scl", "v_nl_sda", "v_nh_sda", "t_rise_sda", "t_rise_scl",
+    "t_fall_sda", "t_fall_scl", "t_low", "t_high", "f_clk",
+    "t_SU_DAT_host_rising", "t_SU_DAT_host_falling", "t_HD_DAT_host_rising",
+    "t_HD_DAT_host_falling", "t_SU_DAT_dev_rising", "t_SU_DAT_dev_falling",
+    "t_HD_DAT_dev_rising", "t_HD_DAT_dev_falling", "t_HD_STA_S",
+    "t_HD_STA_Sr", "t_SU_STA", "t_SU_STO", "t_BUF"
+]
+SVG_POLICIES = ["all", "fail", "requested"]
+
+
+class SegmentStateError(Exception):
+  """A segment failed to measure from its warmed-up bus state.
+
+  The state warmed up from a bus-idle region could differ from the real
+  one, ex: a STOP missed in a glitch, and the bus state machine could
+  fail on it. The segment is then measured again with the right state.
+  """
+
+
+def measure_segment(hummingbird, state, warmup_start, start, end, offset,
+                    window_size=WINDOW_SIZE, vs=None):
+  """Measure one segment of the capture.
+
+  Run in a worker process by HummingBird.measure_segments.
+  The bus state machine first warms up from warmup_start to start
+  without keeping any measurement.
+
+  Args:
+    hummingbird: HummingBird holding the segment data
+    state: BusState at warmup_start
+    warmup_start: first sample index to warm up the state
+    start: first sample index to measure
+    end: sample index after the last one to measure
+    offset: sample index of the first sample in the segment data
+    window_size: number of samples searched for edge events at a time
+    vs: working voltage, to summarize the segment measurements in
+        ParamStats (default: not summarized)
+
+  Returns:
+    warmup_state: BusState at start
+    state: BusState at end
+    measure_field: EventLog of the segment measurements
+    addr_list: device address included in the segment
+    counters: edge, pattern and edge event counts, in MEASURE_COUNTERS order
+    param_stats: ParamStats of each parameter of the segment, empty if
+                 vs is None
+
+  Raises:
+    SegmentStateError: the bus state machine failed after a warm-up, the
+                       warmed-up state could be wrong
+  """
+  state = copy.deepcopy(state)
+  measure_field = EventLog(hummingbird.measure_params)
+  addr_list = []
+  try:
+    hummingbird.run_bus_state(state, EventLog(hummingbird.measure_params), [],
+                              warmup_start, start, window_size, offset)
+    warmup_state = copy.deepcopy(state)
+
+    for name in MEASURE_COUNTERS:
+      setattr(hummingbird, name, 0)
+    param_stats = {} if vs is not None else None
+    hummingbird.run_bus_state(state, measure_field, addr_list, start, end,
+                              window_size, offset, param_stats, vs)
+  except Exception as e:  # pylint: disable=broad-except
+    if warmup_start == start:
+      raise  # not warmed up, the state is the real one
+    raise SegmentStateError(
+        f"segment {start}-{end} failed from the state warmed up at "
+        f"{warmup_start}: {type(e).__name__}: {e}"
+    ) from e
+  counters = [getattr(hummingbird, name) for name in MEASURE_COUNTERS]
+  return (warmup_state, state, measure_field, addr_list, counters,
+          param_stats or {})
+
 
 class HummingBird():
   """Main measurement module.
@@ -62,18 +229,32 @@ class HummingBird():
                      or RESTART pattern, remain 1 for one packet
                      (9 SCL clock cycles)
     first_packet: the first packet after START or RESTART pattern
-    csv_data_path: data csv file to measure
+    csv_data_path: capture file to measure, csv or a format of IMPORTERS
     save_folder: report save folder
 
     sampling_period: SCL data sampling period
     f_clk: SCL clock frequency
     vs: working voltage
     mode: operation mode
+    workers: number of worker processes for segment-parallel measurement
+    fields: report fields requested, None for all
+    measure_params: event log parameters measured for fields, None for all
+    svg: waveform plot policy in SVG_POLICIES
+    html: write the HTML report with waveform plots
+    export: append the result to results.jsonl and save the
+            measurement events as .npz under save_folder
+    instrument: Instrumentation of the stage timing and counters
+    timing: elapsed time of each measurement stage (unit: s)
     data_list: data load from csv file
+    channels: the two data_list columns of the bus to measure
     scl_data: SCL data
     sda_data: SDA data
     v_30p: threshold reference point for state LOW
     v_70p: threshold reference point for state HIGH
+    v_il: user-defined threshold for state LOW, None for 30% of vs
+    v_ih: user-defined threshold for state HIGH, None for 70% of vs
+    transitions: extra (low, high) threshold pairs, as fractions of vs,
+                 to measure rise and fall time between
 
     scl_rising_edge: number of SCL rising edge
     scl_falling_edge: number of SCL falling edge
@@ -82,9 +263,17 @@ class HummingBird():
     start_num: number of START pattern
     restart_num: number of RESTART pattern
     stop_num: number of STOP pattern
+    edge_events: number of edge events run through the bus state machine
+    param_stats: ParamStats of each measured parameter from check_spec
+    profile_result: pass / fail / not measured (None) of each field with
+                    the SPEC of every operation mode and working voltage,
+                    from check_spec
   """
 
-  def __init__(self, csv_data_path, save_folder=None, vs=None, mode=None):
+  def __init__(self, csv_data_path, save_folder=None, vs=None, mode=None,
+               cache=None, workers=None, fields=None, svg="all", html=True,
+               export=False, v_il=None, v_ih=None, transitions=None,
+               profile=None, data_list=None, channels=(1, 2)):
     """Initialization.
 
     Initialize your measurement extension here
@@ -92,10 +281,37 @@ class HummingBird():
     all pre-measurement initialization are here
 
     Args:
-      csv_data_path: csv file to measure
+      csv_data_path: capture file to measure, csv, RIGOL csv or
+                     Saleae Logic2 analog .bin export
       save_folder: output report path
       vs: working voltage
       mode: operation mode
+      cache: optional CaptureCache, load the capture as memory-mapped
+             binary instead of parsing the csv text
+      workers: number of worker processes to measure segments of the
+               capture in parallel (default: measure in this process)
+      fields: only measure these report fields, ex: ["t_rise_scl"],
+              parameters the fields do not depend on are skipped
+              (default: all)
+      svg: waveform plots to generate, "all" fields, the fields that
+           "fail" the SPEC, or the "requested" fields only
+      html: write the HTML report, skip the waveform plots and the
+            report if False, ex: for CI runs checking pass / fail only
+      export: write the machine-readable result next to the report
+      v_il: threshold of state LOW (unit: V), ex: for mixed-voltage
+            buses (default: 30% of the working voltage)
+      v_ih: threshold of state HIGH (unit: V)
+            (default: 70% of the working voltage)
+      transitions: list of (low, high) thresholds as fractions of the
+                   working voltage, ex: [(0.1, 0.9)], to also measure
+                   rise and fall time between
+      profile: capture a cProfile profile and the memory peak of each
+               stage (default: the HUMMINGBIRD_PROFILE environment variable)
+      data_list: already loaded [time, CH1, CH2, ...] capture to measure
+                 instead of loading csv_data_path, ex: shared by the buses
+                 of a multi-bus capture
+      channels: the two data_list columns of the bus to measure, the
+                SCL / SDA order is detected (default: CH1 and CH2)
     """
     super().__init__()
 
@@ -114,53 +330,79 @@ class HummingBird():
     self.start_num = 0
     self.restart_num = 0
     self.stop_num = 0
+    self.edge_events = 0
+    self.param_stats = {}
+    self.profile_result = {}
 
     self.csv_data_path = csv_data_path
     self.save_folder = save_folder
     self.vs = vs
     self.mode = mode
-    self.data_list = None
+    self.workers = workers
+    self.fields = fields
+    self.measure_params = measured_params(fields)
+    self.svg = svg
+    self.html = html
+    self.export = export
+    self.v_il = v_il
+    self.v_ih = v_ih
+    self.transitions = transitions if transitions else []
+    self.instrument = Instrumentation(profile)
+    self.timing = self.instrument.timing
+    self.data_list = data_list
+    self.channels = list(channels)
     self.has_clk_stretch = False
-    if os.path.isfile(self.csv_data_path):
-      with open(self.csv_data_path, "r") as f:
-        data_iter = csv.reader(f, delimiter=",")
-        next(data_iter)  # skip header
-        self.data_list = np.array(list(data_iter), dtype=np.float64)
+    self.instrument.begin("load")
+    if self.data_list is None and os.path.isfile(self.csv_data_path):
+      if cache is not None:
+        self.data_list = cache.load(self.csv_data_path)
+      else:
+        self.data_list = load_file(self.csv_data_path)
+    self.instrument.end("load")
 
     if vs is not None:
-      self.v_30p = vs * 0.3
-      self.v_70p = vs * 0.7
+      self.v_30p, self.v_70p = self.threshold_voltages(vs)
     else:
       self.v_30p = None
       self.v_70p = None
     self.sampling_period = self.data_list[1, 0] - self.data_list[0, 0]
 
-  def max_of_filtered_arr(self, data, threshold=1):
+  def max_of_filtered_arr(self, data, threshold=1, max_segments=None):
     """Return the maximum value of the filtered array.
 
     Remove glitch or spike (voltage difference between
     two sample points larger than 1V) per 0.1us segment
     Return the maximum value of the filtered array
 
+    Segments are reshaped into a matrix, and the medians and
+    filtered maxima of a block of rows are taken in one call.
+
     Args:
       data: raw voltage data
       threshold: difference larger than threshold would be removed
                  (default: 1V)
+      max_segments: number of segments checked from the start
+                    (default: the whole capture)
 
     Returns:
       maxx: the maxium voltage of the filtered data
     """
-    length = round(1e-7 / self.sampling_period)
-    segments = min(len(data) // length, 2000)
+    length = max(round(1e-7 / self.sampling_period), 1)
+    segments = len(data) // length
+    if max_segments is not None:
+      segments = min(segments, max_segments)
+    rows = max(CHUNK_SIZE // length, 1)
     maxx = 0
-    for i in range(segments):
-      arr = data[i * length:(i + 1) * length]
-      median = np.median(arr)
-      maxx = max(np.max(arr[arr < median + threshold]), maxx)
+    for lo in range(0, segments, rows):
+      hi = min(lo + rows, segments)
+      arr = np.asarray(data[lo * length:hi * length]).reshape(hi - lo, length)
+      median = np.median(arr, axis=1, keepdims=True)
+      filtered = np.where(arr < median + threshold, arr, -np.inf)
+      maxx = max(np.max(filtered), maxx)
 
     return maxx
 
-  def determine_working_voltage(self, data):
+  def determine_working_voltage(self, data, v_max=None):
     """Determine Working Voltage.
 
     Perform de-glitch on data and using the maximum
@@ -168,11 +410,14 @@ class HummingBird():
 
     Args:
       data: numpy array of voltages values
+      v_max: maximum of the filtered data if already known,
+             ex: updated chunk by chunk while the data arrives
 
     Returns:
       vs: working voltage
     """
-    v_max = self.max_of_filtered_arr(data)
+    if v_max is None:
+      v_max = self.max_of_filtered_arr(data)
 
     vs_list = [1.8, 3.3, 5]
     pos = np.argmax(vs_list > v_max)
@@ -183,11 +428,62 @@ class HummingBird():
         vs = vs_list[pos-1]
     else:
       vs = v_max
-    self.v_30p = vs * 0.3
-    self.v_70p = vs * 0.7
+    self.v_30p, self.v_70p = self.threshold_voltages(vs)
 
     return vs
 
+  def threshold_voltages(self, vs):
+    """Thresholds of state LOW and HIGH.
+
+    Args:
+      vs: working voltage
+
+    Returns:
+      v_30p: v_il if set, otherwise 30% of vs
+      v_70p: v_ih if set, otherwise 70% of vs
+    """
+    v_30p = vs * 0.3 if self.v_il is None else self.v_il
+    v_70p = vs * 0.7 if self.v_ih is None else self.v_ih
+    return v_30p, v_70p
+
+  def threshold_labels(self):
+    """Labels of the state LOW and HIGH threshold markers on plots.
+
+    Returns:
+      label_30p: v_il voltage if set, otherwise "30 %"
+      label_70p: v_ih voltage if set, otherwise "70 %"
+    """
+    label_30p = "30 %" if self.v_il is None else f"{self.v_il:g} V"
+    label_70p = "70 %" if self.v_ih is None else f"{self.v_ih:g} V"
+    return label_30p, label_70p
+
+  def measure_transitions(self, vs):
+    """Measure rise and fall time between the extra threshold pairs.
+
+    Crossings of every threshold of a dataline are found in one pass,
+    so more pairs, ex: 10% / 90% for SMBus, add little time.
+
+    Args:
+      vs: working voltage
+
+    Returns:
+      samples: numpy array of the durations (unit: s) of each
+               transition, keyed by "t_rise_scl_10_90" for the
+               (0.1, 0.9) pair
+    """
+    samples = {}
+    if not self.transitions:
+      return samples
+    pairs = [(low * vs, high * vs) for low, high in self.transitions]
+    for line, data in (("scl", self.scl_data), ("sda", self.sda_data)):
+      found = find_transitions(data, pairs)
+      for (low, high), (rising, falling) in zip(self.transitions, found):
+        suffix = f"{line}_{low * 100:g}_{high * 100:g}"
+        for f, (start, end) in (("t_rise_" + suffix, rising),
+                                ("t_fall_" + suffix, falling)):
+          samples[f] = (end - start) * self.sampling_period
+    return samples
+
   def determine_datatype(self, data1, data2):
     """Determine Data Type.
 
@@ -197,123 +493,58 @@ class HummingBird():
 
     Constrain: should capture at least five SCL clk cycles
 
+    Edges are searched with iter_edges from the start of both
+    datalines, and from the end for the trim.
+
     Args:
       data1: numpy array of voltages values, unknown type
       data2: numpy array of voltages values, unknown type
     """
-    dataline1 = Logic()
-    dataline2 = Logic()
-    clk_dataline1 = []
-    clk_dataline2 = []
-    v1 = data1[0]
-    v2 = data2[0]
-    first_data_start = None
-    for i in range(1, len(data1)):
-      n1 = data1[i]
-      n2 = data2[i]
-      if ((v1 >= self.v_30p and n1 < self.v_30p) or
-          (v1 <= self.v_30p and n1 > self.v_30p)):
-        dataline1.i_30p = i
-        if dataline1.i_70p is not None:  # falling edge
-          dataline1.low_start = dataline1.i_30p
-          dataline1.i_30p = dataline1.i_70p = None
-
-          if dataline1.last_low_start is not None:
-            clk_dataline1.append(dataline1.low_start - dataline1.last_low_start)
-          elif first_data_start is None:
-            first_data_start = i
-          dataline1.last_low_start = dataline1.low_start
-
-      if ((v1 >= self.v_70p and n1 < self.v_70p) or
-          (v1 <= self.v_70p and n1 > self.v_70p)):
-        dataline1.i_70p = i
-        if dataline1.i_30p is not None:  # rising edge
-          dataline1.high_start = dataline1.i_70p
-          dataline1.i_30p = dataline1.i_70p = None
-
-          if dataline1.last_high_start is not None:
-            clk_dataline1.append(
-                dataline1.high_start - dataline1.last_high_start
-            )
-          dataline1.last_high_start = dataline1.high_start
-
-      if ((v2 >= self.v_30p and n2 < self.v_30p) or
-          (v2 <= self.v_30p and n2 > self.v_30p)):
-        dataline2.i_30p = i
-        if dataline2.i_70p is not None:  # falling edge
-          dataline2.low_start = dataline2.i_30p
-          dataline2.i_30p = dataline2.i_70p = None
-
-          if dataline2.last_low_start is not None:
-            clk_dataline2.append(
-                dataline2.low_start - dataline2.last_low_start
-            )
-          elif first_data_start is None:
-            first_data_start = i
-          dataline2.last_low_start = dataline2.low_start
-
-      if ((v2 >= self.v_70p and n2 < self.v_70p) or
-          (v2 <= self.v_70p and n2 > self.v_70p)):
-        dataline2.i_70p = i
-        if dataline2.i_30p is not None:  # rising edge
-          dataline2.high_start = dataline2.i_70p
-          dataline2.i_30p = dataline2.i_70p = None
-
-          if dataline2.last_high_start is not None:
-            clk_dataline2.append(
-                dataline2.high_start - dataline2.last_high_start
-            )
-          dataline2.last_high_start = dataline2.high_start
-      v1 = n1
-      v2 = n2
-      if len(clk_dataline1) >= 8 or len(clk_dataline2) >= 8:
+    datalines = [Logic(), Logic()]
+    clk_datalines = [[], []]  # tuple of edge index and clock period
+    first_falls = [None, None]
+    edges = [iter_edges(data, self.v_30p, self.v_70p)
+             for data in (data1, data2)]
+    for found in zip(*edges):
+      for k, (idx, rising) in enumerate(found):
+        dataline = datalines[k]
+        for i, r in zip(idx.tolist(), rising.tolist()):
+          if len(clk_datalines[k]) >= 8:
+            break
+          if r:  # rising edge
+            if dataline.last_high_start is not None:
+              clk_datalines[k].append((i, i - dataline.last_high_start))
+            dataline.last_high_start = i
+          else:  # falling edge
+            if dataline.last_low_start is not None:
+              clk_datalines[k].append((i, i - dataline.last_low_start))
+            else:
+              first_falls[k] = i
+            dataline.last_low_start = i
+      if len(clk_datalines[0]) >= 8 or len(clk_datalines[1]) >= 8:
         break
 
+    # Keep the edges until the sample where either dataline
+    # has 8 clock periods
+
+    stop = min([clk[7][0] for clk in clk_datalines if len(clk) >= 8],
+               default=np.inf)
+    clk_dataline1 = [t for i, t in clk_datalines[0] if i <= stop]
+    clk_dataline2 = [t for i, t in clk_datalines[1] if i <= stop]
+    first_falls = [i for i in first_falls if i is not None and i <= stop]
+    first_data_start = min(first_falls) if first_falls else None
+
     # Trim from the first edge to the last edge
     # first_data_start: the first edge of data
     # first_data_end: the last edge of data
 
-    first_data_end = None
-    dataline1 = Logic()
-    dataline2 = Logic()
-    v1 = data1[-1]
-    v2 = data2[-1]
-    for i in range(len(data1)-2, 0, -1):
-      n1 = data1[i]
-      n2 = data2[i]
-      if ((v1 >= self.v_30p and n1 < self.v_30p) or
-          (v1 <= self.v_30p and n1 > self.v_30p)):
-        dataline1.i_30p = i
-        if dataline1.i_70p is not None:  # falling edge
-          dataline1.i_30p = dataline1.i_70p = None
-
-          if dataline1.last_low_start is None and first_data_end is None:
-            first_data_end = i
-            break
-
-      if ((v1 >= self.v_70p and n1 < self.v_70p) or
-          (v1 <= self.v_70p and n1 > self.v_70p)):
-        dataline1.i_70p = i
-        if dataline1.i_30p is not None:  # rising edge
-          dataline1.i_30p = dataline1.i_70p = None
-
-      if ((v2 >= self.v_30p and n2 < self.v_30p) or
-          (v2 <= self.v_30p and n2 > self.v_30p)):
-        dataline2.i_30p = i
-        if dataline2.i_70p is not None:  # falling edge
-          dataline2.i_30p = dataline2.i_70p = None
-
-          if dataline2.last_low_start is None and first_data_end is None:
-            first_data_end = i
-            break
-
-      if ((v2 >= self.v_70p and n2 < self.v_70p) or
-          (v2 <= self.v_70p and n2 > self.v_70p)):
-        dataline2.i_70p = i
-        if dataline2.i_30p is not None:  # rising edge
-          dataline2.i_30p = dataline2.i_70p = None
-      v1 = n1
-      v2 = n2
+    last_falls = []
+    for data in (data1, data2):
+      for idx, rising in iter_edges(data, self.v_30p, self.v_70p, reverse=True):
+        if (~rising).any():
+          last_falls.append(idx[~rising][0])
+          break
+    first_data_end = max(last_falls) if last_falls else None
 
     if first_data_start is None and first_data_end is None:
       print("\nError! No edge detected! "
@@ -338,81 +569,186 @@ class HummingBird():
     """Determine Operation Mode.
 
     Using maximum f_clk from first five cycles to predict
-    operation mode
+    operation mode, among the modes with detect_f_clk in the
+    SPEC files
 
     Returns:
       mode: operation mode (Standard mode / Fast Mode / Fast Mode Plus)
     """
-    if self.f_clk < 1.1e5:
-      mode = "Standard Mode"
-    elif self.f_clk < 4.4e5:
-      mode = "Fast Mode"
-    elif self.f_clk < 1.1e6:
-      mode = "Fast Mode Plus"
-
-    return mode
+    return registry().detect_mode(self.f_clk)
 
   def add_measurement(self, measure_field, field, new_result):
-    """Compare with exist measurement.
+    """Append a measurement to the event log.
 
     Args:
-      measure_field: measure value for each SPEC parameter
+      measure_field: EventLog of all measurements
       field: the name of the parameter field
-      new_result: new measurement to compare
+      new_result: new measurement, [sample index, value(, width)]
 
     Returns:
-      measure_field: measure value for each SPEC parameter
+      measure_field: EventLog of all measurements
     """
-    if "runt" in field:
-      measure_max = measure_field.get(field)
-      if measure_max:
-        measure_field[field].append(new_result)
-      else:
-        measure_field[field] = [new_result]
-    else:
-      measure_max = measure_field.get(field + "_max")
-      if measure_max:
-        measure_min = measure_field.get(field + "_min")
-        if measure_max[1] < new_result[1]:
-          measure_max[:] = new_result.copy()
-        elif measure_min[1] > new_result[1]:
-          measure_min[:] = new_result.copy()
-      else:
-        measure_field[field + "_max"] = new_result.copy()
-        measure_field[field + "_min"] = new_result.copy()
-
+    measure_field.append(field, new_result)
     return measure_field
 
-  def measure_both_scl_sda(self):
+  def median_of_segments(self, data, segments, offset=0):
+    """Median voltage over a list of sample ranges.
+
+    Args:
+      data: numpy array of voltages values
+      segments: list of (start, end) sample ranges
+      offset: sample index of data[0]
+
+    Returns:
+      median: median voltage of all samples in the ranges
+    """
+    return np.median(
+        np.concatenate([data[s - offset:e - offset] for s, e in segments])
+    )
+
+  def measure_both_scl_sda(self, window_size=WINDOW_SIZE, param_stats=None,
+                           vs=None):
     """When both SCL and SDA data is provided.
 
+    All 30% / 70% crossings are found in bulk by iter_edge_events,
+    then the bus state machine runs over the sparse edge events.
+
+    Edge events are searched one window at a time while the bus state
+    carries over, so memory-mapped captures larger than RAM only keep
+    one window resident.
+
+    Args:
+      window_size: number of samples searched for edge events at a time
+      param_stats: ParamStats of each parameter, updated in place window
+                   by window (default: not summarized)
+      vs: working voltage, to summarize the measurements in param_stats
+
     Returns:
-      measure_field: measure value for each SPEC parameter
+      measure_field: EventLog of all measurements
       addr_list: device address included in the capture
     """
-    measure_field = {}
+    measure_field = EventLog(self.measure_params)
     addr_list = []
-    sda = Logic()
-    scl = Logic()
-    scl.state = 1  # assume SCL initial state is HIGH
-    read_flag = 0
-
-    v_sda = self.sda_data[0]
-    v_scl = self.scl_data[0]
-    v_low_scl = []
-    v_high_scl = []
-    v_low_sda = []
-    v_high_sda = []
-    t_su_dat_rising = t_su_dat_falling = None
-    addr = ""
-    scl_skip = 0
-    sda_skip = 0
+    state = BusState()
+    self.run_bus_state(state, measure_field, addr_list, 1,
+                       len(self.sda_data), window_size,
+                       param_stats=param_stats, vs=vs)
+
+    self.has_clk_stretch = self.detect_clk_stretch(measure_field)
+    return measure_field, addr_list
+
+  def detect_clk_stretch(self, measure_field):
+    """Assume clock stretching happened if t_low_max >= 2 * t_low_min.
+
+    Args:
+      measure_field: EventLog of all measurements
+
+    Returns:
+      has_clk_stretch: True if clock stretching happened, False if
+                       t_low is not measured
+    """
+    extremes = measure_field.extremes()
+    if "t_low_max" not in extremes:
+      return False
+    return extremes["t_low_max"][1] >= extremes["t_low_min"][1] * 2
+
+  def run_bus_state(self, state, measure_field, addr_list, start, end,
+                    window_size=WINDOW_SIZE, offset=0, param_stats=None,
+                    vs=None):
+    """Run the bus state machine over the edge events in a sample range.
+
+    Nothing changes state between two edge events, so the HIGH / LOW
+    voltage samples are tracked as sample ranges, only for the voltage
+    parameters kept by measure_field. The state after the
+    last edge event is saved back to state, so the next sample range
+    could continue from there.
+
+    Args:
+      state: BusState before sample start, updated in place
+      measure_field: EventLog of all measurements, updated in place
+      addr_list: device address included in the capture, updated in place
+      start: first sample index to measure
+      end: sample index after the last one to measure
+      window_size: number of samples searched for edge events at a time
+      offset: sample index of scl_data[0] and sda_data[0]
+      param_stats: ParamStats of each parameter, updated in place with
+                   the measurements of each window (default: not
+                   summarized)
+      vs: working voltage, to summarize the measurements in param_stats
+    """
+    stats_from = len(measure_field)
+    if not needs_bus_decode(measure_field.params):
+      for line in ("scl", "sda"):
+        self.run_line_state(line, state, measure_field, start, end,
+                            window_size, offset)
+        if param_stats is not None:
+          stats_from = self.add_param_stats(param_stats, measure_field,
+                                            stats_from, vs)
+      return
+
+    sda = state.sda
+    scl = state.scl
+    self.stop_flag = state.stop_flag
+    self.start_flag = state.start_flag
+    self.restart_flag = state.restart_flag
+    self.data_start_flag = state.data_start_flag
+    self.first_packet = state.first_packet
+    read_flag = state.read_flag
+
+    v_low_scl = state.v_low_scl
+    v_high_scl = state.v_high_scl
+    v_low_sda = state.v_low_sda
+    v_high_sda = state.v_high_sda
+    t_su_dat_rising = state.t_su_dat_rising
+    t_su_dat_falling = state.t_su_dat_falling
+    addr = state.addr
+    scl_skip = state.scl_skip
+    sda_skip = state.sda_skip
+    interpolation = state.interpolation
     t_sp = 2e-8  # ignore spikes with pulse width < 20ns
-    for i in range(1, len(self.sda_data)):
-      n_sda = self.sda_data[i]
-      n_scl = self.scl_data[i]
-      if v_scl >= self.v_30p and n_scl < self.v_30p:  # falling edge
-        interpolation = (self.v_30p - n_scl) / (v_scl - n_scl)
+    keep_v_low_scl = measure_field.keeps("v_low_scl")
+    keep_v_high_scl = measure_field.keeps("v_high_scl")
+    keep_v_low_sda = measure_field.keeps("v_low_sda")
+    keep_v_high_sda = measure_field.keeps("v_high_sda")
+
+    def collect_voltage(lo, hi):
+      # Constrain: captured data should include START or RESTART pattern
+      if lo >= hi:
+        return
+      if (scl.state == 0) and not self.stop_flag:
+        if keep_v_low_scl:
+          v_low_scl.append((lo, hi))
+      elif (scl.state == 1) and not self.stop_flag:
+        if keep_v_high_scl:
+          v_high_scl.append((lo, hi))
+      if (sda.state == 0) and self.data_start_flag:
+        if keep_v_low_sda:
+          v_low_sda.append((lo, hi))
+      elif (sda.state == 1) and self.data_start_flag:
+        if keep_v_high_sda:
+          v_high_sda.append((lo, hi))
+
+    last_i = state.last_i
+    edge_events = 0
+    window_end = start + window_size
+    for (i, scl_30p_fall, scl_30p_rise, scl_70p_rise, scl_70p_fall,
+         sda_30p_fall, sda_30p_rise, sda_70p_rise, sda_70p_fall,
+         scl_30p, scl_70p, sda_30p, sda_70p) in iter_edge_events(
+             self.scl_data, self.sda_data, self.v_30p, self.v_70p,
+             window_size, start, end, offset):
+
+      # Samples since the last edge event keep the state of that event
+
+      collect_voltage(last_i, i)
+      last_i = i
+      edge_events += 1
+      if param_stats is not None and i >= window_end:
+        stats_from = self.add_param_stats(param_stats, measure_field,
+                                          stats_from, vs)
+        window_end = start + ((i - start) // window_size + 1) * window_size
+
+      if scl_30p_fall:  # falling edge
+        interpolation = scl_30p
         scl.i_30p = i - interpolation
         scl.state = 0
         if scl.i_70p is not None:
@@ -449,9 +785,8 @@ class HummingBird():
             )
         scl.i_30p = None
 
-      elif (i > scl_skip and
-            v_scl <= self.v_30p and n_scl > self.v_30p):  # rising edge
-        interpolation = (self.v_30p - n_scl) / (v_scl - n_scl)
+      elif i > scl_skip and scl_30p_rise:  # rising edge
+        interpolation = scl_30p
         scl.i_30p = i - interpolation
         scl.state = None
         if scl.i_70p is None:
@@ -460,7 +795,8 @@ class HummingBird():
             if v_low_scl:
               measure_field = self.add_measurement(
                   measure_field, "v_low_scl",
-                  [i - interpolation, np.median(v_low_scl),
+                  [i - interpolation,
+                   self.median_of_segments(self.scl_data, v_low_scl, offset),
                    scl.low_end - scl.low_start]
               )
               v_low_scl = []
@@ -469,8 +805,8 @@ class HummingBird():
                 [i - interpolation, scl.low_end - scl.low_start]
             )
 
-      if v_scl <= self.v_70p and n_scl > self.v_70p:  # rising edge
-        interpolation = (self.v_70p - n_scl) / (v_scl - n_scl)
+      if scl_70p_rise:  # rising edge
+        interpolation = scl_70p
         scl.i_70p = i - interpolation
         scl.state = 1
         if scl.i_30p is not None:
@@ -504,9 +840,8 @@ class HummingBird():
             )
         scl.i_70p = None
 
-      elif (i > scl_skip and
-            v_scl >= self.v_70p and n_scl < self.v_70p):  # falling edge
-        interpolation = (self.v_70p - n_scl) / (v_scl - n_scl)
+      elif i > scl_skip and scl_70p_fall:  # falling edge
+        interpolation = scl_70p
         scl.i_70p = i - interpolation
         scl.state = None
         if scl.i_30p is None:
@@ -515,7 +850,8 @@ class HummingBird():
             if v_high_scl:
               measure_field = self.add_measurement(
                   measure_field, "v_high_scl",
-                  [i - interpolation, np.median(v_high_scl),
+                  [i - interpolation,
+                   self.median_of_segments(self.scl_data, v_high_scl, offset),
                    scl.high_end - scl.high_start]
               )
               v_high_scl = []
@@ -536,8 +872,8 @@ class HummingBird():
             else:
               addr += "0"
 
-      if v_sda >= self.v_30p and n_sda < self.v_30p:  # falling edge
-        interpolation = (self.v_30p - n_sda) / (v_sda - n_sda)
+      if sda_30p_fall:  # falling edge
+        interpolation = sda_30p
         sda.i_30p = i - interpolation
         sda.state = 0
         if sda.i_70p is not None:
@@ -556,9 +892,8 @@ class HummingBird():
                 [i - interpolation, sda.i_30p - sda.low_end]
             )
 
-      elif (i > sda_skip and
-            v_sda <= self.v_30p and n_sda > self.v_30p):  # rising edge
-        interpolation = (self.v_30p - n_sda) / (v_sda - n_sda)
+      elif i > sda_skip and sda_30p_rise:  # rising edge
+        interpolation = sda_30p
         sda.i_30p = i - interpolation
         sda.state = None
         if sda.i_70p is None:
@@ -567,13 +902,14 @@ class HummingBird():
             if sda.low_start and sda.low_start < scl.low_start:
               measure_field = self.add_measurement(
                   measure_field, "v_low_sda",
-                  [i - interpolation, np.median(v_low_sda),
+                  [i - interpolation,
+                   self.median_of_segments(self.sda_data, v_low_sda, offset),
                    sda.low_end - sda.low_start]
               )
             v_low_sda = []
 
-      if v_sda <= self.v_70p and n_sda > self.v_70p:  # rising edge
-        interpolation = (self.v_70p - n_sda) / (v_sda - n_sda)
+      if sda_70p_rise:  # rising edge
+        interpolation = sda_70p
         sda.i_70p = i - interpolation
         sda.state = 1
         if sda.i_30p is not None:
@@ -592,9 +928,8 @@ class HummingBird():
                 [i - interpolation, sda.i_70p - sda.high_end]
             )
 
-      elif (i > sda_skip and
-            v_sda >= self.v_70p and n_sda < self.v_70p):  # falling edge
-        interpolation = (self.v_70p - n_sda) / (v_sda - n_sda)
+      elif i > sda_skip and sda_70p_fall:  # falling edge
+        interpolation = sda_70p
         sda.i_70p = i - interpolation
         if sda.i_30p is None:
           sda.high_end = sda.i_70p
@@ -606,7 +941,8 @@ class HummingBird():
             if sda.high_start and sda.high_start < scl.low_start:
               measure_field = self.add_measurement(
                   measure_field, "v_high_sda",
-                  [i - interpolation, np.median(v_high_sda),
+                  [i - interpolation,
+                   self.median_of_segments(self.sda_data, v_high_sda, offset),
                    sda.high_end - sda.high_start]
               )
             v_high_sda = []
@@ -743,97 +1079,294 @@ class HummingBird():
             [i - interpolation, sda.low_end - scl.high_start]
         )
 
-      # Constrain: captured data should include START or RESTART pattern
+    state.stop_flag = self.stop_flag
+    state.start_flag = self.start_flag
+    state.restart_flag = self.restart_flag
+    state.data_start_flag = self.data_start_flag
+    state.first_packet = self.first_packet
+    state.read_flag = read_flag
+    state.v_low_scl = v_low_scl
+    state.v_high_scl = v_high_scl
+    state.v_low_sda = v_low_sda
+    state.v_high_sda = v_high_sda
+    state.t_su_dat_rising = t_su_dat_rising
+    state.t_su_dat_falling = t_su_dat_falling
+    state.addr = addr
+    state.scl_skip = scl_skip
+    state.sda_skip = sda_skip
+    state.interpolation = interpolation
+    state.last_i = last_i
+    self.edge_events += edge_events
+    if param_stats is not None:
+      self.add_param_stats(param_stats, measure_field, stats_from, vs)
+
+  def run_line_state(self, line, state, measure_field, start, end,
+                     window_size=WINDOW_SIZE, offset=0):
+    """Run the edge state of one dataline over its own crossings.
+
+    The part of run_bus_state depending on the dataline alone: rise
+    and fall time, runt pulses, and t_low / t_high of SCL. Used by
+    run_bus_state when no measured parameter needs the bus decode, so
+    the START / STOP patterns and addresses are not decoded.
 
-      if (scl.state == 0) and not self.stop_flag:
-        v_low_scl.append(n_scl)
-      elif (scl.state == 1) and not self.stop_flag:
-        v_high_scl.append(n_scl)
-      if (sda.state == 0) and self.data_start_flag:
-        v_low_sda.append(n_sda)
-      elif (sda.state == 1) and self.data_start_flag:
-        v_high_sda.append(n_sda)
-
-      v_sda = n_sda
-      v_scl = n_scl
-	
-    # Assume clock stretching happened if t_low_max is 2 times larger than t_low_min 
-    
-    self.has_clk_stretch = True if (measure_field.get("t_low_max")[1] >= (measure_field.get("t_low_min")[1]*2)) else False
-    return measure_field, addr_list
+    Args:
+      line: dataline, "scl" or "sda"
+      state: BusState before sample start, the logic state and spike
+             skip index of the dataline are updated in place
+      measure_field: EventLog of all measurements, updated in place
+      start: first sample index to measure
+      end: sample index after the last one to measure
+      window_size: number of samples searched for crossings at a time
+      offset: sample index of scl_data[0] and sda_data[0]
+    """
+    is_scl = line == "scl"
+    logic = getattr(state, line)
+    skip = getattr(state, line + "_skip")
+    data = self.scl_data if is_scl else self.sda_data
+    t_sp = 2e-8  # ignore spikes with pulse width < 20ns
+    rising_edge = falling_edge = edge_events = 0
+    for i, key, interpolation in iter_line_crossings(
+        data, self.v_30p, self.v_70p, window_size, start, end, offset):
+      edge_events += 1
+
+      if key == 0:  # 30% falling edge
+        logic.i_30p = i - interpolation
+        logic.state = 0
+        if logic.i_70p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_fall_" + line,
+              [i - interpolation, logic.i_30p - logic.i_70p]
+          )
+          falling_edge += 1
+          logic.low_start = logic.i_30p
+          skip = i + t_sp / self.sampling_period
+          logic.i_30p = logic.i_70p = None
+          if is_scl:
+            logic.last_low_start = logic.low_start
+        else:
+          if (logic.i_30p - logic.low_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_" + line,
+                [i - interpolation, logic.i_30p - logic.low_end]
+            )
+        if is_scl:
+          logic.i_30p = None
+
+      elif key == 1 and i > skip:  # 30% rising edge
+        logic.i_30p = i - interpolation
+        logic.state = None
+        if logic.i_70p is None:
+          logic.low_end = logic.i_30p
+          if is_scl and logic.low_start is not None:
+            measure_field = self.add_measurement(
+                measure_field, "t_low",
+                [i - interpolation, logic.low_end - logic.low_start]
+            )
+
+      elif key == 2:  # 70% rising edge
+        logic.i_70p = i - interpolation
+        logic.state = 1
+        if logic.i_30p is not None:
+          measure_field = self.add_measurement(
+              measure_field, "t_rise_" + line,
+              [i - interpolation, logic.i_70p - logic.i_30p]
+          )
+          rising_edge += 1
+          logic.high_start = logic.i_70p
+          skip = i + t_sp / self.sampling_period
+          logic.i_30p = logic.i_70p = None
+          if is_scl:
+            logic.last_high_start = logic.high_start
+        else:
+          if (logic.i_70p - logic.high_end) * self.sampling_period > 1e-7:
+            measure_field = self.add_measurement(
+                measure_field, "runt_" + line,
+                [i - interpolation, logic.i_70p - logic.high_end]
+            )
+        if is_scl:
+          logic.i_70p = None
+
+      elif key == 3 and i > skip:  # 70% falling edge
+        logic.i_70p = i - interpolation
+        if is_scl:
+          logic.state = None
+        if logic.i_30p is None:
+          logic.high_end = logic.i_70p
+          logic.state = None
+          if is_scl and logic.high_start is not None:
+            measure_field = self.add_measurement(
+                measure_field, "t_high",
+                [i - interpolation, logic.high_end - logic.high_start]
+            )
+
+    setattr(state, line + "_skip", skip)
+    setattr(self, line + "_rising_edge",
+            getattr(self, line + "_rising_edge") + rising_edge)
+    setattr(self, line + "_falling_edge",
+            getattr(self, line + "_falling_edge") + falling_edge)
+    self.edge_events += edge_events
+
+  def measure_segments(self, workers=None, min_idle=5e-7,
+                       window_size=WINDOW_SIZE, vs=None):
+    """Measure segments of the capture in parallel.
+
+    The capture is split in the middle of bus-idle regions after STOP
+    (both datalines above 70% Vdd for longer than min_idle), and each
+    segment runs in a worker process. A worker first warms up its
+    BusState from the previous bus-idle region. If the warmed-up state
+    differs from the final state of the previous segment, that segment
+    is measured again with the right state, so the merged result is
+    identical to measure_both_scl_sda. With vs, every segment is also
+    summarized in ParamStats by its worker, and they are merged.
+
+    Args:
+      workers: number of worker processes (default: number of cores)
+      min_idle: minimum bus-idle time to split at, in seconds
+      window_size: number of samples searched for edge events at a time
+      vs: working voltage, to summarize the measurements in ParamStats
+
+    Returns:
+      measure_field: EventLog of all measurements
+      addr_list: device address included in the capture
+      param_stats: ParamStats of each parameter, empty if vs is None
+    """
+    workers = workers if workers else os.cpu_count()
+    length = len(self.sda_data)
+    splits = find_idle_splits(self.scl_data, self.sda_data, self.v_70p,
+                              max(min_idle / self.sampling_period, 1))
+
+    # A few segments per worker, cut at the splits closest to even lengths
+
+    targets = np.linspace(0, length, workers * 4 + 1)[1:-1]
+    pos = np.unique(np.searchsorted(splits, targets))
+    pos = pos[pos < len(splits)].tolist()
+    starts = [1] + [int(splits[p]) for p in pos]
+    ends = starts[1:] + [length]
+    warmup_starts = [1] + [int(splits[p - 1]) if p else 1 for p in pos]
+
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers) as executor:
+      futures = []
+      for warmup_start, start, end in zip(warmup_starts, starts, ends):
+        segment = copy.copy(self)
+        segment.data_list = None
+        segment.instrument = Instrumentation(False)  # profiler is not picklable
+        segment.scl_data = np.array(self.scl_data[warmup_start - 1:end])
+        segment.sda_data = np.array(self.sda_data[warmup_start - 1:end])
+        futures.append(executor.submit(
+            measure_segment, segment, BusState(), warmup_start, start, end,
+            warmup_start - 1, window_size, vs
+        ))
+      for future in futures:
+        try:
+          results.append(future.result())
+        except SegmentStateError:
+          results.append(None)  # warmed up with a wrong state, measure again
+
+    measure_field = EventLog(self.measure_params)
+    addr_list = []
+    counters = [0] * len(MEASURE_COUNTERS)
+    param_stats = {}
+    state = BusState()
+    segment = copy.copy(self)
+    for start, end, result in zip(starts, ends, results):
+      if result is None or result[0] != state:
+        result = measure_segment(segment, state, start, start, end, 0,
+                                 window_size, vs)
+      (_, state, segment_field, segment_addr, segment_counters,
+       segment_stats) = result
+
+      measure_field.extend(segment_field)
+      addr_list += segment_addr
+      counters = [a + b for a, b in zip(counters, segment_counters)]
+      for f, stats in segment_stats.items():
+        param_stats.setdefault(f, ParamStats()).merge(stats)
+
+    for name, value in zip(MEASURE_COUNTERS, counters):
+      setattr(self, name, getattr(self, name) + value)
+    self.stop_flag = state.stop_flag
+    self.start_flag = state.start_flag
+    self.restart_flag = state.restart_flag
+    self.data_start_flag = state.data_start_flag
+    self.first_packet = state.first_packet
+
+    self.has_clk_stretch = self.detect_clk_stretch(measure_field)
+    return measure_field, addr_list, param_stats
 
   def get_spec_limitation(self, mode, vs):
     """Get SPEC limitation according to operation mode.
 
     Args:
-      mode: operation mode (Standard mode / Fast Mode / Fast Mode Plus)
+      mode: operation mode, ex: Fast Mode, see spec_limits
       vs: working voltage
 
     Returns:
-      spec_limit: limitation for each parameter
+      spec_limit: thresholds v_low and v_high, and the min / max of
+                  each parameter, ex: t_rise_max
     """
-    spec_limit_sm = {
-        "v_low": 0.3 * vs, "v_high": 0.7 * vs, "v_nh": 0.2, "v_nl": 0.1,
-        "t_rise_max": 1e-6, "t_fall_max": 3e-7, "t_low": 4.7e-6, "t_high": 4e-6,
-        "f_clk": 1e5, "t_SU_DAT": 2.5e-7, "t_HD_STA": 4e-6,
-        "t_SU_STA": 4.7e-6, "t_SU_STO": 4e-6, "t_BUF": 4.7e-6
-    }
-    if not self.has_clk_stretch:
-    	spec_limit_sm["t_HD_DAT"] = 3.45e-6
-    spec_limit_fm = {
-        "v_low": 0.3 * vs, "v_high": 0.7 * vs, "v_nh": 0.2, "v_nl": 0.1,
-        "t_rise_max": 3e-7, "t_rise_min": 2e-8, "t_fall_max": 3e-7,
-        "t_fall_min": 20 * vs / 5.5 * 1e-9, "t_low": 1.3e-6, "t_high": 6e-7,
-        "f_clk": 4e5, "t_SU_DAT": 1e-7, "t_HD_STA": 6e-7,
-        "t_SU_STA": 6e-7, "t_SU_STO": 6e-7, "t_BUF": 1.3e-6
-    }
-    if not self.has_clk_stretch:
-    	spec_limit_fm["t_HD_DAT"] = 9e-7
-    spec_limit_fmp = {
-        "v_low": 0.3 * vs, "v_high": 0.7 * vs, "v_nh": 0.2, "v_nl": 0.1,
-        "t_rise_max": 1.2e-7, "t_fall_max": 1.2e-7,
-        "t_fall_min": 20 * vs / 5.5 * 1e-9, "t_low": 5e-7, "t_high": 2.6e-7,
-        "f_clk": 1e6, "t_SU_DAT": 5e-8, "t_HD_STA": 2.6e-7, "t_SU_STA": 2.6e-7,
-        "t_SU_STO": 2.6e-7, "t_BUF": 5e-7
-    }
-
-    # Check only voltage SPEC constrain if unknown operation mode
-
-    spec_limit = {
-        "v_nh": 0.2, "v_nl": 0.1, "v_low": 0.3 * vs, "v_high": 0.7 * vs
-    }
-
-    if mode == "Standard Mode":
-      spec_limit = spec_limit_sm
-    elif mode == "Fast Mode":
-      spec_limit = spec_limit_fm
-    elif mode == "Fast Mode Plus":
-      spec_limit = spec_limit_fmp
-
-    return spec_limit
-
-  def check_spec(self, spec_limit, measure_field, vs):
+    return spec_limitation(mode, vs, self.has_clk_stretch,
+                           *self.threshold_voltages(vs))
+
+  def add_param_stats(self, param_stats, measure_field, first, vs):
+    """Add measurements to the distribution statistics of each parameter.
+
+    Args:
+      param_stats: ParamStats of each parameter, in the unit of values,
+                   updated in place
+      measure_field: EventLog of the measurements
+      first: first event of measure_field to add
+      vs: working voltage
+
+    Returns:
+      size: number of events in measure_field, the first event to add
+            on the next call
+    """
+    events = measure_field.events[first:measure_field.size]
+    for param in np.unique(events["param"]).tolist():
+      f = PARAMS[param]
+      value = events["value"][events["param"] == param]
+      samples = {}
+      if f.startswith("v_high"):
+        samples[f] = value
+        samples[f.replace("high", "nh")] = (value - self.v_70p) / vs
+      elif f.startswith("v_low"):
+        samples[f] = value
+        samples[f.replace("low", "nl")] = (self.v_30p - value) / vs
+      elif f == "T_clk":
+        samples["f_clk"] = 1 / (value * self.sampling_period)
+      elif f.startswith("t_"):
+        samples[f] = value * self.sampling_period
+      for name, sample in samples.items():
+        param_stats.setdefault(name, ParamStats()).add(sample)
+    return measure_field.size
+
+  def check_spec(self, spec_limit, measure_field, vs, param_stats=None):
     """Check SPEC with each parameters.
 
     Args:
       spec_limit: spec limitation of each parameter
-      measure_field: all measurement of each parameter
+      measure_field: EventLog of all measurements
       vs: working voltage
+      param_stats: ParamStats of each parameter summarized while
+                   measuring, added from measure_field if None
 
     Returns:
-      values: max, min, worst measurement of each parameter
+      values: max, min, worst measurement of each parameter, and the
+              count, mean, std, p1, p50, p99 of all its measurements
       result: pass/fail, margin, start_idx, margin_percentage of each parameter
       svgwidth: worst case width for SVG plot
     """
     values = {}
     result = {}
     svgwidth = {}
+    extremes = measure_field.extremes()
 
     fields1 = ["v_high_scl", "v_low_scl", "v_high_sda", "v_low_sda"]
     for f in fields1:
       ff = "_".join(f.split("_")[:-1])
-      measure_max = measure_field.get(f + "_max")
-      measure_min = measure_field.get(f + "_min")
+      measure_max = extremes.get(f + "_max")
+      measure_min = extremes.get(f + "_min")
       if measure_max and measure_min:
         values[f + "_max"] = measure_max[1]
         values[f + "_min"] = measure_min[1]
@@ -850,135 +1383,127 @@ class HummingBird():
           svgwidth[f] = measure_max[2]
         result[f + "_percent"] = result[f + "_margin"] / limit * 100
 
+    # Lowest and highest measurement of each checked field, as
+    # (value, start_idx, svg width), in the unit of the SPEC limits
+
+    sides = {}
     fields2 = ["v_nh_scl", "v_nl_scl", "v_nh_sda", "v_nl_sda"]
     for f in fields2:
       ff = f.replace("nh", "high").replace("nl", "low")
-      ff2 = f[:4]
-      value_max = values.get(ff + "_max")
-      value_min = values.get(ff + "_min")
-      if value_max and value_min:
+      measure_max = extremes.get(ff + "_max")
+      measure_min = extremes.get(ff + "_min")
+      if measure_max and measure_min:
         if "nh" in f:
-          maxx = (value_max - self.v_70p) / vs
-          minn = (value_min - self.v_70p) / vs
-        elif "nl" in f:
-          maxx = (self.v_30p - value_min) / vs
-          minn = (self.v_30p - value_max) / vs
-        values[f + "_min"] = minn
-        values[f + "_max"] = maxx
-        values[f + "_worst"] = minn
-        result[f + "_idx"] = result[ff + "_idx"]
-        svgwidth[f] = svgwidth[ff]
-        limit = spec_limit[ff2]
-        if minn >= limit:
-          result[f] = 0
+          sides[f] = tuple(((m[1] - self.v_70p) / vs, m[0], m[2])
+                           for m in (measure_min, measure_max))
         else:
-          result[f] = 1
-        result[f + "_margin"] = minn - limit
-        result[f + "_percent"] = (minn - limit) / limit * 100
+          sides[f] = tuple(((self.v_30p - m[1]) / vs, m[0], m[2])
+                           for m in (measure_max, measure_min))
 
-    measure_max = measure_field.get("T_clk_max")
-    measure_min = measure_field.get("T_clk_min")
+    measure_max = extremes.get("T_clk_max")
+    measure_min = extremes.get("T_clk_min")
     if measure_max and measure_min:
-      t_clk_min = measure_min[1] * self.sampling_period
-      maxx = int(1 / t_clk_min)
-      t_clk_max = measure_max[1] * self.sampling_period
-      minn = int(1 / t_clk_max)
-      values["f_clk_max"] = maxx
-      values["f_clk_min"] = minn
-      values["f_clk_worst"] = maxx
-      result["f_clk_idx"] = measure_min[0]
-      svgwidth["f_clk"] = measure_min[1]
-      limit = spec_limit["f_clk"]
-      if maxx <= limit:
-        result["f_clk"] = 0
-      else:
-        result["f_clk"] = 1
-      result["f_clk_margin"] = limit - maxx
-      result["f_clk_percent"] = (limit - maxx) / limit * 100
+      sides["f_clk"] = (
+          (int(1 / (measure_max[1] * self.sampling_period)), measure_max[0],
+           measure_max[1]),
+          (int(1 / (measure_min[1] * self.sampling_period)), measure_min[0],
+           measure_min[1])
+      )
 
     fields3 = [
         "t_rise_sda", "t_rise_scl", "t_fall_sda", "t_fall_scl",
         "t_HD_DAT_host_rising", "t_HD_DAT_host_falling",
         "t_HD_DAT_dev_rising", "t_HD_DAT_dev_falling"
     ]
-    for f in fields3:
-      measure_max = measure_field.get(f + "_max")
-      measure_min = measure_field.get(f + "_min")
-      if measure_max and measure_min:
-        maxx = measure_max[1] * self.sampling_period
-        minn = measure_min[1] * self.sampling_period
-        values[f + "_max"] = maxx
-        values[f + "_min"] = minn
-        if "HD" in f:
-          ff = f[:8]
-          limit_max = spec_limit.get(ff)
-          if not limit_max:
-            limit_max = np.inf
-          limit_min = 0
-        else:
-          ff = f[:6]
-          limit_max = spec_limit.get(ff + "_max")
-          limit_min = spec_limit.get(ff + "_min")
-          if not limit_min:
-            limit_min = np.NINF
-        if maxx <= limit_max and minn >= limit_min:
-          result[f] = 0
-        else:
-          result[f] = 1
-        if limit_max - maxx < minn - limit_min:
-          values[f + "_worst"] = maxx
-          result[f + "_idx"] = measure_max[0]
-          svgwidth[f] = measure_max[1]
-          result[f + "_margin"] = limit_max - maxx
-          result[f + "_percent"] = (limit_max - maxx) / limit_max * 100
-        else:
-          values[f + "_worst"] = minn
-          result[f + "_idx"] = measure_min[0]
-          svgwidth[f] = measure_min[1]
-          result[f + "_margin"] = minn - limit_min
-          if "HD" in f and limit_max != np.inf:
-            result[f + "_percent"] = (minn - limit_min) / limit_max * 100
-          elif limit_min != 0:
-            result[f + "_percent"] = (minn - limit_min) / limit_min * 100
-          else:
-            result[f + "_percent"] = np.inf
-
     fields4 = [
         "t_low", "t_high", "t_SU_STA", "t_SU_STO", "t_BUF", "t_HD_STA_S",
         "t_HD_STA_Sr", "t_SU_DAT_host_rising", "t_SU_DAT_host_falling",
         "t_SU_DAT_dev_rising", "t_SU_DAT_dev_falling"
     ]
-    for f in fields4:
-      measure_max = measure_field.get(f + "_max")
-      measure_min = measure_field.get(f + "_min")
+    for f in fields3 + fields4:
+      measure_max = extremes.get(f + "_max")
+      measure_min = extremes.get(f + "_min")
       if measure_max and measure_min:
-        if f in ["t_low", "t_high", "t_SU_STA", "t_SU_STO", "t_BUF"]:
-          ff = f
-        else:
-          ff = f[:8]
-        maxx = measure_max[1] * self.sampling_period
-        minn = measure_min[1] * self.sampling_period
-        values[f + "_max"] = maxx
-        values[f + "_min"] = minn
-        values[f + "_worst"] = minn
-        result[f + "_idx"] = measure_min[0]
-        svgwidth[f] = measure_min[1]
-        limit = spec_limit[ff]
-        if minn >= limit:
-          result[f] = 0
-        else:
-          result[f] = 1
-        result[f + "_margin"] = minn - limit
-        result[f + "_percent"] = (minn - limit) / limit * 100
+        sides[f] = (
+            (measure_min[1] * self.sampling_period, measure_min[0],
+             measure_min[1]),
+            (measure_max[1] * self.sampling_period, measure_max[0],
+             measure_max[1])
+        )
+
+    # Every field checked with its limits at once, the worst side of a
+    # field is the one closer to its limit, fields the operation mode
+    # does not limit are not checked
+
+    checked = [f for f in FIELDS if f in sides]
+    limit_min, limit_max = field_limits(spec_limit, checked)
+    fail, use_max, margin, percent = evaluate(
+        np.array([sides[f][0][0] for f in checked], dtype=np.float64),
+        np.array([sides[f][1][0] for f in checked], dtype=np.float64),
+        limit_min, limit_max
+    )
+    limited = np.isfinite(limit_min) | np.isfinite(limit_max)
+    for j, f in enumerate(checked):
+      worst, idx, width = sides[f][int(use_max[j])]
+      values[f + "_max"] = sides[f][1][0]
+      values[f + "_min"] = sides[f][0][0]
+      values[f + "_worst"] = worst
+      result[f + "_idx"] = idx
+      svgwidth[f] = width
+      if limited[j]:
+        result[f] = int(fail[j])
+        result[f + "_margin"] = float(margin[j])
+        result[f + "_percent"] = float(percent[j])
 
     fields6 = ["runt_scl", "runt_sda"]
     for f in fields6:
-      if measure_field.get(f):
-        result[f] = measure_field[f]
+      if extremes.get(f):
+        result[f] = extremes[f]
+
+    # Distribution of every measurement, in the unit of values
+
+    if param_stats is None:
+      param_stats = {}
+      self.add_param_stats(param_stats, measure_field, 0, vs)
+    self.param_stats = dict(param_stats)
+
+    # Rise / fall time between extra thresholds, not checked with SPEC
+
+    for f, sample in self.measure_transitions(vs).items():
+      if len(sample):
+        self.param_stats[f] = ParamStats(sample)
+        values[f + "_max"] = np.max(sample)
+        values[f + "_min"] = np.min(sample)
+        values[f + "_worst"] = values[f + "_max"]
+
+    for f, stats in self.param_stats.items():
+      for key, value in stats.summary().items():
+        values[f + "_" + key] = value
+
+    # Same measurement checked with the SPEC of every mode and voltage
+
+    profiles = compile_profiles(registry(), self.has_clk_stretch, self.v_il,
+                                self.v_ih)
+    self.profile_result = profiles.check(values)
 
     return values, result, svgwidth
 
-  def get_svg_fields(self, result, svgwidth, vs):
+  def svg_field_filter(self, fail):
+    """Fields to plot according to the svg policy.
+
+    Args:
+      fail: fields that fail the SPEC
+
+    Returns:
+      fields: set of fields to plot, None for all
+    """
+    if self.svg == "fail":
+      return set(fail)
+    if self.svg == "requested" and self.fields is not None:
+      return set(self.fields)
+    return None
+
+  def get_svg_fields(self, result, svgwidth, vs, fields=None):
     """Save SVG Plot for Each parameter.
 
     Calculate Max/Min Value for Plot Boundary
@@ -988,9 +1513,12 @@ class HummingBird():
       result: get start idx of worst waveform
       svgwidth: get width of worst waveform
       vs: working voltage, for 30p and 70p marker on plot
+      fields: only plot the worst waveform of these fields, the
+              SCL / SDA overview is always plotted (default: all)
 
     Returns:
-      svg_fields: svg plots to draw on html report
+      svg_fields: svg plots to draw on html report, and the zoom-in
+                  waveform blob of them under "zoom"
     """
     if self.scl_data is not None:
       scl_v_max = np.max(self.scl_data)
@@ -999,32 +1527,42 @@ class HummingBird():
       sda_v_max = np.max(self.sda_data)
       sda_v_min = np.min(self.sda_data)
 
+    v_30p, v_70p = self.threshold_voltages(vs)
+    labels = self.threshold_labels()
+    svg_file = self.instrument.timed("svg_file", SVGFile)
     svg_fields = {}
-    svg_fields["scl"] = SVGFile(
-        self.scl_data, scl_v_max, scl_v_min, None, None, "scl_show", vs
+    svg_fields["scl"] = svg_file(
+        self.scl_data, scl_v_max, scl_v_min, None, None, "scl_show", v_30p,
+        v_70p
     )
-    svg_fields["sda"] = SVGFile(
-        self.sda_data, sda_v_max, sda_v_min, None, None, "sda_show", vs
+    svg_fields["sda"] = svg_file(
+        self.sda_data, sda_v_max, sda_v_min, None, None, "sda_show", v_30p,
+        v_70p
     )
     resolution = min(max(len(self.scl_data) // 2000, 1), 150)
     upscale_x = 3000 / len(self.scl_data) * resolution
     upscale_y = 40 * 5 // (scl_v_max - scl_v_min)
     part = max(int(2e-5 // self.sampling_period), 500)
+    zoom = ZoomBlob({
+        "scl": (self.scl_data, scl_v_min, scl_v_max),
+        "sda": (self.sda_data, sda_v_min, sda_v_max)
+    })
 
     fields1 = [
         "v_low_scl", "v_high_scl", "t_rise_scl", "t_fall_scl", "t_low",
         "t_high", "f_clk", "v_nl_scl", "v_nh_scl"
     ]
     for f in fields1:
-      if result.get(f + "_idx"):
+      if result.get(f + "_idx") and (fields is None or f in fields):
         idx = result[f + "_idx"]
         start_idx = math.floor(
             max(0, min(idx - part, len(self.scl_data) - part * 2))
         )
         end_idx = math.ceil(min(len(self.scl_data), max(idx + part, part * 2)))
-        svg_fields[f] = SVGFile(
+        svg_fields[f] = svg_file(
             self.scl_data[start_idx:end_idx], scl_v_max, scl_v_min,
-            idx - start_idx, svgwidth[f], f, vs
+            idx - start_idx, svgwidth[f], f, v_30p, v_70p,
+            zoom.add("scl", start_idx, end_idx), labels
         )
         rect_width = max(svgwidth[f] // resolution * upscale_x, 40)
         rect_x = idx // resolution * upscale_x - rect_width
@@ -1035,11 +1573,11 @@ class HummingBird():
             f"\n\t\t\t\t<polygon id='{f}_poly' points='{mid_x - 50} 50, {mid_x} 110, {mid_x + 50} 50' class='arrow'/>"
         )
 
-    y30p = (scl_v_max - 0.3 * vs) * upscale_y + 120
-    y70p = (scl_v_max - 0.7 * vs) * upscale_y + 120
+    y30p = (scl_v_max - v_30p) * upscale_y + 120
+    y70p = (scl_v_max - v_70p) * upscale_y + 120
     svg_fields["scl"] += (
-        f"\n\t\t\t\t<text x=0 y={y30p} class='text2 runt_scl hide'>30 %</text>"
-        f"\n\t\t\t\t<text x=0 y={y70p} class='text2 runt_scl hide'>70 %</text>"
+        f"\n\t\t\t\t<text x=0 y={y30p} class='text2 runt_scl hide'>{labels[0]}</text>"
+        f"\n\t\t\t\t<text x=0 y={y70p} class='text2 runt_scl hide'>{labels[1]}</text>"
         f"\n\t\t\t\t<line x1=0 y1={y30p} x2=100% y2={y30p} class='line2 runt_scl hide'/>"
         f"\n\t\t\t\t<line x1=0 y1={y70p} x2=100% y2={y70p} class='line2 runt_scl hide'/>"
     )
@@ -1058,15 +1596,16 @@ class HummingBird():
         "v_nh_sda"
     ]
     for f in fields2:
-      if result.get(f + "_idx"):
+      if result.get(f + "_idx") and (fields is None or f in fields):
         idx = result[f + "_idx"]
         start_idx = math.floor(
             max(0, min(idx - part, len(self.sda_data) - part * 2))
         )
         end_idx = math.ceil(min(len(self.sda_data), max(idx + part, part * 2)))
-        svg_fields[f] = SVGFile(
+        svg_fields[f] = svg_file(
             self.sda_data[start_idx:end_idx], sda_v_max, sda_v_min,
-            idx - start_idx, svgwidth[f], f, vs
+            idx - start_idx, svgwidth[f], f, v_30p, v_70p,
+            zoom.add("sda", start_idx, end_idx), labels
         )
         rect_width = max(svgwidth[f] // resolution * upscale_x, 40)
         rect_x = idx // resolution * upscale_x - rect_width
@@ -1085,19 +1624,21 @@ class HummingBird():
         "t_HD_STA_S", "t_HD_STA_Sr", "t_SU_STA", "t_SU_STO", "t_BUF"
     ]
     for f in fields3:
-      if result.get(f + "_idx"):
+      if result.get(f + "_idx") and (fields is None or f in fields):
         idx = result[f + "_idx"]
         start_idx = math.floor(
             max(0, min(idx - part, len(self.scl_data) - part * 2))
         )
         end_idx = math.ceil(min(len(self.scl_data), max(idx + part, part * 2)))
-        svg_fields[f + "_scl"] = SVGFile(
+        svg_fields[f + "_scl"] = svg_file(
             self.scl_data[start_idx:end_idx], scl_v_max, scl_v_min,
-            idx - start_idx, svgwidth[f], f + "_scl", vs
+            idx - start_idx, svgwidth[f], f + "_scl", v_30p, v_70p,
+            zoom.add("scl", start_idx, end_idx), labels
         )
-        svg_fields[f + "_sda"] = SVGFile(
+        svg_fields[f + "_sda"] = svg_file(
             self.sda_data[start_idx:end_idx], sda_v_max, sda_v_min,
-            idx - start_idx, svgwidth[f], f + "_sda", vs
+            idx - start_idx, svgwidth[f], f + "_sda", v_30p, v_70p,
+            zoom.add("sda", start_idx, end_idx), labels
         )
         rect_width = max(svgwidth[f] // resolution * upscale_x, 40)
         rect_x = idx // resolution * upscale_x - rect_width
@@ -1112,11 +1653,11 @@ class HummingBird():
             f" class='rect hide'/>"
         )
 
-    y30p = (sda_v_max - 0.3 * vs) * upscale_y + 120
-    y70p = (sda_v_max - 0.7 * vs) * upscale_y + 120
+    y30p = (sda_v_max - v_30p) * upscale_y + 120
+    y70p = (sda_v_max - v_70p) * upscale_y + 120
     svg_fields["sda"] += (
-        f"\n\t\t\t\t<text x=0 y={y30p} class='text2 hide runt_sda'>30 %</text>"
-        f"\n\t\t\t\t<text x=0 y={y70p} class='text2 hide runt_sda'>70 %</text>"
+        f"\n\t\t\t\t<text x=0 y={y30p} class='text2 hide runt_sda'>{labels[0]}</text>"
+        f"\n\t\t\t\t<text x=0 y={y70p} class='text2 hide runt_sda'>{labels[1]}</text>"
         f"\n\t\t\t\t<line x1=0 y1={y30p} x2=100% y2={y30p} class='line2 runt_sda hide'/>"
         f"\n\t\t\t\t<line x1=0 y1={y70p} x2=100% y2={y70p} class='line2 runt_sda hide'/>"
     )
@@ -1131,6 +1672,7 @@ class HummingBird():
         )
     svg_fields["scl"] += "\n\t\t\t</svg>\n\t\t</div>\n\t</div>"
     svg_fields["sda"] += "\n\t\t\t</svg>\n\t\t</div>\n\t</div>"
+    svg_fields["zoom"] = zoom.html()
 
     return svg_fields
 
@@ -1142,17 +1684,25 @@ class HummingBird():
     measurement values.
 
     Returns:
-      report_path: output testing report
+      report_path: output testing report, None if html is False
+      test_item: operation mode, working voltage, values, result,
+                 fail, number of pass, addresses, sampling rate
+                 and waveform info
     """
-    data1 = self.data_list[:, 1]
-    data2 = self.data_list[:, 2]
+    data1 = self.data_list[:, self.channels[0]]
+    data2 = self.data_list[:, self.channels[1]]
 
+    instrument = self.instrument
+    instrument.begin("working_voltage")
     print("------------------------------------")
     if self.vs is None:
       vs = self.determine_working_voltage(data1)
     else:
       vs = self.vs
     print("Working Voltage: ", vs, "V")
+    instrument.end("working_voltage")
+
+    instrument.begin("datatype")
     self.determine_datatype(data1, data2)
     if self.mode is None:
       mode = self.determine_operation_mode()
@@ -1160,10 +1710,21 @@ class HummingBird():
       mode = self.mode.replace("_", " ")
     print("Operation Mode: ", mode)
     print("------------------------------------")
+    instrument.end("datatype")
 
     ################### Measure Each Parameter ############################
 
-    measure_field, addr_list = self.measure_both_scl_sda()
+    instrument.begin("measure")
+    if self.workers:
+      min_idle = self.get_spec_limitation(mode, vs).get("t_BUF_min", 5e-7)
+      measure_field, addr_list, param_stats = self.measure_segments(
+          self.workers, min_idle, vs=vs
+      )
+    else:
+      param_stats = {}
+      measure_field, addr_list = self.measure_both_scl_sda(
+          param_stats=param_stats, vs=vs
+      )
     print("Complete measurement")
     print("Total captured SCL rising edges: ", self.scl_rising_edge)
     print("Total captured SCL falling edges: ", self.scl_falling_edge)
@@ -1172,20 +1733,22 @@ class HummingBird():
     print("Total captured START pattern: ", self.start_num)
     print("Total captured RESTART pattern: ", self.restart_num)
     print("Total captured STOP pattern: ", self.stop_num)
-    scl_runt_num = 0
-    if measure_field.get("runt_scl"):
-      scl_runt_num = len(measure_field["runt_scl"])
-    sda_runt_num = 0
-    if measure_field.get("runt_sda"):
-      sda_runt_num = len(measure_field["runt_sda"])
+    extremes = measure_field.extremes()
+    scl_runt_num = len(extremes.get("runt_scl", []))
+    sda_runt_num = len(extremes.get("runt_sda", []))
     print("Total captured RUNT pattern on SCL dataline: ", scl_runt_num)
     print("Total captured RUNT pattern on SDA dataline: ", sda_runt_num)
     print("------------------------------------")
+    instrument.end("measure")
+    instrument.count("edge_events", self.edge_events)
+    instrument.count("events", len(measure_field))
 
     ################### Check SPEC Limitation ##############################
 
+    instrument.begin("check_spec")
     spec_limit = self.get_spec_limitation(mode, vs)
-    values, result, svgwidth = self.check_spec(spec_limit, measure_field, vs)
+    values, result, svgwidth = self.check_spec(spec_limit, measure_field, vs,
+                                               param_stats)
     print("Complete check spec")
 
     fail = {}
@@ -1199,6 +1762,15 @@ class HummingBird():
     values["spec"] = len(fail)
     print("Pass: ", num_pass)
     print("Fail: ", len(fail))
+    status = {name: profile_status(checks)
+              for name, checks in self.profile_result.items()}
+    passed = [name for name in status if status[name] == "Pass"]
+    incomplete = [name for name in status if status[name] == "Incomplete"]
+    print("Pass profiles: ", ", ".join(passed) if passed else None)
+    if incomplete:
+      print("Incomplete profiles (fields not measured): ",
+            ", ".join(incomplete))
+    instrument.end("check_spec")
 
     ############### Generate and Show Report ##############
 
@@ -1210,21 +1782,65 @@ class HummingBird():
     print("Sampling_rate: ", sampling_rate, "MS/s")
     print("------------------------------------")
 
-    svg_fields = self.get_svg_fields(result, svgwidth, vs)
     waveform_info = [
         self.scl_rising_edge, self.scl_falling_edge, self.sda_rising_edge,
         self.sda_falling_edge, self.start_num, self.restart_num, self.stop_num
     ]
-    report_path = OutputReportFile(
-        mode, spec_limit.copy(), vs, self.has_clk_stretch, values.copy(), result.copy(),
-        fail.copy(), num_pass, svg_fields, uni_addr, sampling_rate,
-        waveform_info, self.save_folder
-    )
+    report_path = None
+    if self.html:
+      instrument.begin("svg")
+      svg_fields = self.get_svg_fields(result, svgwidth, vs,
+                                       self.svg_field_filter(fail))
+      instrument.end("svg")
+
+      instrument.begin("report")
+      report_path = OutputReportFile(
+          mode, spec_limit.copy(), vs, self.has_clk_stretch, values.copy(),
+          result.copy(), fail.copy(), num_pass, svg_fields, uni_addr,
+          sampling_rate, waveform_info, self.save_folder, self.param_stats,
+          self.profile_result
+      )
+      instrument.end("report")
+      instrument.count("bytes_written", os.path.getsize(report_path))
 
     test_item = [
         mode, vs, values.copy(), result.copy(), fail.copy(),
         num_pass, uni_addr, sampling_rate, waveform_info
     ]
 
+    ############### Export Machine-Readable Result ##############
+
+    profile_path = instrument.profile_path(self.save_folder)
+    if self.export:
+      instrument.begin("export")
+      time_now = datetime.datetime.now()
+      events_path = os.path.join(
+          self.save_folder, f"events_{time_now.strftime('%Y%m%d%H%M%S')}.npz"
+      )
+      jsonl_path = os.path.join(self.save_folder, "results.jsonl")
+      save_events(events_path, measure_field, self.sampling_period)
+      instrument.end("export")
+      instrument.count("bytes_written", os.path.getsize(events_path))
+      append_jsonl(jsonl_path, {
+          "time": time_now.isoformat(timespec="seconds"),
+          "csv": self.csv_data_path, "channels": self.channels,
+          "report": report_path,
+          "events": events_path, "mode": mode, "vs": vs,
+          "sampling_rate": sampling_rate,
+          "sampling_period": self.sampling_period,
+          "clk_stretch": self.has_clk_stretch, "spec": spec_limit,
+          "profiles": self.profile_result,
+          "values": values, "result": result, "fail": sorted(fail),
+          "num_pass": num_pass, "addr": uni_addr,
+          "waveform_info": dict(zip(WAVEFORM_COUNTERS, waveform_info)),
+          "timing": self.timing, "counters": instrument.counters,
+          "memory": instrument.memory, "profile": profile_path
+      })
+      print("Export result at ", jsonl_path)
+
+    instrument.finish(profile_path)
+    print("------------------------------------")
+    instrument.summary()
+
     return report_path, test_item
 
@@ -0,0 +1,226 @@
+"""HummingBird synthetic I2C waveform generator.
+
+This is a python excution file to generate analog SCL and SDA
+captures of I2C traffic in [time, CH1, CH2] csv format, as
+fixtures for benchmarks of the measurement pipeline.
+
+"""
+import argparse
+
+import numpy as np
+
+
+# SCL clock frequency of each mode, 90% of the SPEC maximum
+MODES = {"Standard_Mode": 9e4, "Fast_Mode": 3.6e5, "Fast_Mode_Plus": 9e5}
+CHUNK_SAMPLES = 1 << 20  # samples synthesized and written at a time
+
+
+class BusConfig():
+  """Synthetic I2C bus configuration.
+
+  Attributes:
+    sample_rate: samples per second
+    f_clk: SCL clock frequency
+    vdd: working voltage
+    t_rise: 30% to 70% rise time of both datalines
+    t_fall: 70% to 30% fall time of both datalines
+    noise: standard deviation of the gaussian noise (unit: V)
+    stretch: probability of a clock stretched SCL LOW period
+    runt: probability of a runt pulse on SDA in a SCL LOW period
+    restart: probability of a READ after RESTART in a transaction
+    addresses: 7-bit device addresses, one is picked per transaction
+    seed: random seed
+  """
+
+  def __init__(self, sample_rate=1e8, mode="Fast_Mode", vdd=3.3,
+               t_rise=1e-7, t_fall=2e-8, noise=0.01, stretch=0.0, runt=0.0,
+               restart=0.5, addresses=(0x50,), seed=0):
+    self.sample_rate = sample_rate
+    self.f_clk = MODES[mode]
+    self.vdd = vdd
+    self.t_rise = t_rise
+    self.t_fall = t_fall
+    self.noise = noise
+    self.stretch = stretch
+    self.runt = runt
+    self.restart = restart
+    self.addresses = list(addresses)
+    self.seed = seed
+
+
+def bus_transitions(config, duration):
+  """Generate the logic transitions of I2C transactions.
+
+  Each transaction is START, address with WRITE, one data byte, then
+  either STOP or RESTART, address with READ, one data byte and STOP.
+  Bytes are acknowledged. SCL is LOW for 60% of the clock period,
+  SDA changes in the middle of SCL LOW, and the bus is idle for two
+  clock periods between transactions. Runt pulses of SDA toward 50%
+  VDD are placed after the data bit settles in the SCL LOW period.
+
+  Args:
+    config: BusConfig
+    duration: minimum capture time (unit: s)
+
+  Returns:
+    scl: list of (time, level) transitions of SCL, level from 0 to 1
+    sda: list of (time, level) transitions of SDA, level from 0 to 1
+    end: capture end time
+  """
+  rng = np.random.default_rng(config.seed)
+  t_low = 0.6 / config.f_clk
+  t_high = 0.4 / config.f_clk
+  t = 2 / config.f_clk
+  scl = [(0.0, 1)]
+  sda = [(0.0, 1)]
+  while t < duration:
+    addr = config.addresses[rng.integers(len(config.addresses))]
+    packets = [[addr << 1, int(rng.integers(0, 256))]]
+    if rng.random() < config.restart:
+      packets.append([(addr << 1) | 1, int(rng.integers(0, 256))])
+
+    for k, packet in enumerate(packets):
+      if k:  # RESTART
+        sda.append((t + t_low / 2, 1))
+        t += t_low
+        scl.append((t, 1))
+        t += t_low
+      sda.append((t, 0))  # START
+      t += t_high
+      scl.append((t, 0))
+      for byte in packet:
+        for bit in [(byte >> (7 - j)) & 1 for j in range(8)] + [0]:
+          sda.append((t + t_low / 2, bit))
+          low = t_low
+          if rng.random() < config.stretch:
+            low *= 3
+          if rng.random() < config.runt:
+            # pulse toward the other level, stopping at 50% VDD
+            sda.append((t + low * 5 / 8, 0.5))
+            sda.append((t + low * 7 / 8, bit))
+          t += low
+          scl.append((t, 1))
+          t += t_high
+          scl.append((t, 0))
+
+    sda.append((t + t_low / 2, 0))  # STOP
+    t += t_low
+    scl.append((t, 1))
+    t += t_high
+    sda.append((t, 1))
+    t += 2 / config.f_clk
+
+  return scl, sda, t
+
+
+class AnalogLine():
+  """Analog waveform of a dataline driven by logic transitions.
+
+  Each transition charges or discharges the line exponentially
+  toward the new level, with the time constant of the rise or
+  fall time, starting from the voltage left by the last one.
+
+  Attributes:
+    times: transition times
+    levels: target voltage after each transition
+    start: line voltage at each transition
+    tau: time constant after each transition
+  """
+
+  def __init__(self, transitions, vdd, t_rise, t_fall):
+    self.times = np.array([t for t, _ in transitions])
+    self.levels = np.array([level for _, level in transitions]) * vdd
+    rising = np.diff(self.levels, prepend=0) > 0
+    self.tau = np.where(rising, t_rise, t_fall) / np.log(7 / 3)
+    self.start = np.empty(len(self.times))
+    self.start[0] = self.levels[0]
+    decay = np.exp(-np.diff(self.times) / self.tau[:-1])
+    for k in range(1, len(self.times)):
+      self.start[k] = (self.levels[k - 1] +
+                       (self.start[k - 1] - self.levels[k - 1]) * decay[k - 1])
+
+  def voltage(self, ts):
+    """Line voltage at sorted sample times."""
+    k = np.searchsorted(self.times, ts, side="right") - 1
+    return self.levels[k] + (self.start[k] - self.levels[k]) * np.exp(
+        -(ts - self.times[k]) / self.tau[k])
+
+
+def iter_capture(config, num_samples, chunk_samples=CHUNK_SAMPLES):
+  """Iterate over a synthetic capture in chunks.
+
+  Args:
+    config: BusConfig
+    num_samples: number of samples of the capture
+    chunk_samples: number of samples per chunk
+
+  Yields:
+    chunk: 2-D numpy array of [time, SCL, SDA] rows
+  """
+  scl, sda, _ = bus_transitions(config, num_samples / config.sample_rate)
+  scl_line = AnalogLine(scl, config.vdd, config.t_rise, config.t_fall)
+  sda_line = AnalogLine(sda, config.vdd, config.t_rise, config.t_fall)
+  rng = np.random.default_rng(config.seed + 1)
+  for lo in range(0, num_samples, chunk_samples):
+    hi = min(lo + chunk_samples, num_samples)
+    ts = np.arange(lo, hi) / config.sample_rate
+    yield np.column_stack([
+        ts,
+        scl_line.voltage(ts) + rng.normal(0, config.noise, len(ts)),
+        sda_line.voltage(ts) + rng.normal(0, config.noise, len(ts))
+    ])
+
+
+def write_capture(csv_data_path, config, num_samples, swap=False):
+  """Write a synthetic capture in [time, CH1, CH2] csv format.
+
+  Args:
+    csv_data_path: csv file to write
+    config: BusConfig
+    num_samples: number of samples of the capture
+    swap: write SDA as CH1 and SCL as CH2
+  """
+  with open(csv_data_path, "w") as f:
+    f.write("Time [s],CH1,CH2\n")
+    for chunk in iter_capture(config, num_samples):
+      if swap:
+        chunk = chunk[:, [0, 2, 1]]
+      np.savetxt(f, chunk, delimiter=",", fmt=["%.12g", "%.6f", "%.6f"])
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("output_csv", help="output csv data path")
+  parser.add_argument("--samples", default=1e6, type=float,
+                      help="number of samples")
+  parser.add_argument("--sample_rate", default=1e8, type=float,
+                      help="sampling rate (unit: S/s)")
+  parser.add_argument("--operation_mode", default="Fast_Mode",
+                      choices=list(MODES), help="SCL clock frequency")
+  parser.add_argument("--working_voltage", default=3.3, type=float,
+                      help="supplying voltage (unit: V)")
+  parser.add_argument("--t_rise", default=1e-7, type=float,
+                      help="30%% to 70%% rise time (unit: s)")
+  parser.add_argument("--t_fall", default=2e-8, type=float,
+                      help="70%% to 30%% fall time (unit: s)")
+  parser.add_argument("--noise", default=0.01, type=float,
+                      help="standard deviation of noise (unit: V)")
+  parser.add_argument("--stretch", default=0.0, type=float,
+                      help="probability of clock stretching per SCL cycle")
+  parser.add_argument("--runt", default=0.0, type=float,
+                      help="probability of a runt pulse per SCL cycle")
+  parser.add_argument("--restart", default=0.5, type=float,
+                      help="probability of RESTART per transaction")
+  parser.add_argument("--addresses", default=["0x50"], nargs="+",
+                      help="7-bit device addresses, ex: 0x50 0x2C")
+  parser.add_argument("--swap", action="store_true",
+                      help="write SDA as CH1 and SCL as CH2")
+  parser.add_argument("--seed", default=0, type=int, help="random seed")
+  args = parser.parse_args()
+
+  bus = BusConfig(
+      args.sample_rate, args.operation_mode, args.working_voltage,
+      args.t_rise, args.t_fall, args.noise, args.stretch, args.runt,
+      args.restart, [int(a, 16) for a in args.addresses], args.seed
+  )
+  write_capture(args.output_csv, bus, int(args.samples), args.swap)
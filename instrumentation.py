@@ -0,0 +1,155 @@
+"""HummingBird measurement instrumentation.
+
+Time every stage of the measurement and count the work done in it,
+and optionally capture a cProfile profile and the tracemalloc memory
+peak of each stage, to see where time and memory go on real captures.
+"""
+import contextlib
+import cProfile
+import datetime
+import io
+import os
+import pstats
+import time
+import tracemalloc
+
+
+PROFILE_ENV = "HUMMINGBIRD_PROFILE"  # set to 1 to profile without --profile
+PROFILE_LINES = 25  # functions printed from the profile
+
+
+def profile_enabled(profile=None):
+  """Whether to profile.
+
+  Args:
+    profile: --profile flag, None if not given
+
+  Returns:
+    enabled: the flag if given, otherwise whether the HUMMINGBIRD_PROFILE
+             environment variable is set and not 0
+  """
+  if profile is not None:
+    return profile
+  return os.environ.get(PROFILE_ENV, "") not in ("", "0")
+
+
+class Instrumentation():
+  """Stage timers and counters.
+
+  Stages could run more than once, ex: one SVGFile call per plot,
+  their elapsed time is added up.
+
+  Attributes:
+    timing: elapsed time of each stage (unit: s)
+    counters: count of each quantity, ex: edge events processed
+    memory: tracemalloc peak of each top-level stage (unit: bytes),
+            only filled until the profile is finished
+    profile: capture cProfile and tracemalloc
+    profiler: cProfile.Profile while profiling, None otherwise
+    started: start time of the stages in progress
+  """
+
+  def __init__(self, profile=None):
+    self.timing = {}
+    self.counters = {}
+    self.memory = {}
+    self.started = {}
+    self.profile = profile_enabled(profile)
+    self.profiler = None
+    if self.profile:
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+      self.profiler = cProfile.Profile()
+      self.profiler.enable()
+
+  def begin(self, stage):
+    """Start timing a stage."""
+    if self.profiler is not None and not self.started:
+      tracemalloc.reset_peak()
+    self.started[stage] = time.perf_counter()
+
+  def end(self, stage):
+    """Stop timing a stage, and add its elapsed time to timing[stage]."""
+    elapsed = time.perf_counter() - self.started.pop(stage)
+    self.timing[stage] = self.timing.get(stage, 0) + elapsed
+    if self.profiler is not None and not self.started:
+      _, peak = tracemalloc.get_traced_memory()
+      self.memory[stage] = max(self.memory.get(stage, 0), peak)
+
+  @contextlib.contextmanager
+  def stage(self, stage):
+    """Time the with block as stage."""
+    self.begin(stage)
+    try:
+      yield
+    finally:
+      self.end(stage)
+
+  def count(self, name, value=1):
+    """Add value to counters[name]."""
+    self.counters[name] = self.counters.get(name, 0) + value
+
+  def timed(self, stage, func):
+    """Wrap func to time every call as stage and count the calls.
+
+    Args:
+      stage: stage name
+      func: function to wrap
+
+    Returns:
+      wrapper: function calling func, counted in counters[stage + "_calls"]
+    """
+    def wrapper(*args, **kwargs):
+      self.count(stage + "_calls")
+      with self.stage(stage):
+        return func(*args, **kwargs)
+
+    return wrapper
+
+  def profile_path(self, save_folder=None):
+    """Path to save the profile at, to know it before finish.
+
+    Args:
+      save_folder: folder to save the cProfile stats, None not to save
+
+    Returns:
+      profile_path: cProfile stats path, None if not profiling or saving
+    """
+    if self.profiler is None or save_folder is None:
+      return None
+    time_now = datetime.datetime.now()
+    return os.path.join(
+        save_folder, f"profile_{time_now.strftime('%Y%m%d%H%M%S')}.prof"
+    )
+
+  def finish(self, profile_path=None):
+    """Stop profiling, print and save the profile.
+
+    Args:
+      profile_path: path to save the cProfile stats, None not to save
+    """
+    if self.profiler is None:
+      return
+    self.profiler.disable()
+    tracemalloc.stop()
+    stream = io.StringIO()
+    stats = pstats.Stats(self.profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(PROFILE_LINES)
+    print(stream.getvalue())
+
+    if profile_path is not None:
+      stats.dump_stats(profile_path)
+      print("Save profile at ", profile_path)
+    self.profiler = None
+
+  def summary(self):
+    """Print the timing, memory and counters of every stage."""
+    print("Stage timing:")
+    for stage, elapsed in self.timing.items():
+      memory = ""
+      if stage in self.memory:
+        memory = f"\tpeak {self.memory[stage] / (1 << 20):.1f} MB"
+      print(f"  {stage}: {elapsed:.3f} s{memory}")
+    print("Counters:")
+    for name, value in self.counters.items():
+      print(f"  {name}: {value}")
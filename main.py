@@ -7,15 +7,21 @@ data from csv file.
 import argparse
 import os
 import subprocess
+import sys
 import time
 
+from capture_cache import CaptureCache
 from hummingbird import HummingBird
+from hummingbird import SPEC_FIELDS
+from hummingbird import SVG_POLICIES
+from spec_limits import mode_choices
 
 
 if __name__ == "__main__":
   parser = argparse.ArgumentParser()
   parser.add_argument("csv",
-                      help="csv data path, column format: [time, CH1, CH2]")
+                      help="csv data path, column format: [time, CH1, CH2], "
+                      "or a RIGOL / Keysight csv or Saleae Logic2 .bin export")
   parser.add_argument("--output_folder", default=None,
                       help="the folder path to save output report, "
                       "ex:\"./output_reports/\"")
@@ -23,8 +29,44 @@ if __name__ == "__main__":
                       choices=[1.8, 3.3, 5],
                       help="supplying voltage (unit: V)")
   parser.add_argument("--operation_mode", default=None,
-                      choices=["Standard_Mode", "Fast_Mode", "Fast_Mode_Plus"],
-                      help="SPEC operation mode")
+                      choices=mode_choices(),
+                      help="SPEC operation mode, from the spec_profiles files")
+  parser.add_argument("--cache_folder", default=None,
+                      help="the folder path to cache binary captures, "
+                      "default under the tmp folder")
+  parser.add_argument("--no_cache", action="store_true",
+                      help="always parse the csv file, without binary cache")
+  parser.add_argument("--workers", default=None, type=int,
+                      help="number of worker processes to measure segments "
+                      "of a long capture in parallel")
+  parser.add_argument("--fields", default=None, nargs="+",
+                      choices=SPEC_FIELDS, metavar="FIELD",
+                      help="only measure these SPEC fields, "
+                      "ex: t_rise_scl t_fall_scl (default: all)")
+  parser.add_argument("--svg", default="all", choices=SVG_POLICIES,
+                      help="waveform plots of all fields, the failed "
+                      "fields or the requested --fields only")
+  parser.add_argument("--v_il", default=None, type=float,
+                      help="threshold of state LOW (unit: V), "
+                      "default to 30%% of the working voltage")
+  parser.add_argument("--v_ih", default=None, type=float,
+                      help="threshold of state HIGH (unit: V), "
+                      "default to 70%% of the working voltage")
+  parser.add_argument("--transition", default=None, type=float, nargs=2,
+                      action="append", metavar=("LOW", "HIGH"),
+                      help="also measure rise and fall time between two "
+                      "fractions of the working voltage, ex: 0.1 0.9, "
+                      "could be given more than once")
+  parser.add_argument("--no_html", action="store_true",
+                      help="skip the waveform plots and the HTML report, "
+                      "exit with status 1 if any SPEC fails")
+  parser.add_argument("--export", action="store_true",
+                      help="append the result to results.jsonl and save "
+                      "all measurement events as .npz in the output folder")
+  parser.add_argument("--profile", action="store_true", default=None,
+                      help="print and save a cProfile profile and the memory "
+                      "peak of each stage, also enabled by the "
+                      "HUMMINGBIRD_PROFILE=1 environment variable")
   args = parser.parse_args()
 
   if args.output_folder is None:
@@ -34,17 +76,36 @@ if __name__ == "__main__":
   if not os.path.exists(args.output_folder):
     os.makedirs(args.output_folder)
 
+  cache = None
+  if not args.no_cache:
+    cache = CaptureCache(args.cache_folder)
+
   stt = time.time()
   print("\nLoading data from ", args.csv)
   hum1 = HummingBird(csv_data_path=args.csv,
                      save_folder=args.output_folder,
                      vs=args.working_voltage,
-                     mode=args.operation_mode)
+                     mode=args.operation_mode,
+                     cache=cache,
+                     workers=args.workers,
+                     fields=args.fields,
+                     svg=args.svg,
+                     html=not args.no_html,
+                     export=args.export,
+                     v_il=args.v_il,
+                     v_ih=args.v_ih,
+                     transitions=args.transition,
+                     profile=args.profile)
   print("=== Data Load time: ", time.time() - stt, "s ===")
 
   stt = time.time()
-  report_path, _ = hum1.measure()
-  print("Generate report at ", report_path)
+  report_path, test_item = hum1.measure()
+  if report_path is not None:
+    print("Generate report at ", report_path)
   print("=== Measure Time: ", time.time() - stt, "s ===")
 
+  if args.no_html:
+    fail = test_item[4]
+    print("Result: ", "Fail " + ", ".join(fail) if fail else "Pass")
+    sys.exit(1 if fail else 0)
   subprocess.run(["open", report_path], check=True)
@@ -0,0 +1,307 @@
+"""HummingBird multi-bus execution file.
+
+This is a python excution file to run I2C eletrical test on
+every I2C bus of a capture with more than two analog channels.
+Channels are paired into SCL / SDA buses automatically, and the
+buses are measured in parallel, one worker process per bus, all
+reading the capture loaded once in shared memory.
+
+"""
+import argparse
+import concurrent.futures
+from multiprocessing import shared_memory
+import os
+import re
+import time
+
+from batch import measure_capture
+from batch import merge_results
+from batch import write_summary
+from capture_cache import CaptureCache
+from data_loader import find_importer
+from data_loader import load_file
+from edge_detection import iter_edges
+from hummingbird import HummingBird
+from hummingbird import SPEC_FIELDS
+from hummingbird import SVG_POLICIES
+import numpy as np
+from spec_limits import mode_choices
+
+
+MIN_PAIR_SCORE = 0.8  # fraction of SDA edges while SCL is LOW to pair
+MIN_PAIR_EDGES = 8  # SDA edges while SCL toggles needed to score a pair
+IDLE_GAPS = 4  # SCL idle if it does not toggle for this many median gaps
+
+
+def share_capture(data_list):
+  """Copy a capture into shared memory.
+
+  The copy is in Fortran order, so every channel is contiguous.
+
+  Args:
+    data_list: [time, CH1, CH2, ...] capture
+
+  Returns:
+    shm: SharedMemory holding the capture, to close and unlink
+    shared: numpy array of the capture in shm
+  """
+  shm = shared_memory.SharedMemory(create=True, size=max(data_list.nbytes, 1))
+  shared = np.ndarray(data_list.shape, dtype=data_list.dtype, buffer=shm.buf,
+                      order="F")
+  shared[:] = data_list
+  return shm, shared
+
+
+def find_buses(hum, min_score=MIN_PAIR_SCORE):
+  """Pair the channels of a capture into I2C buses.
+
+  SDA only changes while SCL is LOW, except at START and STOP, so
+  score[a, b], the fraction of the edges of channel b while channel a
+  is LOW, is close to 1 only if a is the SCL and b the SDA of one bus,
+  and about the duty cycle of a otherwise. Only the edges of b while
+  a toggles are scored, the ones in a gap of a longer than IDLE_GAPS
+  times its median gap are left out, so the START and STOP around an
+  idle bus do not lower the score. Edges are matched by searchsorted
+  and scored in one gather for each pair. Pairs are taken by
+  decreasing score, each channel in one bus at most. An SCL toggles at
+  least as often as its SDA, so a channel held LOW is never paired as
+  SCL.
+
+  Args:
+    hum: HummingBird holding the capture in data_list, its working
+         voltage and thresholds are used if set
+    min_score: minimum score to pair two channels
+
+  Returns:
+    buses: list of (SCL column, SDA column, score), by SCL column
+  """
+  data_list = hum.data_list
+  columns = range(1, data_list.shape[1])
+  v_low = np.zeros(data_list.shape[1])
+  edges = {}
+  for k in columns:
+    if hum.vs is None:
+      hum.determine_working_voltage(data_list[:, k])
+    else:
+      hum.v_30p, hum.v_70p = hum.threshold_voltages(hum.vs)
+    v_low[k] = hum.v_30p
+    idx = [i for i, _ in iter_edges(data_list[:, k], hum.v_30p, hum.v_70p)]
+    edges[k] = np.concatenate(idx) if idx else np.zeros(0, dtype=np.int64)
+
+  score = np.zeros((data_list.shape[1], data_list.shape[1]))
+  for a in columns:
+    if len(edges[a]) < 2:
+      continue
+    max_gap = IDLE_GAPS * np.median(np.diff(edges[a]))
+    for b in columns:
+      if a == b or len(edges[a]) < len(edges[b]):
+        continue
+      pos = np.searchsorted(edges[a], edges[b])
+      inside = (pos > 0) & (pos < len(edges[a]))
+      gap = edges[a][pos[inside]] - edges[a][pos[inside] - 1]
+      idx = edges[b][inside][gap <= max_gap]
+      if len(idx) >= MIN_PAIR_EDGES:
+        score[a, b] = np.mean(data_list[idx, a] < v_low[a])
+
+  buses = []
+  used = set()
+  for a, b in zip(*np.unravel_index(np.argsort(-score, axis=None),
+                                    score.shape)):
+    if score[a, b] < min_score or not score[a, b]:
+      break
+    if a not in used and b not in used:
+      buses.append((int(a), int(b), float(score[a, b])))
+      used.update((a, b))
+
+  return sorted(buses)
+
+
+def measure_bus(shm_name, shape, dtype, channels, csv_data_path, save_folder,
+                options):
+  """Measure one bus of a capture in shared memory.
+
+  Runs in a worker process, see batch.measure_capture.
+
+  Args:
+    shm_name: name of the SharedMemory holding the capture
+    shape: shape of the capture array
+    dtype: dtype of the capture array
+    channels: SCL and SDA column of the bus
+    csv_data_path: capture file path
+    save_folder: folder for the report and log of this bus
+    options: other keyword arguments of batch.measure_capture
+
+  Returns:
+    summary: dictionary returned by batch.measure_capture
+  """
+  shm = shared_memory.SharedMemory(name=shm_name)
+  try:
+    data_list = np.ndarray(shape, dtype=dtype, buffer=shm.buf, order="F")
+    summary = measure_capture(csv_data_path, save_folder, data_list=data_list,
+                              channels=channels, **options)
+    del data_list
+  finally:
+    shm.close()
+  return summary
+
+
+def run_buses(csv_data_path, shm, shared, names, buses, output_folder,
+              workers=None, **options):
+  """Measure the buses of a capture in parallel.
+
+  Args:
+    csv_data_path: capture file path
+    shm: SharedMemory holding the capture
+    shared: numpy array of the capture in shm
+    names: name of every channel column, the time column included
+    buses: list of (SCL column, SDA column, score) from find_buses
+    output_folder: folder to save reports, one sub folder per bus
+    workers: number of worker processes (default: number of cores)
+    **options: other keyword arguments of batch.measure_capture
+
+  Returns:
+    summaries: list of measure_capture results, in the order of buses,
+               csv is labeled with the channels of the bus
+  """
+  summaries = [None] * len(buses)
+  labels = [f"{csv_data_path} [{names[scl]}, {names[sda]}]"
+            for scl, sda, _ in buses]
+  with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+    futures = {}
+    for i, (scl, sda, _) in enumerate(buses):
+      name = re.sub(r"[^\w.-]+", "_", f"{names[scl]}_{names[sda]}")
+      save_folder = os.path.join(output_folder, f"{i:02d}_{name}")
+      futures[executor.submit(measure_bus, shm.name, shared.shape,
+                              shared.dtype, (scl, sda), csv_data_path,
+                              save_folder, options)] = i
+
+    for future in concurrent.futures.as_completed(futures):
+      i = futures[future]
+      try:
+        summaries[i] = future.result()
+      except Exception as e:  # pylint: disable=broad-except
+        # worker process died, e.g. out of memory
+        summaries[i] = {
+            "csv": csv_data_path, "report_path": None, "test_item": None,
+            "load_time": None, "measure_time": None, "results": None,
+            "param_stats": None, "error": f"{type(e).__name__}: {e}"
+        }
+      s = summaries[i]
+      s["csv"] = labels[i]
+      if s["error"] is not None:
+        status = "Error"
+      else:
+        status = "Fail" if s["test_item"][4] else "Pass"
+      print(f"[{status}]\t{s['csv']}")
+
+  return summaries
+
+
+if __name__ == "__main__":
+  parser = argparse.ArgumentParser()
+  parser.add_argument("csv",
+                      help="csv data path of more than two analog channels, "
+                      "column format: [time, CH1, CH2, CH3, ...]")
+  parser.add_argument("--output_folder", default=None,
+                      help="the folder path to save output reports, "
+                      "ex:\"./output_reports/\"")
+  parser.add_argument("--working_voltage", default=None, type=float,
+                      choices=[1.8, 3.3, 5],
+                      help="supplying voltage of every bus (unit: V)")
+  parser.add_argument("--operation_mode", default=None,
+                      choices=mode_choices(),
+                      help="SPEC operation mode, from the spec_profiles files")
+  parser.add_argument("--workers", default=None, type=int,
+                      help="number of worker processes, default to all cores")
+  parser.add_argument("--min_score", default=MIN_PAIR_SCORE, type=float,
+                      help="minimum fraction of SDA edges while SCL is LOW "
+                      "to pair two channels into a bus")
+  parser.add_argument("--cache_folder", default=None,
+                      help="the folder path to cache binary captures, "
+                      "default under the tmp folder")
+  parser.add_argument("--no_cache", action="store_true",
+                      help="always parse the csv file, without binary cache")
+  parser.add_argument("--fields", default=None, nargs="+",
+                      choices=SPEC_FIELDS, metavar="FIELD",
+                      help="only measure these SPEC fields, "
+                      "ex: t_rise_scl t_fall_scl (default: all)")
+  parser.add_argument("--svg", default="all", choices=SVG_POLICIES,
+                      help="waveform plots of all fields, the failed "
+                      "fields or the requested --fields only")
+  parser.add_argument("--v_il", default=None, type=float,
+                      help="threshold of state LOW (unit: V), "
+                      "default to 30%% of the working voltage")
+  parser.add_argument("--v_ih", default=None, type=float,
+                      help="threshold of state HIGH (unit: V), "
+                      "default to 70%% of the working voltage")
+  parser.add_argument("--transition", default=None, type=float, nargs=2,
+                      action="append", metavar=("LOW", "HIGH"),
+                      help="also measure rise and fall time between two "
+                      "fractions of the working voltage, ex: 0.1 0.9, "
+                      "could be given more than once")
+  parser.add_argument("--no_html", action="store_true",
+                      help="skip the waveform plots and the HTML reports")
+  parser.add_argument("--export", action="store_true",
+                      help="save machine-readable results of each bus "
+                      "and merge them in one JSON lines file")
+  parser.add_argument("--profile", action="store_true", default=None,
+                      help="save a cProfile profile of each bus in its "
+                      "folder, also enabled by the HUMMINGBIRD_PROFILE=1 "
+                      "environment variable")
+  args = parser.parse_args()
+
+  if args.output_folder is None:
+    LOCAL_PATH = os.path.join(os.path.dirname(__file__), "output_reports")
+    args.output_folder = LOCAL_PATH
+
+  if not os.path.exists(args.output_folder):
+    os.makedirs(args.output_folder)
+
+  stt = time.time()
+  print("\nLoading data from ", args.csv)
+  if args.no_cache:
+    data_list = load_file(args.csv, wide=True)
+  else:
+    data_list = CaptureCache(args.cache_folder).load(args.csv, wide=True)
+  names = ["time"] + find_importer(args.csv, wide=True).channels
+  shm, shared = share_capture(data_list)
+  del data_list
+  print("=== Data Load time: ", time.time() - stt, "s ===")
+
+  hum = None
+  try:
+    hum = HummingBird(args.csv, vs=args.working_voltage, v_il=args.v_il,
+                      v_ih=args.v_ih, profile=False, data_list=shared)
+    buses = find_buses(hum, args.min_score)
+    paired = {k for scl, sda, _ in buses for k in (scl, sda)}
+    for i, (scl, sda, score) in enumerate(buses):
+      print(f"Bus {i}:\tSCL {names[scl]}, SDA {names[sda]}\t"
+            f"(score {score:.2f})")
+    unpaired = [names[k] for k in range(1, len(names)) if k not in paired]
+    if unpaired:
+      print("Unpaired channels: ", ", ".join(unpaired))
+
+    summaries = run_buses(
+        args.csv, shm, shared, names, buses, args.output_folder,
+        args.workers, vs=args.working_voltage, mode=args.operation_mode,
+        fields=args.fields, svg=args.svg, html=not args.no_html,
+        export=args.export, v_il=args.v_il, v_ih=args.v_ih,
+        transitions=args.transition, profile=args.profile
+    )
+  finally:
+    del hum, shared
+    shm.close()
+    shm.unlink()
+  summary_path = write_summary(summaries, args.output_folder)
+
+  num_error = sum(s["error"] is not None for s in summaries)
+  num_fail = sum(s["error"] is None and bool(s["test_item"][4])
+                 for s in summaries)
+  print("------------------------------------")
+  print("Pass: ", len(summaries) - num_fail - num_error)
+  print("Fail: ", num_fail)
+  print("Error: ", num_error)
+  print("Generate summary at ", summary_path)
+  if args.export:
+    print("Generate results at ", merge_results(summaries, args.output_folder))
+  print("=== Multi-bus Time: ", time.time() - stt, "s ===")
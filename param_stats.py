@@ -0,0 +1,141 @@
+"""HummingBird streaming statistics of measured parameters.
+
+Count, mean and variance are updated chunk by chunk, and quantiles
+come from a log-bucket sketch with bounded relative error, so the
+memory does not grow with the number of measurements. Statistics
+of segments or captures are combined with merge.
+"""
+import math
+
+import numpy as np
+
+
+RELATIVE_ACCURACY = 0.01  # relative error of the quantiles
+HISTOGRAM_BINS = 20
+QUANTILES = {"p1": 0.01, "p50": 0.5, "p99": 0.99}
+
+
+class ParamStats():
+  """Mergeable distribution statistics of one parameter.
+
+  A value x is counted in bucket ceil(log(|x|) / log(gamma)) of the
+  store of its sign, so each bucket spans a relative width of
+  2 * RELATIVE_ACCURACY and the number of buckets only grows with
+  the log of the value range.
+
+  Attributes:
+    count: number of values
+    mean: mean of values
+    m2: sum of squared differences from the mean
+    min: minimum value
+    max: maximum value
+    gamma: bucket growth ratio
+    positive: count of positive values of each bucket
+    negative: count of negative values of each bucket, by absolute value
+    zeros: count of zero values
+  """
+
+  def __init__(self, values=None, relative_accuracy=RELATIVE_ACCURACY):
+    self.count = 0
+    self.mean = 0.0
+    self.m2 = 0.0
+    self.min = math.inf
+    self.max = -math.inf
+    self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+    self.positive = {}
+    self.negative = {}
+    self.zeros = 0
+    if values is not None:
+      self.add(values)
+
+  def add(self, values):
+    """Add a chunk of values.
+
+    Args:
+      values: numpy array of values
+    """
+    values = np.asarray(values, dtype=np.float64).ravel()
+    if not len(values):
+      return
+    other = ParamStats()
+    other.gamma = self.gamma
+    other.count = len(values)
+    other.mean = float(np.mean(values))
+    other.m2 = float(np.sum((values - other.mean) ** 2))
+    other.min = float(np.min(values))
+    other.max = float(np.max(values))
+    other.zeros = int(np.count_nonzero(values == 0))
+    for store, part in ((other.positive, values[values > 0]),
+                        (other.negative, -values[values < 0])):
+      keys, counts = np.unique(self.key(part), return_counts=True)
+      store.update(zip(keys.tolist(), counts.tolist()))
+    self.merge(other)
+
+  def merge(self, other):
+    """Merge the statistics of another ParamStats of the same accuracy."""
+    if not other.count:
+      return
+    count = self.count + other.count
+    delta = other.mean - self.mean
+    self.mean += delta * other.count / count
+    self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+    self.count = count
+    self.min = min(self.min, other.min)
+    self.max = max(self.max, other.max)
+    self.zeros += other.zeros
+    for store, part in ((self.positive, other.positive),
+                        (self.negative, other.negative)):
+      for key, value in part.items():
+        store[key] = store.get(key, 0) + value
+
+  def key(self, values):
+    """Bucket of positive values."""
+    return np.ceil(np.log(values) / math.log(self.gamma)).astype(np.int64)
+
+  def buckets(self):
+    """Representative value and count of every bucket, in value order."""
+    negative = sorted(self.negative.items(), reverse=True)
+    positive = sorted(self.positive.items())
+    keys = np.array([k for k, _ in negative] + [k for k, _ in positive],
+                    dtype=np.float64)
+    sign = np.repeat([-1.0, 1.0], [len(negative), len(positive)])
+    reps = sign * 2 * self.gamma ** keys / (self.gamma + 1)
+    counts = np.array([c for _, c in negative] + [c for _, c in positive],
+                      dtype=np.int64)
+    pos = len(negative)
+    reps = np.insert(reps, pos, 0.0)
+    counts = np.insert(counts, pos, self.zeros)
+    return np.clip(reps, self.min, self.max), counts
+
+  def std(self):
+    """Standard deviation of values."""
+    return math.sqrt(self.m2 / self.count) if self.count else math.nan
+
+  def quantile(self, q):
+    """Value at quantile q, within the relative accuracy."""
+    if not self.count:
+      return math.nan
+    reps, counts = self.buckets()
+    pos = np.searchsorted(np.cumsum(counts), q * (self.count - 1), side="right")
+    return float(reps[min(pos, len(reps) - 1)])
+
+  def histogram(self, bins=HISTOGRAM_BINS):
+    """Fixed-bin histogram from min to max.
+
+    Returns:
+      counts: number of values in each bin
+      edges: bin edges, one more than counts
+    """
+    if not self.count:
+      return np.zeros(bins, dtype=np.int64), np.zeros(bins + 1)
+    reps, counts = self.buckets()
+    hist, edges = np.histogram(reps, bins, range=(self.min, self.max),
+                               weights=counts)
+    return hist.astype(np.int64), edges
+
+  def summary(self):
+    """Count, mean, standard deviation and quantiles in QUANTILES."""
+    summary = {"count": self.count, "mean": self.mean, "std": self.std()}
+    for name, q in QUANTILES.items():
+      summary[name] = self.quantile(q)
+    return summary
@@ -0,0 +1,77 @@
+"""HummingBird streaming statistics test.
+
+The quantiles of ParamStats must stay within the relative accuracy
+of the exact ones, and merging the statistics of two halves must
+give the statistics of the whole.
+"""
+import math
+import unittest
+
+import numpy as np
+from param_stats import ParamStats
+from param_stats import RELATIVE_ACCURACY
+
+
+class ParamStatsTest(unittest.TestCase):
+  """ParamStats quantiles and merge."""
+
+  def setUp(self):
+    rng = np.random.default_rng(0)
+    self.samples = {
+        "rise time": rng.lognormal(math.log(1e-7), 0.3, 20000),
+        "voltage": rng.normal(3.3, 0.05, 20000),
+        "noise margin": rng.normal(0, 0.1, 20000),
+    }
+
+  def assert_quantiles(self, stats, values):
+    for q in [0.01, 0.5, 0.99]:
+      expected = np.quantile(values, q)
+      self.assertLessEqual(abs(stats.quantile(q) - expected),
+                           RELATIVE_ACCURACY * abs(expected), q)
+
+  def test_quantile(self):
+    for name, values in self.samples.items():
+      with self.subTest(name):
+        self.assert_quantiles(ParamStats(values), values)
+
+  def test_quantile_of_chunks(self):
+    for name, values in self.samples.items():
+      with self.subTest(name):
+        stats = ParamStats()
+        for chunk in np.array_split(values, 37):
+          stats.add(chunk)
+        self.assertEqual(stats.count, len(values))
+        self.assert_quantiles(stats, values)
+
+  def test_merge(self):
+    for name, values in self.samples.items():
+      with self.subTest(name):
+        whole = ParamStats(values)
+        merged = ParamStats(values[:len(values) // 3])
+        merged.merge(ParamStats(values[len(values) // 3:]))
+        self.assertEqual(merged.count, whole.count)
+        self.assertEqual(merged.min, whole.min)
+        self.assertEqual(merged.max, whole.max)
+        self.assertEqual(merged.zeros, whole.zeros)
+        self.assertEqual(merged.positive, whole.positive)
+        self.assertEqual(merged.negative, whole.negative)
+        self.assertTrue(math.isclose(merged.mean, whole.mean, rel_tol=1e-9,
+                                     abs_tol=1e-12))
+        self.assertTrue(math.isclose(merged.std(), whole.std(), rel_tol=1e-9))
+        for q in [0.01, 0.5, 0.99]:
+          self.assertEqual(merged.quantile(q), whole.quantile(q))
+
+  def test_merge_empty(self):
+    values = self.samples["voltage"]
+    stats = ParamStats(values)
+    stats.merge(ParamStats())
+    self.assertEqual(stats.summary(), ParamStats(values).summary())
+    empty = ParamStats()
+    empty.merge(ParamStats(values))
+    self.assertEqual(empty.count, len(values))
+    self.assertEqual(empty.quantile(0.5), stats.quantile(0.5))
+    self.assertTrue(math.isnan(ParamStats().quantile(0.5)))
+
+
+if __name__ == "__main__":
+  unittest.main()
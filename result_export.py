@@ -0,0 +1,86 @@
+"""HummingBird machine-readable result export.
+
+The test result of a capture is appended as one JSON line, and the
+measurement events are saved as columns of a compressed .npz file,
+so dashboards could read the results without parsing the report.
+"""
+import json
+import math
+
+from event_log import PARAMS
+import numpy as np
+
+
+def to_json(value):
+  """Convert measurement values to JSON types.
+
+  Numpy scalars and arrays become python numbers and lists, and
+  nan / inf become null.
+
+  Args:
+    value: value, list or dictionary to convert
+
+  Returns:
+    value: JSON serializable value
+  """
+  if isinstance(value, dict):
+    return {str(k): to_json(v) for k, v in value.items()}
+  if isinstance(value, (list, tuple, np.ndarray)):
+    return [to_json(v) for v in value]
+  if isinstance(value, np.generic):
+    value = value.item()
+  if isinstance(value, float) and not math.isfinite(value):
+    return None
+  return value
+
+
+def append_jsonl(jsonl_path, record):
+  """Append a record as one line of a JSON lines file.
+
+  Args:
+    jsonl_path: JSON lines file
+    record: dictionary of the result of one capture
+  """
+  with open(jsonl_path, "a") as f:
+    f.write(json.dumps(to_json(record)) + "\n")
+
+
+def save_events(events_path, measure_field, sampling_period):
+  """Save all measurement events in columns.
+
+  Columns are param (index into params), idx (sample index), value
+  and width (nan if not measured). Time parameters are in samples,
+  multiply by sampling_period to get seconds, and voltage parameters
+  are in V.
+
+  Args:
+    events_path: .npz save path
+    measure_field: EventLog of all measurements
+    sampling_period: time between two samples
+  """
+  events = measure_field.events[:measure_field.size]
+  np.savez_compressed(
+      events_path, params=np.array(PARAMS), param=events["param"],
+      idx=events["idx"], value=events["value"], width=events["width"],
+      sampling_period=sampling_period
+  )
+
+
+def load_events(events_path):
+  """Load the measurement events saved by save_events.
+
+  Args:
+    events_path: .npz save path
+
+  Returns:
+    columns: dictionary of the param name, idx, value and width
+             columns, in measurement order
+    sampling_period: time between two samples
+  """
+  with np.load(events_path) as f:
+    columns = {
+        "param": f["params"][f["param"]], "idx": f["idx"],
+        "value": f["value"], "width": f["width"]
+    }
+    sampling_period = float(f["sampling_period"])
+  return columns, sampling_period
@@ -0,0 +1,373 @@
+"""HummingBird SPEC profile registry.
+
+SPEC limits are read from the JSON files of the spec_profiles folder,
+and of the folders listed in the HUMMINGBIRD_SPEC_PATH environment
+variable, one file per standard, ex: I2C (NXP UM10204) or SMBus. YAML
+files are read too if PyYAML is installed. A file lists the working
+voltages of the standard and, for each operation mode, the min and max
+of each SPEC parameter:
+
+  "Fast Mode": {
+    "detect_f_clk": 4.4e5,
+    "f_clk": {"max": 4e5},
+    "t_fall": {"min": 2e-8, "min_at_vdd": 5.5, "max": 3e-7},
+    "t_HD_DAT": {"min": 0, "max": 9e-7, "max_clk_stretch": null},
+    ...
+  }
+
+A bound with _at_vdd is given at that working voltage and scales with
+it, a bound with _clk_stretch replaces it if the clock is stretched,
+null for not limited. A measured f_clk below detect_f_clk is detected
+as the mode, modes without it are only checked if requested.
+
+Each operation mode and working voltage, a profile, is compiled once
+into arrays of the lower and upper limit of every parameter, one row
+per profile, so a measurement is checked against every profile in one
+array comparison, ex: to see if a Fast Mode bus would also pass Fast
+Mode Plus or SMBus, without measuring again.
+"""
+import functools
+import glob
+import json
+import os
+
+import numpy as np
+
+
+SPEC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "spec_profiles")
+SPEC_PATH_ENV = "HUMMINGBIRD_SPEC_PATH"  # more folders of SPEC files
+SPEC_EXTENSIONS = (".json", ".yaml", ".yml")
+
+PARAMS = ("v_nh", "v_nl", "f_clk", "t_rise", "t_fall", "t_low", "t_high",
+          "t_SU_DAT", "t_HD_DAT", "t_HD_STA", "t_SU_STA", "t_SU_STO", "t_BUF")
+BOUNDS = ("min", "max")
+BOUND_KEYS = tuple(bound + suffix for bound in BOUNDS
+                   for suffix in ("", "_at_vdd", "_clk_stretch"))
+
+# SPEC parameter of each checked field, in the order they are checked
+FIELD_PARAMS = {
+    "v_nh_scl": "v_nh", "v_nl_scl": "v_nl", "v_nh_sda": "v_nh",
+    "v_nl_sda": "v_nl", "f_clk": "f_clk",
+    "t_rise_sda": "t_rise", "t_rise_scl": "t_rise",
+    "t_fall_sda": "t_fall", "t_fall_scl": "t_fall",
+    "t_HD_DAT_host_rising": "t_HD_DAT", "t_HD_DAT_host_falling": "t_HD_DAT",
+    "t_HD_DAT_dev_rising": "t_HD_DAT", "t_HD_DAT_dev_falling": "t_HD_DAT",
+    "t_low": "t_low", "t_high": "t_high", "t_SU_STA": "t_SU_STA",
+    "t_SU_STO": "t_SU_STO", "t_BUF": "t_BUF",
+    "t_HD_STA_S": "t_HD_STA", "t_HD_STA_Sr": "t_HD_STA",
+    "t_SU_DAT_host_rising": "t_SU_DAT", "t_SU_DAT_host_falling": "t_SU_DAT",
+    "t_SU_DAT_dev_rising": "t_SU_DAT", "t_SU_DAT_dev_falling": "t_SU_DAT",
+}
+FIELDS = list(FIELD_PARAMS)
+FIELD_INDEX = np.array([PARAMS.index(p) for p in FIELD_PARAMS.values()])
+
+
+def read_spec_file(path):
+  """Read a JSON or YAML SPEC file.
+
+  Raises:
+    ValueError: YAML file without PyYAML installed
+  """
+  with open(path, "r") as f:
+    if path.endswith(".json"):
+      return json.load(f)
+    try:
+      import yaml  # pylint: disable=import-outside-toplevel
+    except ImportError as e:
+      raise ValueError(f"PyYAML is needed to read {path}") from e
+    return yaml.safe_load(f)
+
+
+class SpecRegistry():
+  """SPEC limits of every standard and operation mode.
+
+  Attributes:
+    modes: limits of each operation mode, {param: {bound: value}}
+    standards: operation modes of each standard
+    voltages: working voltages of each standard
+    detect: f_clk below which each auto-detected mode is detected
+  """
+
+  def __init__(self, paths):
+    self.modes = {}
+    self.standards = {}
+    self.voltages = {}
+    self.detect = {}
+    for path in paths:
+      self.add(path, read_spec_file(path))
+
+  def add(self, path, spec):
+    """Add the operation modes of a SPEC file.
+
+    Raises:
+      ValueError: mode already defined, or unknown parameter or bound
+    """
+    standard = spec.get("standard", os.path.basename(path))
+    self.voltages[standard] = list(spec.get("voltages", []))
+    self.standards.setdefault(standard, [])
+    for mode, limits in spec.get("modes", {}).items():
+      if mode in self.modes:
+        raise ValueError(f"{path}: operation mode {mode} already defined")
+      limits = dict(limits)
+      if "detect_f_clk" in limits:
+        self.detect[mode] = limits.pop("detect_f_clk")
+      for param, bounds in limits.items():
+        if param not in PARAMS:
+          raise ValueError(f"{path}: unknown parameter {param} of {mode}")
+        for key in bounds:
+          if key not in BOUND_KEYS:
+            raise ValueError(f"{path}: unknown bound {key} of {mode} {param}")
+      self.modes[mode] = limits
+      self.standards[standard].append(mode)
+
+  def bound(self, mode, param, bound, vs, clk_stretch):
+    """Limit of a parameter.
+
+    Args:
+      mode: operation mode
+      param: SPEC parameter, ex: t_rise
+      bound: min or max
+      vs: working voltage
+      clk_stretch: has clock stretching
+
+    Returns:
+      limit: the limit, None if not limited
+    """
+    limits = self.modes[mode].get(param, {})
+    if clk_stretch and bound + "_clk_stretch" in limits:
+      limit = limits[bound + "_clk_stretch"]
+    else:
+      limit = limits.get(bound)
+    if limit is not None and bound + "_at_vdd" in limits:
+      limit = limit * vs / limits[bound + "_at_vdd"]
+    return limit
+
+  def detect_mode(self, f_clk):
+    """Operation mode of a clock frequency.
+
+    Returns:
+      mode: the mode of the lowest detect_f_clk above f_clk, the mode of
+            the highest one if f_clk is above all
+    """
+    modes = sorted(self.detect, key=self.detect.get)
+    for mode in modes:
+      if f_clk < self.detect[mode]:
+        return mode
+    return modes[-1]
+
+  def profiles(self):
+    """(mode, vs) of every operation mode and working voltage."""
+    return [(mode, vs) for standard, modes in self.standards.items()
+            for mode in modes for vs in self.voltages[standard]]
+
+
+def spec_files():
+  """SPEC files of the spec_profiles folder and HUMMINGBIRD_SPEC_PATH."""
+  folders = [SPEC_FOLDER] + [
+      folder for folder in os.environ.get(SPEC_PATH_ENV, "").split(os.pathsep)
+      if folder
+  ]
+  paths = []
+  for folder in folders:
+    paths += sorted(path for path in glob.glob(os.path.join(folder, "*"))
+                    if path.endswith(SPEC_EXTENSIONS))
+  return paths
+
+
+@functools.lru_cache(maxsize=4)
+def load_registry(files):
+  """SpecRegistry of files, a tuple of (path, modified time)."""
+  return SpecRegistry([path for path, _ in files])
+
+
+def registry():
+  """SpecRegistry of the SPEC files, read again only if they changed."""
+  return load_registry(tuple((path, os.path.getmtime(path))
+                             for path in spec_files()))
+
+
+def mode_choices():
+  """Operation modes for the --operation_mode flag, ex: Fast_Mode."""
+  return [mode.replace(" ", "_") for mode in registry().modes]
+
+
+def spec_limitation(mode, vs, clk_stretch, v_low, v_high):
+  """SPEC limitation of an operation mode.
+
+  Args:
+    mode: operation mode, ex: Fast Mode
+    vs: working voltage
+    clk_stretch: has clock stretching
+    v_low: threshold of state LOW
+    v_high: threshold of state HIGH
+
+  Returns:
+    spec_limit: thresholds v_low and v_high, and the limits of each
+                parameter as param_min / param_max, ex: t_rise_max
+
+  Raises:
+    ValueError: unknown operation mode
+  """
+  spec = registry()
+  if mode not in spec.modes:
+    raise ValueError(f"unknown operation mode {mode}")
+  spec_limit = {"v_low": v_low, "v_high": v_high}
+  for param in PARAMS:
+    for bound in BOUNDS:
+      limit = spec.bound(mode, param, bound, vs, clk_stretch)
+      if limit is not None:
+        spec_limit[f"{param}_{bound}"] = limit
+  return spec_limit
+
+
+def field_limits(spec_limit, fields=FIELDS):
+  """Lower and upper limit of fields.
+
+  Args:
+    spec_limit: limits from spec_limitation
+    fields: checked fields
+
+  Returns:
+    limit_min: numpy array of the lower limit of each field, -inf if none
+    limit_max: numpy array of the upper limit of each field, inf if none
+  """
+  limit_min = np.array([spec_limit.get(FIELD_PARAMS[f] + "_min", -np.inf)
+                        for f in fields], dtype=np.float64)
+  limit_max = np.array([spec_limit.get(FIELD_PARAMS[f] + "_max", np.inf)
+                        for f in fields], dtype=np.float64)
+  return limit_min, limit_max
+
+
+def evaluate(measure_min, measure_max, limit_min, limit_max):
+  """Check measurements with their limits, element by element.
+
+  The worst side of a field is its min or max, the one closer to its
+  limit, or further beyond it.
+
+  Args:
+    measure_min: numpy array of the lowest measurement of each field
+    measure_max: numpy array of the highest measurement of each field
+    limit_min: numpy array of the lower limits, -inf if none
+    limit_max: numpy array of the upper limits, inf if none
+
+  Returns:
+    fail: measurement out of its limits
+    use_max: the max is the worst side
+    margin: distance of the worst side to its limit, negative if out
+    percent: margin relative to the limit of the worst side, or to the
+             upper limit if the lower one is 0 (unit: %)
+  """
+  with np.errstate(invalid="ignore", divide="ignore"):
+    fail = (measure_min < limit_min) | (measure_max > limit_max)
+    margin_min = measure_min - limit_min
+    margin_max = limit_max - measure_max
+    use_max = margin_max < margin_min
+    margin = np.where(use_max, margin_max, margin_min)
+    scale = np.where(use_max | (limit_min == 0) | np.isinf(limit_min),
+                     limit_max, limit_min)
+    percent = np.where(np.isinf(scale), np.inf, margin / scale * 100)
+  return fail, use_max, margin, percent
+
+
+def profile_name(mode, vs):
+  """Name of a profile, ex: Fast Mode 3.3V."""
+  return f"{mode} {vs}V"
+
+
+class SpecProfiles():
+  """SPEC limits of profiles, compiled into arrays.
+
+  Attributes:
+    profiles: (mode, vs) of each row
+    vs: numpy array of the working voltage of each row
+    v_low: numpy array of the threshold of state LOW of each row
+    v_high: numpy array of the threshold of state HIGH of each row
+    limit_min: numpy array of the lower limit of each row and PARAMS
+               column, -inf if not limited
+    limit_max: numpy array of the upper limit of each row and PARAMS
+               column, inf if not limited
+  """
+
+  def __init__(self, spec, profiles, clk_stretch, v_il=None, v_ih=None):
+    self.profiles = list(profiles)
+    self.vs = np.array([vs for _, vs in self.profiles], dtype=np.float64)
+    self.v_low = self.vs * 0.3 if v_il is None else np.full_like(self.vs, v_il)
+    self.v_high = self.vs * 0.7 if v_ih is None else np.full_like(self.vs, v_ih)
+    self.limit_min = np.full((len(self.profiles), len(PARAMS)), -np.inf)
+    self.limit_max = np.full((len(self.profiles), len(PARAMS)), np.inf)
+    for i, (mode, vs) in enumerate(self.profiles):
+      for j, param in enumerate(PARAMS):
+        for limit, bound in zip((self.limit_min, self.limit_max), BOUNDS):
+          value = spec.bound(mode, param, bound, vs, clk_stretch)
+          if value is not None:
+            limit[i, j] = value
+
+  def check(self, values):
+    """Check measurement values against every profile.
+
+    The noise margins are relative to the thresholds and the working
+    voltage of each profile, the other values are the same for all.
+
+    Args:
+      values: max and min of each field from HummingBird.check_spec,
+              with v_high_* / v_low_* for the noise margins
+
+    Returns:
+      profile_result: pass (0) / fail (1) of each field the profile
+                      limits, None if the field is not measured, for
+                      each profile name
+    """
+    measure_min = np.array([values.get(f + "_min", np.nan) for f in FIELDS],
+                           dtype=np.float64)
+    measure_max = np.array([values.get(f + "_max", np.nan) for f in FIELDS],
+                           dtype=np.float64)
+    measure_min = np.tile(measure_min, (len(self.profiles), 1))
+    measure_max = np.tile(measure_max, (len(self.profiles), 1))
+    for j, f in enumerate(FIELDS):
+      line = f.split("_")[-1]
+      if FIELD_PARAMS[f] == "v_nh":
+        measure_min[:, j] = (values.get(f"v_high_{line}_min", np.nan) -
+                             self.v_high) / self.vs
+      elif FIELD_PARAMS[f] == "v_nl":
+        measure_min[:, j] = (self.v_low -
+                             values.get(f"v_low_{line}_max", np.nan)) / self.vs
+
+    limit_min = self.limit_min[:, FIELD_INDEX]
+    limit_max = self.limit_max[:, FIELD_INDEX]
+    limited = np.isfinite(limit_min) | np.isfinite(limit_max)
+    measured = ~np.isnan(measure_min)
+    fail, _, _, _ = evaluate(measure_min, measure_max, limit_min, limit_max)
+
+    profile_result = {}
+    for i, (mode, vs) in enumerate(self.profiles):
+      profile_result[profile_name(mode, vs)] = {
+          f: int(fail[i, j]) if measured[i, j] else None
+          for j, f in enumerate(FIELDS) if limited[i, j]
+      }
+    return profile_result
+
+
+def profile_status(checks):
+  """Result of a profile from SpecProfiles.check.
+
+  A profile only passes if every field it limits is measured.
+
+  Args:
+    checks: pass (0) / fail (1) / not measured (None) of each field
+
+  Returns:
+    status: "Fail" if a field fails, otherwise "Incomplete" if a field
+            is not measured, otherwise "Pass"
+  """
+  if any(checks.values()):
+    return "Fail"
+  if None in checks.values():
+    return "Incomplete"
+  return "Pass"
+
+
+@functools.lru_cache(maxsize=None)
+def compile_profiles(spec, clk_stretch, v_il=None, v_ih=None):
+  """SpecProfiles of every profile of a SpecRegistry, compiled once."""
+  return SpecProfiles(spec, spec.profiles(), clk_stretch, v_il, v_ih)
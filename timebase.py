@@ -0,0 +1,100 @@
+"""HummingBird common timebase of captures.
+
+Captures of SCL and SDA could be taken at different sampling rates
+or start times. Both are put on one sampling grid over the time range
+they overlap, so the bus state machine could index them with the same
+sample index. A capture already at the grid period is only sliced,
+the others are linearly interpolated chunk by chunk over the overlap.
+"""
+import math
+
+import numpy as np
+
+
+CHUNK_SIZE = 1 << 20  # samples interpolated at a time
+PERIOD_TOLERANCE = 1e-6  # relative difference of the same sampling period
+
+
+def same_period(period1, period2):
+  """Whether two sampling periods are the same sampling rate."""
+  return math.isclose(period1, period2, rel_tol=PERIOD_TOLERANCE)
+
+
+def common_timebase(starts, periods, counts, period=None):
+  """Sampling grid over the overlap of captures.
+
+  The grid is aligned to the samples of a capture at the grid period,
+  so that capture is not resampled. Captures at the grid period are
+  shifted by a whole number of samples, the same as matching them by
+  start time, sub-sample differences of start times are ignored.
+
+  Args:
+    starts: start time of each capture
+    periods: sampling period of each capture
+    counts: number of samples of each capture
+    period: grid period, None for the finest sampling period
+
+  Returns:
+    begin: start time of the grid
+    period: grid period
+    alignment: (offset, ratio) of each capture, grid sample k is at
+               sample offset + k * ratio of the capture
+    count: number of grid samples in the overlap, 0 if the captures
+           do not overlap
+  """
+  if period is None:
+    period = min(periods)
+  same = [same_period(p, period) for p in periods]
+  begin = max(starts)
+  if any(same):
+    ref = same.index(True)
+    begin = starts[ref] + round((begin - starts[ref]) / period) * period
+
+  alignment = []
+  count = None
+  for start, p, n, s in zip(starts, periods, counts, same):
+    if s:
+      offset, ratio = round((begin - start) / p), 1
+      available = n - offset
+    else:
+      offset, ratio = (begin - start) / p, period / p
+      available = math.floor((n - 1 - offset) / ratio) + 1
+    alignment.append((offset, ratio))
+    count = available if count is None else min(count, available)
+
+  return begin, period, alignment, max(count, 0)
+
+
+def resample(data, offset, ratio, count, chunk_size=CHUNK_SIZE):
+  """Samples of a capture on a grid, see common_timebase.
+
+  Only the samples from offset are read. With ratio 1 and a whole
+  offset, the data is sliced without copy, otherwise the grid samples
+  are linearly interpolated between their two nearest samples, the
+  same as np.interp on a uniform grid, and held at the first or last
+  sample outside the capture.
+
+  Args:
+    data: numpy array of voltages values
+    offset: capture sample of the first grid sample
+    ratio: capture samples per grid sample
+    count: number of grid samples
+    chunk_size: number of grid samples interpolated at a time
+
+  Returns:
+    samples: numpy array of count voltages values, in the data dtype
+  """
+  if ratio == 1 and offset == int(offset):
+    return data[int(offset):int(offset) + count]
+
+  samples = np.empty(count, dtype=data.dtype)
+  last = len(data) - 1
+  for lo in range(0, count, chunk_size):
+    hi = min(lo + chunk_size, count)
+    pos = np.clip(offset + np.arange(lo, hi) * ratio, 0, last)
+    idx = np.minimum(pos.astype(np.int64), max(last - 1, 0))
+    left = np.asarray(data[idx], dtype=np.float64)
+    right = np.asarray(data[np.minimum(idx + 1, last)], dtype=np.float64)
+    samples[lo:hi] = left + (pos - idx) * (right - left)
+
+  return samples
@@ -0,0 +1,100 @@
+"""HummingBird common timebase test.
+
+Captures at the same sampling rate must be trimmed the same as the
+whole-sample shift they were aligned with before, and captures at
+other sampling rates must match np.interp over the overlap.
+"""
+import unittest
+
+import numpy as np
+from timebase import common_timebase
+from timebase import resample
+
+
+def legacy_trim(starts, period, data_list):
+  """Trim captures at the same sampling rate to their overlap.
+
+  The alignment used before common_timebase: every capture is shifted
+  by the whole number of samples closest to its start time difference.
+  """
+  begin = max(starts)
+  skips = [round((begin - start) / period) for start in starts]
+  rows = min(len(data) - skip for data, skip in zip(data_list, skips))
+  return [data[skip:skip + max(rows, 0)]
+          for data, skip in zip(data_list, skips)]
+
+
+class TimebaseTest(unittest.TestCase):
+  """common_timebase and resample on synthetic captures."""
+
+  def setUp(self):
+    self.rng = np.random.default_rng(0)
+
+  def capture(self, count):
+    return self.rng.uniform(0, 3.3, count).astype(np.float32)
+
+  def align(self, starts, periods, data_list, chunk_size=7):
+    begin, period, alignment, count = common_timebase(
+        starts, periods, [len(data) for data in data_list]
+    )
+    samples = [resample(data, offset, ratio, count, chunk_size)
+               for data, (offset, ratio) in zip(data_list, alignment)]
+    return begin, period, count, samples
+
+  def test_same_rate_offset(self):
+    period = 1e-6
+    for shift, jitter in [(0, 0), (5, 0), (5, 0.3), (12, -0.4)]:
+      with self.subTest(shift=shift, jitter=jitter):
+        starts = [2e-3, 2e-3 + (shift + jitter) * period]
+        data_list = [self.capture(100), self.capture(90)]
+        _, grid, count, samples = self.align(starts, [period, period],
+                                             data_list)
+        expected = legacy_trim(starts, period, data_list)
+        self.assertEqual(grid, period)
+        self.assertEqual(count, len(expected[0]))
+        for sample, data, trimmed in zip(samples, data_list, expected):
+          np.testing.assert_array_equal(sample, trimmed)
+          self.assertTrue(np.shares_memory(sample, data))  # sliced
+
+  def test_rate_ratio(self):
+    period = 1e-6
+    for ratio in [2, 3]:
+      for start in [0, 0.37 * period, 4.6 * period]:
+        with self.subTest(ratio=ratio, start=start):
+          starts = [1e-3, 1e-3 + start]
+          periods = [period, ratio * period]
+          data_list = [self.capture(301), self.capture(97)]
+          begin, grid, count, samples = self.align(starts, periods,
+                                                   data_list)
+          self.assertEqual(grid, period)
+          self.assertGreater(count, 0)
+          # the grid is on the samples of the capture at the grid period,
+          # within half a grid sample of the overlap
+          times = begin + np.arange(count) * grid
+          ends = [s + (len(data) - 1) * p
+                  for data, s, p in zip(data_list, starts, periods)]
+          self.assertLessEqual(abs(times[0] - max(starts)), grid / 2)
+          self.assertLessEqual(times[-1], min(ends) + grid / 2)
+          self.assertGreater(times[-1] + grid, min(ends) - grid / 2)
+          skip = round((begin - starts[0]) / period)
+          np.testing.assert_array_equal(samples[0],
+                                        data_list[0][skip:skip + count])
+          capture_times = starts[1] + np.arange(len(data_list[1])) * periods[1]
+          np.testing.assert_allclose(
+              samples[1], np.interp(times, capture_times, data_list[1]),
+              rtol=1e-5, atol=1e-5
+          )
+
+  def test_no_overlap(self):
+    for periods in [[1e-6, 1e-6], [1e-6, 2e-6], [3e-6, 1e-6]]:
+      with self.subTest(periods=periods):
+        data_list = [self.capture(100), self.capture(100)]
+        starts = [0.0, 1e-3]
+        _, _, count, samples = self.align(starts, periods, data_list)
+        self.assertEqual(count, 0)
+        for sample in samples:
+          self.assertEqual(len(sample), 0)
+
+
+if __name__ == "__main__":
+  unittest.main()